@@ -28,11 +28,14 @@ import requests
 from datetime import datetime, timedelta
 from typing import Any, Callable, Optional, Dict
 from threading import Thread, Lock
+from collections import OrderedDict
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+API_CACHE_MAX_AGE = 30 * 24 * 60 * 60 # cached responses not refreshed for this long are deleted
+
 class APICacheManager:
     def __init__(self, cache_dir: str = ".api_cache"):
         """
@@ -87,7 +90,7 @@ class APICacheManager:
         except IOError as e:
             logger.error(f"Error saving cache for {cache_key}: {e}")
 
-    def _revalidate_async(self, url: str, callback: Optional[Callable[[Any], None]] = None, headers: Optional[Dict] = None, params: Optional[Dict] = None, cache_key: str = None):
+    def _revalidate_async(self, url: str, callback: Optional[Callable[[Any], None]] = None, headers: Optional[Dict] = None, params: Optional[Dict] = None, cache_key: str = None, rate_limiter=None):
         """revalidate cache in background thread"""
         def revalidate():
             try:
@@ -95,6 +98,8 @@ class APICacheManager:
                 lock = self.revalidate_locks.setdefault(url, Lock())
 
                 with lock:
+                    if rate_limiter:
+                        rate_limiter.acquire()
                     response = requests.get(url, headers=headers, params=params, timeout=30)
                     response.raise_for_status()
                     new_data = response.json()
@@ -113,16 +118,23 @@ class APICacheManager:
         thread = Thread(target=revalidate, daemon=True)
         thread.start()
 
-    def get(self, url: str, callback: Optional[Callable[[Any], None]] = None, headers: Optional[Dict] = None, params: Optional[Dict] = None, forceFresh: Optional[bool] = False) -> Optional[Any]:
+    def get(self, url: str, callback: Optional[Callable[[Any], None]] = None, headers: Optional[Dict] = None, params: Optional[Dict] = None, forceFresh: Optional[bool] = False, rate_limiter=None) -> Optional[Any]:
+        """
+        get the response for url, from the cache if there is one (revalidating it in the
+        background). rate_limiter (e.g. a ratelimit.RateLimiter) is only waited on before
+        requests that actually go to the network, so cached answers aren't throttled.
+        """
         cache_key = self._get_cache_key(url, params)
 
         cache_data = self._load_cache(cache_key)
         if cache_data and not forceFresh:
-            self._revalidate_async(url, callback, headers, params, cache_key)
+            self._revalidate_async(url, callback, headers, params, cache_key, rate_limiter)
             return cache_data['data']
 
         # no valid cache, fetch fresh data
         try:
+            if rate_limiter:
+                rate_limiter.acquire()
             response = requests.get(url, headers=headers, params=params, timeout=30)
             response.raise_for_status()
             data = response.json()
@@ -161,11 +173,88 @@ class APICacheManager:
                 except OSError:
                     pass
 
+    def compact(self, max_age: int):
+        """
+        delete cached responses that haven't been refreshed in max_age seconds (they are
+        no longer revalidated, e.g. for media that has been removed), and any temporary
+        files left by an interrupted save. returns the number of files deleted.
+        """
+        cutoff = time.time() - max_age
+        removed = 0
+        with self.cache_lock:
+            for entry in os.scandir(self.cache_dir):
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(".tmp") or entry.stat().st_mtime < cutoff:
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
+
+class ByteLRU:
+    """
+    in-memory least-recently-used cache limited by the total size of its values
+    (as measured by `sizeof`) rather than by number of entries.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int] = len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+
+            # don't let one huge value push everything else out
+            if size > self.max_bytes:
+                return
+
+            self._items[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.size -= evicted_size
+
+    def pop(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return None
+            self.size -= item[1]
+            return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._items)
 
 cache_manager = APICacheManager()
 
-def apiGet(url: str, callback: Optional[Callable[[Any], None]] = None, headers: Optional[Dict] = None, params: Optional[Dict] = None, forceFresh: Optional[bool] = False) -> Optional[Any]:
-    return cache_manager.get(url, callback, headers, params, forceFresh)
+def apiGet(url: str, callback: Optional[Callable[[Any], None]] = None, headers: Optional[Dict] = None, params: Optional[Dict] = None, forceFresh: Optional[bool] = False, rate_limiter=None) -> Optional[Any]:
+    return cache_manager.get(url, callback, headers, params, forceFresh, rate_limiter)
 
 def clearCache(url: str = None):
-    cache_manager.clear_cache(url)
\ No newline at end of file
+    cache_manager.clear_cache(url)
+
+def compactCache(max_age: int = API_CACHE_MAX_AGE):
+    return cache_manager.compact(max_age)
\ No newline at end of file
@@ -76,6 +76,7 @@ def get_tautulli_config():
     return {
         'api_key': get_config_value('TAUTULLI_API_KEY'),
         'api_url': get_config_value('TAUTULLI_API_URL'),
+        'webhook_auth': get_config_value('TAUTULLI_WEBHOOK_AUTH'),
     }
 
 def get_overseerr_config():
@@ -83,7 +84,9 @@ def get_overseerr_config():
     return {
         'api_key': get_config_value('OVERSEERR_API_KEY'),
         'api_url': get_config_value('OVERSEERR_API_URL'),
-        'last_requests_process': get_config_value('OVERSEERR_LAST_REQUESTS_PROCESS')
+        'last_requests_process': get_config_value('OVERSEERR_LAST_REQUESTS_PROCESS'),
+        'requests_sync_window': get_config_value('OVERSEERR_REQUESTS_SYNC_WINDOW'),
+        'webhook_auth': get_config_value('OVERSEERR_WEBHOOK_AUTH')
     }
 
 def get_smtp_config():
@@ -92,7 +95,12 @@ def get_smtp_config():
         'host': get_config_value('SMTP_HOST'),
         'port': get_config_value('SMTP_PORT'),
         'user': get_config_value('SMTP_USER'),
-        'pass': get_config_value('SMTP_PASS')
+        'pass': get_config_value('SMTP_PASS'),
+        'pool_size': get_config_value('SMTP_POOL_SIZE', '4'),
+        'messages_per_session': get_config_value('SMTP_MESSAGES_PER_SESSION', '100'),
+        'max_connections': get_config_value('SMTP_MAX_CONNECTIONS', '4'),
+        'transport': get_config_value('SMTP_TRANSPORT', 'threads'),
+        'sender': get_config_value('SMTP_SENDER')
     }
 
 def get_tvdb_config():
@@ -117,6 +125,11 @@ def get_server_config():
         'unsubscribe_lists': [x for x in (get_config_value('UNSUBSCRIBE_LISTS') or '').split(",") if x],
     }
 
+def get_scheduler_config():
+    return {
+        'enabled': get_config_value('SCHEDULER_ENABLED', '1')
+    }
+
 def get_or_init_config_vlaue(key):
     value = get_config_value(key)
     if value is None:
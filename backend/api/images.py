@@ -0,0 +1,189 @@
+# -----------------------------contactarr------------------------------
+# This file is part of contactarr
+# Copyright (C) 2025 goggybox https://github.com/goggybox
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# that this program is licensed under. See LICENSE file. If not
+# available, see <https://www.gnu.org/licenses/>.
+
+# Please keep this header comment in all copies of the program.
+# --------------------------------------------------------------------
+
+import os
+import re
+import base64
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+EMAIL_IMAGE_DIR = ".image_cache/email"
+EMAIL_POSTER_WIDTH = 200
+EMAIL_POSTER_QUALITY = 80
+
+# posters are referenced from email html as src="cid:poster-<movie|show>-<id>@contactarr"
+POSTER_CID_RE = re.compile(r"cid:poster-(movie|show)-(\d+)@contactarr")
+
+def poster_cid(media_type: str, media_id: int) -> str:
+    """the src to use for a poster in an email's html"""
+    return f"cid:poster-{media_type}-{media_id}@contactarr"
+
+def image_subtype(data: bytes) -> str | None:
+    """'jpeg', 'png', 'webp' or 'gif', from the image's first bytes"""
+    if data.startswith(b"\xff\xd8"):
+        return "jpeg"
+    if data.startswith(b"\x89PNG"):
+        return "png"
+    if data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+        return "webp"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    return None
+
+def resize_image(data: bytes, width: int = None, fmt: str = "jpeg", quality: int = 80) -> bytes | None:
+    """
+    scale the image down to the given width (never up) and re-encode it as fmt.
+    returns None if Pillow isn't installed or the image can't be read.
+    """
+    if Image is None:
+        return None
+
+    try:
+        with Image.open(BytesIO(data)) as img:
+            if width and img.width > width:
+                height = round(img.height * width / img.width)
+                img = img.resize((width, height), Image.LANCZOS)
+
+            if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+
+            out = BytesIO()
+            if fmt == "jpeg":
+                img.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+            else:
+                img.save(out, fmt.upper(), quality=quality)
+            return out.getvalue()
+    except Exception as e:
+        print(f"Could not resize image: {e}")
+        return None
+
+def make_sprite(images_data: list, cell_width: int, cell_height: int, columns: int, quality: int = 80) -> bytes | None:
+    """
+    paste the images into a grid (left to right, then top to bottom), each cropped and
+    scaled to fill one cell, and return the sheet as a jpeg.
+    returns None if Pillow isn't installed.
+    """
+    if Image is None:
+        return None
+
+    rows = max(1, -(-len(images_data) // columns))
+    sheet = Image.new("RGB", (columns * cell_width, rows * cell_height))
+
+    for n, data in enumerate(images_data):
+        try:
+            with Image.open(BytesIO(data)) as img:
+                cell = ImageOps.fit(img.convert("RGB"), (cell_width, cell_height), Image.LANCZOS)
+        except Exception as e:
+            print(f"Could not add image to sprite: {e}")
+            continue
+        sheet.paste(cell, ((n % columns) * cell_width, (n // columns) * cell_height))
+
+    out = BytesIO()
+    sheet.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+class EmailImage:
+    """an image ready to be attached to emails, already base64-encoded"""
+
+    def __init__(self, digest: str, subtype: str, b64: str):
+        self.digest = digest
+        self.subtype = subtype
+        self.b64 = b64
+
+class EmailImageStore:
+    """
+    content-addressed store of email-ready images. each distinct image is resized,
+    recompressed and base64-encoded once, then kept on disk (by the hash of the original)
+    and in memory, so attaching it to any number of emails doesn't encode it again.
+    """
+
+    def __init__(self, directory=EMAIL_IMAGE_DIR, width=EMAIL_POSTER_WIDTH, quality=EMAIL_POSTER_QUALITY,
+                 max_in_memory=256):
+        self.directory = directory
+        self.width = width
+        self.quality = quality
+        self.max_in_memory = max_in_memory
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _digest(self, data):
+        # the variant settings are part of the key, so changing them makes new entries
+        h = hashlib.sha256(data)
+        h.update(f"|w{self.width}|q{self.quality}".encode())
+        return h.hexdigest()
+
+    def get(self, data: bytes) -> EmailImage | None:
+        if not data:
+            return None
+
+        digest = self._digest(data)
+        with self._lock:
+            image = self._images.get(digest)
+            if image is not None:
+                self._images.move_to_end(digest)
+                return image
+
+        image = self._load(digest) or self._encode(digest, data)
+        if image is None:
+            return None
+
+        with self._lock:
+            self._images[digest] = image
+            if len(self._images) > self.max_in_memory:
+                self._images.popitem(last=False)
+        return image
+
+    def _load(self, digest):
+        for subtype in ("jpeg", "png", "webp", "gif"):
+            path = os.path.join(self.directory, f"{digest}.{subtype}.b64")
+            if os.path.exists(path):
+                with open(path, "r", encoding="ascii") as f:
+                    return EmailImage(digest, subtype, f.read())
+        return None
+
+    def _encode(self, digest, data):
+        resized = resize_image(data, self.width, "jpeg", self.quality)
+        if resized is not None and len(resized) < len(data):
+            data = resized
+
+        subtype = image_subtype(data)
+        if subtype is None:
+            return None
+
+        b64 = base64.encodebytes(data).decode("ascii")
+
+        # write to a temporary file first, so a half-written file is never read
+        path = os.path.join(self.directory, f"{digest}.{subtype}.b64")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="ascii") as f:
+            f.write(b64)
+        os.replace(tmp_path, path)
+
+        return EmailImage(digest, subtype, b64)
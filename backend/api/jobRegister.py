@@ -20,32 +20,344 @@
 # Please keep this header comment in all copies of the program.
 # --------------------------------------------------------------------
 
+import asyncio
+import json
 import threading
+import traceback
 import uuid
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = 4 # jobs running at once. any more wait in the queue.
+JOB_HISTORY_LIMIT = 50 # finished jobs kept in memory, with their results (every run is also kept in job_runs)
+
+JOB_PROGRESS_EVENT_INTERVAL = 0.25 # seconds between progress events of a job (except the last of a stage)
+JOB_EVENTS_KEEPALIVE = 15 # seconds between keepalive comments on idle event streams
 
 _jobs = {}
 _jobs_lock = threading.Lock()
+# listeners for job events: job id (or None, for every job) -> set of (event loop, asyncio.Queue)
+_subscribers = {}
+_PRIVATE_PROGRESS_KEYS = ("stage_started_at", "published_at")
+_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+# the id of the job running on the current thread
+_current = threading.local()
+
+class JobCancelled(Exception):
+    """raised by check_cancelled() inside a job that has been asked to stop"""
+    pass
+
+def _job_record(job_id, name, trigger):
+    return {
+        "id": job_id,
+        "name": name,
+        "trigger": trigger, # what started the job, e.g. "manual" or "scheduler"
+
+        "status": "queued", # queued, running, succeeded, failed or cancelled
+        "running": True, # queued or running
+        "cancel_requested": False,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "progress": None,
+        "stages": {}, # stage -> {"seconds": time spent in it, "items": items done in it}
+        "items": 0, # items done over all stages
+        "result": None,
+        "error": None,
+    }
+
+def _json_safe(value):
+    """results are returned by /jobs, so only keep them if they can be sent as json"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    return repr(value)
 
-def start_job(name, target_func):
-    job_id = str(uuid.uuid4())
+def _publish(job, event):
+    """send an event about the job to its subscribers. must be called holding _jobs_lock."""
+    event = {**event, "job_id": job["id"]}
+    for key in (job["id"], None):
+        for loop, queue in _subscribers.get(key, ()):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # the stream's event loop has closed; it unsubscribes itself
+                pass
 
-    def wrapper():
-        try:
-            target_func()
-        finally:
-            with _jobs_lock:
-                _jobs[job_id]["running"] = False
+def _start_event(job):
+    return {
+        "type": "start",
+        "name": job["name"],
+        "status": job["status"],
+        "trigger": job["trigger"],
+        "progress": _public(job)["progress"],
+    }
 
+def _end_event(job):
+    duration = None
+    if job["started_at"] is not None:
+        duration = round(job["finished_at"] - job["started_at"], 3)
+    event = {
+        "type": "error" if job["status"] == "failed" else "complete",
+        "name": job["name"],
+        "status": job["status"],
+        "duration": duration,
+        "items": job["items"],
+        "stages": {stage: dict(timing) for stage, timing in job["stages"].items()},
+    }
+    if job["status"] == "failed":
+        event["message"] = job["error"]
+    else:
+        event["result"] = job["result"]
+    return event
+
+def _close_stage(job, now):
+    progress = job["progress"]
+    if progress and progress.get("stage") is not None:
+        stage = job["stages"].setdefault(progress["stage"], {"seconds": 0, "items": 0})
+        stage["seconds"] = round(stage["seconds"] + now - progress["stage_started_at"], 3)
+        stage["items"] += progress["done"] or 0
+        job["items"] += progress["done"] or 0
+
+def _prune_finished():
+    finished = sorted(
+        (job for job in _jobs.values() if not job["running"]),
+        key=lambda job: job["finished_at"]
+    )
+    for job in finished[:max(0, len(finished) - JOB_HISTORY_LIMIT)]:
+        del _jobs[job["id"]]
+
+def _save_run(job):
+    """keep a copy of the job in the job_runs table, so its history outlives the process"""
+    # imported here, as db.py imports this module
+    from backend.db import db
+    try:
+        db.save_job_run(job)
+    except Exception as e:
+        print(f"Could not record run of job '{job['name']}': {e}")
+
+def _finish(job_id, status, result=None, error=None):
+    now = time.time()
     with _jobs_lock:
-        _jobs[job_id] = {
-            "name": name,
-            "running": True
-        }
+        job = _jobs[job_id]
+        _close_stage(job, now)
+        job.update({
+            "status": status,
+            "running": False,
+            "finished_at": now,
+            "result": result,
+            "error": error,
+        })
+        snapshot = _public(job)
+        end_event = _end_event(job)
+        _prune_finished()
+    _save_run(snapshot)
 
-    threading.Thread(target=wrapper, daemon=True).start()
+    # announced after it is saved, so the run is already in the history for anyone told it finished
+    with _jobs_lock:
+        _publish(job, end_event)
+
+def _run(job_id, target_func):
+    with _jobs_lock:
+        job = _jobs[job_id]
+        if job["cancel_requested"]:
+            cancelled = True
+        else:
+            cancelled = False
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            snapshot = _public(job)
+    if cancelled:
+        _finish(job_id, "cancelled")
+        return
+
+    _save_run(snapshot)
+    _current.job_id = job_id
+    try:
+        result = target_func()
+    except JobCancelled:
+        print(f"Job '{job['name']}' cancelled.")
+        _finish(job_id, "cancelled")
+    except Exception as e:
+        traceback.print_exc()
+        _finish(job_id, "failed", error=f"{type(e).__name__}: {e}")
+    else:
+        _finish(job_id, "succeeded", result=_json_safe(result))
+    finally:
+        _current.job_id = None
+
+def start_job(name, target_func, dedupe=True, trigger="manual"):
+    """
+    queue target_func to run on the job pool, and return the job's id. trigger records
+    what started the job in its run history.
+    if dedupe is set and a job with the same name is already queued or running,
+    nothing new is started and that job's id is returned instead.
+    """
+    with _jobs_lock:
+        if dedupe:
+            for job in _jobs.values():
+                if job["name"] == name and job["running"]:
+                    return job["id"]
+
+        job_id = str(uuid.uuid4())
+        _jobs[job_id] = _job_record(job_id, name, trigger)
+        _publish(_jobs[job_id], _start_event(_jobs[job_id]))
+
+    _pool.submit(_run, job_id, target_func)
     return job_id
 
+def _public(job):
+    job = dict(job)
+    if job["progress"]:
+        job["progress"] = {k: v for k, v in job["progress"].items() if k not in _PRIVATE_PROGRESS_KEYS}
+    job["stages"] = {stage: dict(timing) for stage, timing in job["stages"].items()}
+    return job
+
 def get_jobs():
     with _jobs_lock:
-        return dict(_jobs)
\ No newline at end of file
+        return {job_id: _public(job) for job_id, job in _jobs.items()}
+
+def get_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return _public(job) if job else None
+
+def cancel_job(job_id):
+    """
+    ask a job to stop. a queued job won't start, and a running one stops the next
+    time it calls check_cancelled(). returns False if there is no such unfinished job.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or not job["running"]:
+            return False
+        job["cancel_requested"] = True
+        return True
+
+def _current_job():
+    job_id = getattr(_current, "job_id", None)
+    return _jobs.get(job_id) if job_id else None
+
+def is_cancelled():
+    """whether the job running on this thread has been asked to stop"""
+    with _jobs_lock:
+        job = _current_job()
+        return bool(job and job["cancel_requested"])
+
+def check_cancelled():
+    """
+    raise JobCancelled if the job running on this thread has been asked to stop.
+    jobs should call this between units of work that are safe to stop after.
+    """
+    if is_cancelled():
+        raise JobCancelled()
+
+def set_stage(stage, total=None):
+    """
+    start a new stage of the job running on this thread (e.g. "movies"), resetting
+    its progress. does nothing if the function wasn't started as a job.
+    """
+    now = time.time()
+    with _jobs_lock:
+        job = _current_job()
+        if job is None:
+            return
+        _close_stage(job, now)
+        job["progress"] = {
+            "stage": stage,
+            "done": 0,
+            "total": total,
+            "rate": None,
+            "eta": None,
+            "stage_started_at": now,
+            "published_at": now,
+        }
+        _publish(job, {"type": "stage", "stage": stage, "total": total})
+
+def report_progress(done, total, stage=None):
+    """
+    report the progress of the job running on this thread, through its current stage
+    (or a new stage, if one is given). the rate (items per second) and eta (seconds
+    left) are worked out from the time spent in the stage so far.
+    does nothing if the function wasn't started as a job.
+    """
+    with _jobs_lock:
+        job = _current_job()
+        if job is None:
+            return
+        progress = job["progress"]
+        new_stage = progress is None or (stage is not None and stage != progress["stage"])
+    if new_stage:
+        set_stage(stage, total)
+
+    now = time.time()
+    with _jobs_lock:
+        job = _current_job()
+        progress = job["progress"]
+        elapsed = now - progress["stage_started_at"]
+        rate = done / elapsed if elapsed > 0 and done else None
+        progress.update({
+            "done": done,
+            "total": total,
+            "rate": round(rate, 2) if rate else None,
+            "eta": round((total - done) / rate, 1) if rate and total is not None else None,
+        })
+
+        # progress can be reported for every item, so events are sent at most every
+        # JOB_PROGRESS_EVENT_INTERVAL, and when the stage's total is reached
+        if now - progress["published_at"] >= JOB_PROGRESS_EVENT_INTERVAL or done == total:
+            progress["published_at"] = now
+            _publish(job, {"type": "progress", **{k: progress[k] for k in ("stage", "done", "total", "rate", "eta")}})
+
+async def stream_job_events(job_id: str = None):
+    """
+    follow a job (or every job, if job_id is None) as it runs, returning its start,
+    stage, progress and complete/error events as SSE events. each event has the job's id.
+
+    when following one job, the stream starts with its current state and ends once it
+    has finished. when following every job, it starts with a start event for each
+    unfinished job and carries on until the client goes away.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    with _jobs_lock:
+        if job_id is not None and job_id not in _jobs:
+            jobs = None
+        else:
+            jobs = [_jobs[job_id]] if job_id is not None else [job for job in _jobs.values() if job["running"]]
+            initial = [{**_start_event(job), "job_id": job["id"]} for job in jobs]
+            if job_id is not None and not jobs[0]["running"]:
+                initial.append({**_end_event(jobs[0]), "job_id": job_id})
+            _subscribers.setdefault(job_id, set()).add((loop, queue))
+
+    if jobs is None:
+        yield f"data: {json.dumps({'type': 'error', 'job_id': job_id, 'message': 'job not found'})}\n\n"
+        return
+
+    try:
+        for event in initial:
+            yield f"data: {json.dumps(event)}\n\n"
+        if job_id is not None and initial[-1]["type"] in ("complete", "error"):
+            return
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), JOB_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            yield f"data: {json.dumps(event)}\n\n"
+            if job_id is not None and event["type"] in ("complete", "error"):
+                return
+    finally:
+        with _jobs_lock:
+            listeners = _subscribers.get(job_id)
+            if listeners is not None:
+                listeners.discard((loop, queue))
+                if not listeners:
+                    del _subscribers[job_id]
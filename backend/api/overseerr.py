@@ -94,10 +94,70 @@ def set_url(val: str):
     """set the url of the Overseerr instance's API to the .env file"""
     return config.set_config_value("OVERSEERR_API_URL", val)
 
+REQUESTS_PAGE_SIZE = 50
+
+def iter_request_pages(page_size: int = REQUESTS_PAGE_SIZE):
+    """
+    yield pages (lists) of requests from Overseerr, most recently updated first.
+    stop iterating early to avoid fetching the remaining pages.
+    """
+    skip = 0
+    while True:
+        response = getFromAPI("request", [{"take": page_size}, {"skip": skip}, {"sort": "modified"}], forceFresh=True)
+        if response is None:
+            # don't mistake a failed request for the end of the list
+            raise RuntimeError(f"Failed to get requests from Overseerr (skip={skip}, take={page_size})")
+
+        results = response.get("results") or []
+        if not results:
+            return
+
+        yield results
+
+        if len(results) < page_size:
+            return
+        skip += page_size
+
 def get_requests():
-    response = getFromAPI("request", [{"take": 9999999}], forceFresh=True)
-    if response and response.get("results"):
-        return response["results"]
+    all_requests = [request for page in iter_request_pages() for request in page]
+    if all_requests:
+        return all_requests
+
+def get_request(request_id):
+    """get a single request from Overseerr, in the same format as get_requests()"""
+    return getFromAPI(f"request/{request_id}", forceFresh=True)
+
+def webhook_auth():
+    """
+    get the Authorization header Overseerr is expected to send with webhook notifications
+    (as set in Overseerr's webhook agent settings), or None if not required.
+    """
+    cnf = config.get_overseerr_config()
+    return cnf['webhook_auth']
+
+def set_webhook_auth(val: str):
+    return config.set_config_value("OVERSEERR_WEBHOOK_AUTH", val)
+
+def set_last_requests_process(val: int):
+    """requests updated before this unix time have all been processed"""
+    return config.set_config_value("OVERSEERR_LAST_REQUESTS_PROCESS", str(val))
+
+def get_requests_sync_window():
+    """
+    get the (oldest, newest) updatedAt range of requests already processed by an
+    interrupted request sync, or None if the last sync finished.
+    """
+    cnf = config.get_overseerr_config()
+    window = cnf['requests_sync_window']
+    if not window:
+        return None
+    low, high = window.split(",")
+    return int(low), int(high)
+
+def set_requests_sync_window(window):
+    """set (or clear, with None) the range of requests processed by an in-progress sync"""
+    val = f"{window[0]},{window[1]}" if window else ""
+    return config.set_config_value("OVERSEERR_REQUESTS_SYNC_WINDOW", val)
 
 def get_movie_poster_url(tmdb_id: str):
     """get the TMDb URL for the poster of a given movie"""
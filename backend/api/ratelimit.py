@@ -0,0 +1,52 @@
+# -----------------------------contactarr------------------------------
+# This file is part of contactarr
+# Copyright (C) 2025 goggybox https://github.com/goggybox
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# that this program is licensed under. See LICENSE file. If not
+# available, see <https://www.gnu.org/licenses/>.
+
+# Please keep this header comment in all copies of the program.
+# --------------------------------------------------------------------
+
+import time
+from threading import Lock
+
+class RateLimiter:
+    """
+    token bucket rate limiter, shared between threads.
+    allows `rate` calls per second on average, with bursts of up to `burst` calls.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self):
+        """block until a call is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
@@ -0,0 +1,234 @@
+# -----------------------------contactarr------------------------------
+# This file is part of contactarr
+# Copyright (C) 2025 goggybox https://github.com/goggybox
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# that this program is licensed under. See LICENSE file. If not
+# available, see <https://www.gnu.org/licenses/>.
+
+# Please keep this header comment in all copies of the program.
+# --------------------------------------------------------------------
+
+import random
+import threading
+from datetime import datetime, timedelta
+from backend.api import config
+from backend.api import automated
+from backend.api import smtp
+from backend.api.cache import compactCache
+from backend.api.jobRegister import start_job, get_job
+from backend.db import db
+
+SCHEDULER_POLL_INTERVAL = 30 # seconds between checks for due tasks
+SCHEDULER_CATCH_UP_DELAY = 120 # seconds after starting before runs missed while stopped are made up
+
+_CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 6), # 0 is sunday
+)
+
+class CronSchedule:
+    """
+    a subset of cron: five fields (minute hour day month weekday), each of which is *,
+    a number, a range a-b, a step */n or a-b/n, or a comma-separated list of those.
+    unlike cron, day and weekday must both match when both are given.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = expression.split()
+        if len(fields) != len(_CRON_FIELDS):
+            raise ValueError(f"cron expression '{expression}' should have {len(_CRON_FIELDS)} fields")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse_field(field, name, low, high)
+            for field, (name, low, high) in zip(fields, _CRON_FIELDS)
+        )
+
+    @staticmethod
+    def _parse_field(field, name, low, high):
+        values = set()
+        for part in field.split(","):
+            part, _, step = part.partition("/")
+            step = int(step) if step else 1
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(x) for x in part.split("-", 1))
+            else:
+                start = end = int(part)
+                if step != 1:
+                    end = high
+            if not (low <= start <= end <= high) or step < 1:
+                raise ValueError(f"invalid {name} '{field}'")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def next_after(self, after: datetime) -> datetime:
+        """the first time (to the minute) after `after` that the schedule matches"""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif t.day not in self.days or (t.weekday() + 1) % 7 not in self.weekdays:
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron expression '{self.expression}' never matches")
+
+class ScheduledTask:
+    """
+    a function run as a job (see jobRegister) on a cron schedule. each run is started
+    at a random time up to `jitter` seconds after the scheduled time, so that tasks
+    sharing a schedule (or many instances sharing a server) don't all start at once.
+    """
+
+    def __init__(self, name: str, cron: str, func, job_name: str, jitter: int = 0):
+        self.name = name
+        self.schedule = CronSchedule(cron)
+        self.func = func
+        self.job_name = job_name
+        self.jitter = jitter
+        self.job_id = None
+        self.last_run = None
+        self.next_run = None
+
+    def plan(self, after: datetime):
+        self.next_run = self.schedule.next_after(after) + timedelta(seconds=random.uniform(0, self.jitter))
+
+class Scheduler:
+    """
+    runs ScheduledTasks on a background thread. the time of each task's last run is
+    kept in the database, so a run missed while contactarr was stopped is made up
+    (once) shortly after it starts again. a task is not started again while its
+    previous run is still going, and as jobs are deduplicated by name, a scheduled run
+    doesn't start while the same job started from the UI is running either.
+    """
+
+    def __init__(self, tasks: list):
+        self.tasks = {task.name: task for task in tasks}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if config.get_scheduler_config()['enabled'] != "1":
+            print("Scheduler disabled (SCHEDULER_ENABLED), not starting.")
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        last_runs = db.get_scheduled_task_runs()
+        now = datetime.now()
+        catch_up = now + timedelta(seconds=SCHEDULER_CATCH_UP_DELAY)
+        with self._lock:
+            for task in self.tasks.values():
+                ran_at = last_runs.get(task.name)
+                task.last_run = datetime.fromtimestamp(ran_at) if ran_at else None
+                task.plan(task.last_run or now)
+                if task.next_run < catch_up:
+                    task.next_run = catch_up + timedelta(seconds=random.uniform(0, task.jitter))
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(SCHEDULER_POLL_INTERVAL):
+            try:
+                self.run_due()
+            except Exception as e:
+                print(f"[SCHEDULER] Error starting scheduled tasks: {e}")
+
+    def run_due(self, now: datetime = None):
+        """start every task whose next run is due"""
+        now = now or datetime.now()
+        with self._lock:
+            for task in self.tasks.values():
+                if task.next_run is None or task.next_run > now:
+                    continue
+
+                job = get_job(task.job_id) if task.job_id else None
+                if job and job["running"]:
+                    print(f"[SCHEDULER] '{task.name}' is still running from {task.last_run}, skipping this run.")
+                else:
+                    task.job_id = start_job(task.job_name, task.func, trigger="scheduler")
+                    task.last_run = now
+                    db.set_scheduled_task_run(task.name, int(now.timestamp()))
+                task.plan(now)
+
+    def get_tasks(self):
+        with self._lock:
+            return [
+                {
+                    "name": task.name,
+                    "schedule": task.schedule.expression,
+                    "job_name": task.job_name,
+                    "job_id": task.job_id,
+                    "last_run": int(task.last_run.timestamp()) if task.last_run else None,
+                    "next_run": int(task.next_run.timestamp()) if task.next_run else None,
+                }
+                for task in self.tasks.values()
+            ]
+
+def compact_caches():
+    """delete stale api responses, and poster variants and sprites that aren't being used"""
+    return {
+        "api_cache_removed": compactCache(),
+        "poster_files_removed": db.compact_poster_cache(),
+    }
+
+def newly_released_content_email():
+    """
+    find this week's new episodes, and email them to each user if newly released
+    content updates are turned on in the automated emails settings.
+    """
+    db.refresh_new_episodes()
+    if str(automated.get_newly_released_content_setting()) != "1":
+        return None
+    return {"campaign_id": smtp.queue_newly_released_content_digest()}
+
+def request_for_unreleased_content_email():
+    """
+    email users who have recently requested a movie on Overseerr that is only in cinemas
+    (or not out at all), if request for unreleased content emails are turned on in the
+    automated emails settings.
+    """
+    if str(automated.get_request_for_unreleased_content_setting()) != "1":
+        return None
+    return {"campaign_id": smtp.queue_unreleased_request_emails()}
+
+task_scheduler = Scheduler([
+    # overseerr syncs only look at requests updated since the last one
+    ScheduledTask("overseerr_sync", "*/30 * * * *", db.link_overseerr, "Fetching data from Overseerr...", jitter=300),
+    ScheduledTask("tautulli_sync", "0 3 * * *", db.link_tautulli, "Fetching data from Tautulli...", jitter=1800),
+    ScheduledTask("poster_prefetch", "15 * * * *", db.prefetch_posters, "Fetching posters...", jitter=600),
+    ScheduledTask("cache_compaction", "30 4 * * *", compact_caches, "Compacting caches...", jitter=1800),
+    ScheduledTask("new_episodes_refresh", "0 6 * * *", db.refresh_new_episodes, "Finding newly released episodes...", jitter=900),
+    # new episodes cover the last 7 days, so the email goes out weekly (sunday at noon, as the settings page says)
+    ScheduledTask("newly_released_content_email", "0 12 * * 0", newly_released_content_email,
+                  "Sending newly released content emails...", jitter=900),
+    # runs after each overseerr sync has had time to pick up new requests
+    ScheduledTask("request_for_unreleased_content_email", "15,45 * * * *", request_for_unreleased_content_email,
+                  "Sending unreleased request emails...", jitter=300),
+])
@@ -25,15 +25,64 @@ import requests
 import re
 import smtplib
 import json
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from email.message import EmailMessage
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
+from email.mime.base import MIMEBase
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from fastapi.responses import StreamingResponse
-from backend.api.cache import apiGet, clearCache
+from backend.api.cache import apiGet, clearCache, ByteLRU
 from backend.api import config
+from backend.api import templates
+from backend.api import images
+from backend.db import db
+
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60 # seconds, doubled after each failed attempt
+OUTBOX_POLL_INTERVAL = 0.5
+EMAIL_POSTER_PARTS_BUDGET = 32 * 1024 * 1024 # bytes of encoded posters kept ready to attach
+
+# limits on concurrent sessions per SMTP server ("host:port" -> (limit, semaphore)),
+# shared between all sends so that two campaigns don't double the connections.
+_server_limits = {}
+_server_limits_lock = threading.Lock()
+
+def _int_setting(cnf, key, default):
+    try:
+        return max(1, int(cnf.get(key) or default))
+    except (TypeError, ValueError):
+        return default
+
+def _use_async(cnf):
+    """whether to send with the asyncio transport (SMTP_TRANSPORT=async)"""
+    if (cnf.get('transport') or '').lower() != 'async':
+        return False
+    if aiosmtplib is None:
+        print("[EMAIL] SMTP_TRANSPORT is async but aiosmtplib is not installed, using threads.")
+        return False
+    return True
+
+def _server_limit(cnf):
+    server = f"{cnf['host']}:{cnf['port']}"
+    limit = _int_setting(cnf, 'max_connections', 4)
+    with _server_limits_lock:
+        current = _server_limits.get(server)
+        if current is None or current[0] != limit:
+            current = (limit, threading.BoundedSemaphore(limit))
+            _server_limits[server] = current
+        return current[1]
 
 def host():
     cnf = config.get_smtp_config()
@@ -57,6 +106,14 @@ def user():
 def set_user(val: str):
     return config.set_config_value("SMTP_USER", val)
 
+def sender():
+    """the address automated emails are sent from (SMTP_SENDER, or SMTP_USER if not set)"""
+    cnf = config.get_smtp_config()
+    return cnf['sender'] or cnf['user']
+
+def set_sender(val: str):
+    return config.set_config_value("SMTP_SENDER", val)
+
 def password():
     cnf = config.get_smtp_config()
     return cnf['pass']
@@ -91,107 +148,590 @@ def send_test_email(sender, recipient):
     recipients = recipient.split(",")
     cnf = config.get_smtp_config()
 
-    errors = 0
+    messages = []
     for r in recipients:
         msg = EmailMessage()
         msg["Subject"] = "contactarr | Testing Testing 123..."
         msg["From"] = sender
         msg["To"] = r
         msg.set_content("If you are reading this, your contactarr email test was successful!")
-        try:
-            with smtplib.SMTP(cnf['host'], cnf['port']) as smtp:
-                smtp.starttls()
-                smtp.login(cnf['user'], cnf['pass'])
-                smtp.send_message(msg)
-        except Exception as e:
-            errors += 1
+        messages.append((r, msg.as_string()))
+
+    # all recipients share one session
+    if _use_async(cnf):
+        errors = asyncio.run(_send_messages_async(cnf, sender, messages))
+    else:
+        errors = _send_messages(cnf, sender, messages)
     
     if errors > 0:
         return {"status": 500}
 
     return {"status": 200}
 
-def send_email_stream(subject: str, html_body: str, recipients: list, sender: str):
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.dirname(BACKEND_DIR)
+BANNER_PATH = os.path.join(SRC_DIR, "frontend", "emails", "server", "banner.png")
+
+_email_images = images.EmailImageStore()
+# (media_type, media_id) -> (etag of the poster file, MIME part), sized by the encoded image
+_email_poster_parts = ByteLRU(EMAIL_POSTER_PARTS_BUDGET, sizeof=lambda entry: len(entry[1].get_payload()))
+
+def _email_poster_part(media_type, media_id):
     """
-    sends individual emails to a list of recipients.
-    uses SSE events to return progress updates.
+    the inline MIME part for a poster referenced as images.poster_cid(media_type, media_id).
+    the part holds the already-encoded image, so attaching it to a message costs nothing.
+    parts are reused for as long as the poster file is unchanged (its etag is the hash of
+    its contents), and missing posters aren't remembered, so they're tried again next time.
     """
-    cnf = config.get_smtp_config()
-    total = len(recipients)
+    poster = db.get_poster_file(media_type, media_id)
+    if poster is None:
+        return None
+    path, etag, _ = poster
+
+    cached = _email_poster_parts.get((media_type, media_id))
+    if cached is not None and cached[0] == etag:
+        return cached[1]
+
+    with open(path, "rb") as f:
+        image = _email_images.get(f.read())
+    if image is None:
+        return None
+
+    part = MIMEBase('image', image.subtype)
+    part.set_payload(image.b64)
+    part['Content-Transfer-Encoding'] = 'base64'
+    part.add_header('Content-ID', f'<poster-{media_type}-{media_id}@contactarr>')
+    part.add_header('Content-Disposition', 'inline', filename=f'poster-{media_type}-{media_id}.{image.subtype}')
+    _email_poster_parts.put((media_type, media_id), (etag, part))
+    return part
+
+class EmailCampaign:
+    """
+    one email to be sent to many recipients.
+    everything shared between recipients (the html part, the base64-encoded banner, the
+    other headers) is built and serialised once here, and message_for() only adds the
+    recipient's "To" header in front of it.
+    personalised campaigns give each recipient their own html, but still share the banner
+    and poster parts (posters are referenced with images.poster_cid()).
+    """
+
+    def __init__(self, subject: str, html_body: str, sender: str):
+        self.subject = subject
+        self.sender = sender
+
+        self._banner = None
+        if os.path.exists(BANNER_PATH):
+            with open(BANNER_PATH, 'rb') as img_file:
+                self._banner = MIMEImage(img_file.read())
+                self._banner.add_header('Content-ID', '<banner_image>')
+                self._banner.add_header('Content-Disposition', 'inline', filename='banner.png')
+
+        self._serialised = self._serialise(html_body)
+
+    def _serialise(self, html_body):
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = self.subject
+        msg['From'] = self.sender
+
+        html_with_cid = html_body.replace('src="banner.png"', 'src="cid:banner_image"')
+        msg_html = MIMEText(html_with_cid, 'html')
+        msg.attach(msg_html)
+
+        if self._banner is not None:
+            msg.attach(self._banner)
+
+        for media_type, media_id in dict.fromkeys(images.POSTER_CID_RE.findall(html_body)):
+            part = _email_poster_part(media_type, int(media_id))
+            if part is not None:
+                msg.attach(part)
+
+        return msg.as_string()
+
+    def message_for(self, recipient: str, html_body: str = None) -> str:
+        """
+        the full message, ready for sendmail(), addressed to the given recipient.
+        html_body replaces the campaign's html for this recipient, if given.
+        """
+        body = self._serialised if html_body is None else self._serialise(html_body)
+        # don't let a recipient string add headers of its own
+        recipient = recipient.replace("\r", "").replace("\n", "")
+        return f"To: {recipient}\n{body}"
+
+class SMTPSession:
+    """
+    an authenticated SMTP connection that is reused for many messages.
+    reconnects after `messages_per_session` messages (many servers limit how many messages
+    one connection may send), and when the server drops the connection.
+    """
+
+    def __init__(self, cnf, messages_per_session=100):
+        self.cnf = cnf
+        self.messages_per_session = messages_per_session
+        self._smtp = None
+        self._sent = 0
+
+    @property
+    def connected(self):
+        return self._smtp is not None
+
+    def connect(self):
+        self.close()
+        smtp_conn = smtplib.SMTP(self.cnf['host'], self.cnf['port'])
+        try:
+            smtp_conn.starttls()
+            smtp_conn.login(self.cnf['user'], self.cnf['pass'])
+        except Exception:
+            smtp_conn.close()
+            raise
+        self._smtp = smtp_conn
+        self._sent = 0
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+    def send(self, sender, recipients, msg_string):
+        if self._smtp is None or self._sent >= self.messages_per_session:
+            self.connect()
+
+        try:
+            self._smtp.sendmail(sender, recipients, msg_string)
+        except smtplib.SMTPServerDisconnected:
+            # the server dropped us (idle timeout, restart...), try once more on a new connection
+            self.connect()
+            self._smtp.sendmail(sender, recipients, msg_string)
+        self._sent += 1
+
+class AsyncSMTPSession:
+    """
+    the asyncio version of SMTPSession (using aiosmtplib), so that many sessions can be
+    driven from one event loop.
+    """
+
+    def __init__(self, cnf, messages_per_session=100):
+        self.cnf = cnf
+        self.messages_per_session = messages_per_session
+        self._smtp = None
+        self._sent = 0
+
+    @property
+    def connected(self):
+        return self._smtp is not None
+
+    async def connect(self):
+        await self.close()
+        smtp_conn = aiosmtplib.SMTP(hostname=self.cnf['host'], port=int(self.cnf['port']), start_tls=False)
+        await smtp_conn.connect()
+        try:
+            await smtp_conn.starttls()
+            await smtp_conn.login(self.cnf['user'], self.cnf['pass'])
+        except Exception:
+            smtp_conn.close()
+            raise
+        self._smtp = smtp_conn
+        self._sent = 0
+
+    async def close(self):
+        if self._smtp is None:
+            return
+        try:
+            await self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+    async def send(self, sender, recipients, msg_string):
+        if self._smtp is None or self._sent >= self.messages_per_session:
+            await self.connect()
+
+        try:
+            await self._smtp.sendmail(sender, recipients, msg_string)
+        except aiosmtplib.SMTPServerDisconnected:
+            await self.connect()
+            await self._smtp.sendmail(sender, recipients, msg_string)
+        self._sent += 1
+
+def _send_messages(cnf, sender, messages):
+    """send (recipient, message) pairs over a single session. returns the number that failed."""
+    session = SMTPSession(cnf, len(messages))
+    errors = 0
+    try:
+        for recipient, message in messages:
+            try:
+                session.send(sender, [recipient], message)
+            except Exception:
+                errors += 1
+    finally:
+        session.close()
+    return errors
+
+async def _send_messages_async(cnf, sender, messages):
+    session = AsyncSMTPSession(cnf, len(messages))
+    errors = 0
+    try:
+        for recipient, message in messages:
+            try:
+                await session.send(sender, [recipient], message)
+            except Exception:
+                errors += 1
+    finally:
+        await session.close()
+    return errors
+
+def _delivery_worker(cnf, next_job, report):
+    """
+    sends the messages given by next_job() over one pooled session until it returns None,
+    passing each message and its error (or None) to report().
+    returns the error that stopped the session, if one did.
+    """
+    messages_per_session = _int_setting(cnf, 'messages_per_session', 100)
+
+    with _server_limit(cnf):
+        session = SMTPSession(cnf, messages_per_session)
+        try:
+            while True:
+                # connect before taking a message, so that if we can't connect, another
+                # worker can still send it
+                if not session.connected:
+                    session.connect()
+
+                job = next_job()
+                if job is None:
+                    return None
+
+                try:
+                    session.send(job["sender"], [job["recipient"]], job["message"])
+                    report(job, None)
+                except Exception as e:
+                    report(job, e)
+        except Exception as e:
+            print(f"[EMAIL OUTBOX] SMTP session failed: {str(e)}")
+            return e
+        finally:
+            session.close()
+
+async def _async_delivery_worker(cnf, next_job, report):
+    """
+    the asyncio version of _delivery_worker. the (blocking) database calls made by
+    next_job() and report() are run in threads, so they don't hold up the other sessions.
+    """
+    messages_per_session = _int_setting(cnf, 'messages_per_session', 100)
+    limit = _server_limit(cnf)
+    await asyncio.to_thread(limit.acquire)
+
+    session = AsyncSMTPSession(cnf, messages_per_session)
+    try:
+        while True:
+            if not session.connected:
+                await session.connect()
+
+            job = await asyncio.to_thread(next_job)
+            if job is None:
+                return None
+
+            try:
+                await session.send(job["sender"], [job["recipient"]], job["message"])
+                error = None
+            except Exception as e:
+                error = e
+            await asyncio.to_thread(report, job, error)
+    except Exception as e:
+        print(f"[EMAIL OUTBOX] SMTP session failed: {str(e)}")
+        return e
+    finally:
+        await session.close()
+        limit.release()
+
+def _is_temporary_failure(e):
+    """4xx replies and lost connections are worth retrying; 5xx replies are not"""
+    if aiosmtplib is not None and isinstance(e, aiosmtplib.SMTPException):
+        if isinstance(e, aiosmtplib.SMTPRecipientsRefused):
+            codes = [refused.code for refused in e.recipients]
+            return bool(codes) and all(400 <= code < 500 for code in codes)
+        if isinstance(e, aiosmtplib.SMTPResponseException):
+            return 400 <= e.code < 500
+        return isinstance(e, (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError,
+                              aiosmtplib.SMTPTimeoutError))
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in e.recipients.values()]
+        return bool(codes) and all(400 <= code < 500 for code in codes)
+    if isinstance(e, smtplib.SMTPResponseException):
+        return 400 <= e.smtp_code < 500
+    if isinstance(e, smtplib.SMTPException):
+        return isinstance(e, smtplib.SMTPServerDisconnected)
+    return isinstance(e, OSError)
+
+@lru_cache(maxsize=8)
+def _get_campaign(campaign_id):
+    campaign = db.get_email_campaign(campaign_id)
+    return EmailCampaign(campaign["subject"], campaign["html_body"], campaign["sender"])
+
+class OutboxSender:
+    """
+    background thread that delivers the email outbox (see db.create_email_campaign).
+
+    whenever messages are due, it opens a pool of SMTP sessions (SMTP_POOL_SIZE) which
+    each claim and send one message at a time until none are due. temporary (4xx) failures
+    are retried up to OUTBOX_MAX_ATTEMPTS times, waiting twice as long after each attempt.
+    since every message's status is stored, a restart carries on where it left off.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        # why the last delivery round couldn't open any SMTP session, if it couldn't
+        self.error = None
+
+    def wake(self):
+        """start the sender if needed, and have it look for due messages"""
+        # forget the last error until the next delivery round has tried again
+        self.error = None
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        recovered = db.recover_outbox()
+        if recovered:
+            print(f"[EMAIL OUTBOX] Marked {recovered} interrupted messages as failed.")
+
+        while True:
+            self._wake.clear()
+            try:
+                next_at = db.get_next_outbox_attempt()
+                if next_at is not None and next_at <= time.time():
+                    if self._deliver():
+                        continue
+                    # couldn't connect, try again later (or when woken)
+                    timeout = OUTBOX_RETRY_DELAY
+                else:
+                    timeout = None if next_at is None else next_at - time.time()
+            except Exception as e:
+                print(f"[EMAIL OUTBOX] Error delivering outbox: {str(e)}")
+                timeout = OUTBOX_RETRY_DELAY
+
+            self._wake.wait(timeout)
+
+    def _next_job(self):
+        while True:
+            message = db.claim_next_outbox_message()
+            if message is None:
+                return None
+            try:
+                campaign = _get_campaign(message["campaign_id"])
+                message["message"] = campaign.message_for(message["recipient"], message["html_body"])
+                return message
+            except Exception as e:
+                db.mark_outbox_failed(message["outbox_id"], f"could not build message: {str(e)}")
+
+    def _report(self, job, error):
+        if error is None:
+            db.mark_outbox_sent(job["outbox_id"])
+        elif _is_temporary_failure(error) and job["attempts"] < OUTBOX_MAX_ATTEMPTS:
+            retry_at = int(time.time()) + OUTBOX_RETRY_DELAY * 2 ** (job["attempts"] - 1)
+            db.mark_outbox_failed(job["outbox_id"], str(error), retry_at)
+        else:
+            db.mark_outbox_failed(job["outbox_id"], str(error))
+
+    def _deliver(self):
+        """send everything that is due. returns False if no SMTP session could be opened."""
+        cnf = config.get_smtp_config()
+        pool_size = _int_setting(cnf, 'pool_size', 4)
+
+        if _use_async(cnf):
+            errors = asyncio.run(self._deliver_async(cnf, pool_size))
+        else:
+            with ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="smtp-worker") as pool:
+                futures = [pool.submit(_delivery_worker, cnf, self._next_job, self._report) for _ in range(pool_size)]
+                errors = [future.result() for future in futures]
+
+        if all(errors):
+            self.error = str(errors[-1])
+            return False
+
+        self.error = None
+        return True
+
+    async def _deliver_async(self, cnf, pool_size):
+        # every session runs on this one event loop
+        return await asyncio.gather(*(
+            _async_delivery_worker(cnf, self._next_job, self._report) for _ in range(pool_size)
+        ))
+
+outbox_sender = OutboxSender()
+
+async def stream_campaign_progress(campaign_id: int):
+    """
+    follows the outbox as a campaign is sent, returning progress updates as SSE events.
+    this is an async generator, so following a long campaign doesn't hold a worker thread.
+    """
+    campaign = await asyncio.to_thread(db.get_email_campaign, campaign_id)
+    if not campaign:
+        yield f"data: {json.dumps({'type': 'error', 'message': 'campaign not found'})}\n\n"
+        return
+
+    total = campaign["total"]
     successful = 0
     failed = 0
     results = []
+    reported = set()
+    since = 0
 
-    BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    SRC_DIR = os.path.dirname(BACKEND_DIR)
-    BANNER_PATH = os.path.join(SRC_DIR, "frontend", "emails", "server", "banner.png")
-    yield f"data: {json.dumps({'type': 'start', 'total': total})}\n\n"
+    yield f"data: {json.dumps({'type': 'start', 'total': total, 'campaign_id': campaign_id})}\n\n"
 
     try:
-        print(f"[EMAIL STREAM] Connecting to SMTP...")
-        with smtplib.SMTP(cnf['host'], cnf['port']) as smtp_conn:
-            print(f"[EMAIL STREAM] Connected, starting TLS...")
-            smtp_conn.starttls()
-            print(f"[EMAIL STREAM] TLS started, logging in...")
-            smtp_conn.login(cnf['user'], cnf['pass'])
-            print(f"[EMAIL STREAM] Logged in successfully")
+        while True:
+            counts, finished = await asyncio.to_thread(db.get_outbox_progress, campaign_id, since)
 
-            for idx, recipient in enumerate(recipients, 1):
-                print(f"[EMAIL STREAM] Processing {idx}/{total}: {recipient}")
-                try:
-                    msg = MIMEMultipart('alternative')
-                    msg['Subject'] = subject
-                    msg['From'] = sender
-                    msg['To'] = recipient
-
-                    html_with_cid = html_body.replace('src="banner.png"', 'src="cid:banner_image"')
-                    msg_html = MIMEText(html_with_cid, 'html')
-                    msg.attach(msg_html)
-
-                    if os.path.exists(BANNER_PATH):
-                        with open(BANNER_PATH, 'rb') as img_file:
-                            img_data = img_file.read()
-                            img = MIMEImage(img_data)
-                            img.add_header('Content-ID', '<banner_image>')
-                            img.add_header('Content-Disposition', 'inline', filename='banner.png')
-                            msg.attach(img)
-
-                    smtp_conn.sendmail(sender, [recipient], msg.as_string())
-                    
+            for row in finished:
+                since = max(since, row["updated_at"])
+                if row["outbox_id"] in reported:
+                    continue
+                reported.add(row["outbox_id"])
+
+                if row["status"] == "sent":
                     successful += 1
                     result = {
                         "type": "progress",
-                        "current": idx,
+                        "current": successful + failed,
                         "total": total,
-                        "recipient": recipient,
+                        "recipient": row["recipient"],
                         "status": "success",
                         "successful": successful,
                         "failed": failed
                     }
-                except Exception as e:
+                else:
                     failed += 1
                     result = {
                         "type": "progress",
-                        "current": idx,
+                        "current": successful + failed,
                         "total": total,
-                        "recipient": recipient,
+                        "recipient": row["recipient"],
                         "status": "failed",
-                        "error": str(e),
+                        "error": row["last_error"],
                         "successful": successful,
                         "failed": failed
                     }
 
-                # BUG FIX: 'resulst' -> 'results'
                 results.append(result)
                 yield f"data: {json.dumps(result)}\n\n"
 
-        print(f"[EMAIL STREAM] All done. Successful: {successful}, Failed: {failed}")
+            if successful + failed >= total:
+                break
+
+            if outbox_sender.error and not counts.get("sending"):
+                # the rest stay in the outbox, and will be sent once the SMTP server can be reached
+                print(f"[EMAIL OUTBOX] CRITICAL ERROR: {outbox_sender.error}")
+                yield f"data: {json.dumps({'type': 'error', 'message': outbox_sender.error})}\n\n"
+                return
+
+            await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+        print(f"[EMAIL OUTBOX] Campaign {campaign_id} done. Successful: {successful}, Failed: {failed}")
         final_data = {'type': 'complete', 'total': total, 'successful': successful, 'failed': failed, 'results': results}
-        print(f"[EMAIL STREAM] Yielding complete: {final_data}")
         yield f"data: {json.dumps(final_data)}\n\n"
 
     except Exception as e:
-        print(f"[EMAIL STREAM] CRITICAL ERROR: {str(e)}")
+        print(f"[EMAIL OUTBOX] CRITICAL ERROR: {str(e)}")
         import traceback
         traceback.print_exc()
-        yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
\ No newline at end of file
+        yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+
+def _create_campaign(subject, html_body, sender, recipients, extra_context=None, is_template=True):
+    """
+    queue a campaign in the outbox. if is_template and html_body uses template tags (see
+    templates.Template), it is rendered for each recipient first. extra_context
+    ({email: {...}}) adds to what the template can use for those recipients.
+    otherwise html_body is sent as it is, "{{" and all.
+    """
+    if not is_template:
+        return db.create_email_campaign(subject, html_body, sender, recipients)
+
+    template = templates.compile_template(html_body)
+    if template.is_static:
+        return db.create_email_campaign(subject, html_body, sender, recipients)
+
+    extra_context = extra_context or {}
+    bodies = {
+        email: template.render({**context, **extra_context.get(email, {})})
+        for email, context in db.iter_email_contexts(recipients)
+    }
+    return db.create_email_campaign(subject, html_body, sender, recipients, bodies)
+
+async def send_email_stream(subject: str, html_body: str, recipients: list, sender: str, is_template: bool = False):
+    """
+    queues individual emails to a list of recipients in the outbox, then uses SSE events
+    to return progress updates as they are sent. sending carries on in the background if
+    the client goes away, or after a restart. html_body is only treated as a template
+    (see _create_campaign) if is_template is set.
+    """
+    try:
+        campaign_id = await asyncio.to_thread(
+            _create_campaign, subject, html_body, sender, recipients, is_template=is_template
+        )
+    except Exception as e:
+        print(f"[EMAIL OUTBOX] CRITICAL ERROR: {str(e)}")
+        yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+        return
+
+    outbox_sender.wake()
+    async for event in stream_campaign_progress(campaign_id):
+        yield event
+
+def queue_newly_released_content_digest():
+    """
+    queue the newly released content email (frontend/emails/newly_released_content) to
+    every user in db.get_new_episodes_digest() with at least one new episode, and start
+    sending it. returns the campaign id, or None if there was nobody to send it to.
+    """
+    from_address = sender()
+    if not from_address or not validate_sender(from_address):
+        print("[EMAIL OUTBOX] No valid sender for automated emails, not sending digest.")
+        return None
+
+    recipients = [user["email"] for user in db.get_new_episodes_digest() if user["shows"]]
+    if not recipients:
+        return None
+
+    server_name = config.get_server_config()['name'] or "Plex"
+    template = templates.get_email_template("newly_released_content")
+    campaign_id = _create_campaign(f"New episodes on {server_name}", template.source, from_address, recipients)
+    outbox_sender.wake()
+    return campaign_id
+
+def queue_unreleased_request_emails():
+    """
+    queue the request for unreleased content email (frontend/emails/request_for_unreleased_content)
+    to every user in db.get_unreleased_movie_requests(), telling them which of the movies
+    they requested aren't out for streaming yet, and start sending it. each request is
+    only emailed about once. returns the campaign id, or None if there was nobody to send it to.
+    """
+    from_address = sender()
+    if not from_address or not validate_sender(from_address):
+        print("[EMAIL OUTBOX] No valid sender for automated emails, not sending unreleased request emails.")
+        return None
+
+    users = db.get_unreleased_movie_requests()
+    if not users:
+        return None
+
+    server_name = config.get_server_config()['name'] or "Plex"
+    template = templates.get_email_template("request_for_unreleased_content")
+    campaign_id = _create_campaign(
+        f"Your request on {server_name} isn't out yet",
+        template.source,
+        from_address,
+        [user["email"] for user in users],
+        {user["email"]: {"movies": user["movies"]} for user in users}
+    )
+    db.set_unreleased_requests_emailed([movie["request_id"] for user in users for movie in user["movies"]])
+    outbox_sender.wake()
+    return campaign_id
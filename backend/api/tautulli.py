@@ -23,11 +23,15 @@
 import os
 import requests
 from datetime import datetime, timedelta
+from threading import BoundedSemaphore
 from dotenv import load_dotenv
 from backend.api.cache import apiGet, clearCache
 from backend.api import config
 from urllib.parse import urlencode
 
+TAUTULLI_IMAGE_CONCURRENCY = 4 # poster downloads at once through pms_image_proxy
+_image_slots = BoundedSemaphore(TAUTULLI_IMAGE_CONCURRENCY)
+
 def get_poster_image(tautulli_poster_url: str) -> bytes | None:
     if not tautulli_poster_url:
         return None
@@ -45,7 +49,8 @@ def get_poster_image(tautulli_poster_url: str) -> bytes | None:
     }
 
     try:
-        r = requests.get(api_url, params=params, timeout=15)
+        with _image_slots:
+            r = requests.get(api_url, params=params, timeout=15)
         if r.status_code == 200:
             return r.content
     except Exception:
@@ -152,8 +157,8 @@ def get_shows():
 
     return total_shows
 
-def get_seasons(rating_key):
-    seasons = getFromAPI("get_library_media_info", [{"rating_key": rating_key}])
+def get_seasons(rating_key, forceFresh=False):
+    seasons = getFromAPI("get_library_media_info", [{"rating_key": rating_key}], forceFresh=forceFresh)
 
     if seasons and seasons.get("data") and seasons["data"].get("data"):
         return seasons["data"]["data"]
@@ -266,6 +271,30 @@ def get_movie_watch_history(user_id):
     if history.get("data") and history["data"].get("data"):
         return history["data"]["data"]
 
+def get_recent_history_for_item(user_id, rating_key, length=5):
+    """
+    get the user's most recent watches of a single movie/episode from /get_history,
+    in the same format as get_episode_watch_history() and get_movie_watch_history().
+    """
+    history = getFromAPI("get_history", [{"user_id": user_id}, {"rating_key": rating_key}, {"length": length},
+                                         {"order_column": "stopped"}, {"order_dir": "desc"}], forceFresh=True)
+    if not history:
+        return None
+
+    if history.get("data") and history["data"].get("data"):
+        return history["data"]["data"]
+
+def webhook_auth():
+    """
+    get the Authorization header Tautulli is expected to send with webhook notifications
+    (as set in the webhook notification agent's JSON headers), or None if not required.
+    """
+    cnf = config.get_tautulli_config()
+    return cnf['webhook_auth']
+
+def set_webhook_auth(val: str):
+    return config.set_config_value("TAUTULLI_WEBHOOK_AUTH", val)
+
 def get_library_media_info(rating_key):
     seasons = getFromAPI("get_library_media_info", [{"rating_key": rating_key}])
 
@@ -0,0 +1,236 @@
+# -----------------------------contactarr------------------------------
+# This file is part of contactarr
+# Copyright (C) 2025 goggybox https://github.com/goggybox
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# that this program is licensed under. See LICENSE file. If not
+# available, see <https://www.gnu.org/licenses/>.
+
+# Please keep this header comment in all copies of the program.
+# --------------------------------------------------------------------
+
+import os
+import re
+from functools import lru_cache
+from html import escape
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.dirname(BACKEND_DIR)
+EMAILS_DIR = os.path.join(SRC_DIR, "frontend", "emails")
+
+_TAG_RE = re.compile(r"{{\s*(.*?)\s*}}|{%\s*(.*?)\s*%}", re.S)
+_PATH_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+_FOR_RE = re.compile(r"^for\s+([A-Za-z_][A-Za-z0-9_]*)\s+in\s+(\S+)$")
+_IF_RE = re.compile(r"^if\s+(not\s+)?(\S+)$")
+
+class TemplateSyntaxError(ValueError):
+    pass
+
+def _lookup(value, key, index):
+    """value[key] for a dict, value[index] for a list or tuple, otherwise None"""
+    if isinstance(value, dict):
+        return value.get(key)
+    if isinstance(value, (list, tuple)) and index is not None:
+        return value[index] if index < len(value) else None
+    return None
+
+def _compile_path(path):
+    """
+    turn "a.b.0" into a function getting scope["a"]["b"][0], or None if any part is
+    missing. a number is a dict key ("0") on a dict and an index on a list or tuple.
+    """
+    if not _PATH_RE.match(path):
+        raise TemplateSyntaxError(f"invalid name '{path}'")
+
+    first, *rest = path.split(".")
+    rest = tuple((key, int(key) if key.isdigit() else None) for key in rest)
+
+    def get(scope):
+        value = scope.get(first)
+        try:
+            for key, index in rest:
+                value = _lookup(value, key, index)
+        except Exception:
+            return None
+        return value
+
+    return get
+
+def _text_node(text):
+    def render(scope, append):
+        append(text)
+    return render
+
+def _printable(value):
+    """
+    whether a value can be put into an email. containers (e.g. {{ user }} instead of
+    {{ user.friendly_name }}) are left out, so their contents (ids, email addresses, ...)
+    are never sent to recipients.
+    """
+    return value is not None and not isinstance(value, (dict, list, tuple, set))
+
+def _value_node(expr):
+    path, _, flag = expr.partition("|")
+    get = _compile_path(path.strip())
+
+    if flag.strip() == "raw":
+        def render(scope, append):
+            value = get(scope)
+            if _printable(value):
+                append(str(value))
+    elif flag:
+        raise TemplateSyntaxError(f"unknown filter '{flag.strip()}'")
+    else:
+        def render(scope, append):
+            value = get(scope)
+            if _printable(value):
+                append(escape(str(value)))
+
+    return render
+
+def _for_node(var, path, body):
+    get = _compile_path(path)
+
+    def render(scope, append):
+        items = get(scope)
+        if not items:
+            return
+        # reuse the scope rather than copying it for every item
+        missing = object()
+        previous = scope.get(var, missing)
+        try:
+            for item in items:
+                scope[var] = item
+                for node in body:
+                    node(scope, append)
+        finally:
+            if previous is missing:
+                del scope[var]
+            else:
+                scope[var] = previous
+
+    return render
+
+def _if_node(negate, path, body, else_body):
+    get = _compile_path(path)
+
+    def render(scope, append):
+        if bool(get(scope)) != negate:
+            nodes = body
+        else:
+            nodes = else_body
+        for node in nodes:
+            node(scope, append)
+
+    return render
+
+def _parse(source):
+    """parse the template into a tuple of render functions"""
+    # stack of (tag, info, nodes being collected)
+    stack = [("root", None, [])]
+    position = 0
+
+    for match in _TAG_RE.finditer(source):
+        if match.start() > position:
+            stack[-1][2].append(_text_node(source[position:match.start()]))
+        position = match.end()
+
+        value, tag = match.group(1), match.group(2)
+        if value is not None:
+            stack[-1][2].append(_value_node(value))
+            continue
+
+        if (for_match := _FOR_RE.match(tag)):
+            stack.append(("for", for_match.groups(), []))
+        elif (if_match := _IF_RE.match(tag)):
+            stack.append(("if", [bool(if_match.group(1)), if_match.group(2), None], []))
+        elif tag == "else":
+            if stack[-1][0] != "if" or stack[-1][1][2] is not None:
+                raise TemplateSyntaxError("{% else %} outside of {% if %}")
+            # keep the if's body, and start collecting the else body
+            kind, info, nodes = stack.pop()
+            info[2] = tuple(nodes)
+            stack.append((kind, info, []))
+        elif tag == "endfor":
+            if stack[-1][0] != "for":
+                raise TemplateSyntaxError("unexpected {% endfor %}")
+            _, (var, path), nodes = stack.pop()
+            stack[-1][2].append(_for_node(var, path, tuple(nodes)))
+        elif tag == "endif":
+            if stack[-1][0] != "if":
+                raise TemplateSyntaxError("unexpected {% endif %}")
+            _, (negate, path, body), nodes = stack.pop()
+            if body is None:
+                body, else_body = tuple(nodes), ()
+            else:
+                else_body = tuple(nodes)
+            stack[-1][2].append(_if_node(negate, path, body, else_body))
+        else:
+            raise TemplateSyntaxError(f"unknown tag '{{% {tag} %}}'")
+
+    if len(stack) > 1:
+        raise TemplateSyntaxError(f"{{% {stack[-1][0]} %}} is never closed")
+
+    if position < len(source):
+        stack[0][2].append(_text_node(source[position:]))
+
+    return tuple(stack[0][2])
+
+class Template:
+    """
+    a template for personalising emails:
+        {{ user.friendly_name }}                    a value, html-escaped (nothing for a dict or list)
+        {{ show.poster|raw }}                       a value, not escaped
+        {% for show in shows %}...{% endfor %}
+        {% if not shows %}...{% else %}...{% endif %}
+
+    the template is parsed once into a tree of functions, so rendering it for each of
+    thousands of recipients only walks the tree and joins the output.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._nodes = _parse(source)
+        # templates without any tags render the same for everyone
+        self.is_static = _TAG_RE.search(source) is None
+
+    def render(self, context: dict) -> str:
+        out = []
+        append = out.append
+        scope = dict(context)
+        for node in self._nodes:
+            node(scope, append)
+        return "".join(out)
+
+    def render_many(self, contexts):
+        """render the template once for each context, yielding the results as it goes"""
+        for context in contexts:
+            yield self.render(context)
+
+@lru_cache(maxsize=32)
+def compile_template(source: str) -> Template:
+    """parse a template, reusing the result if the same source was parsed recently"""
+    return Template(source)
+
+@lru_cache(maxsize=16)
+def _load_template(path, mtime):
+    with open(path, "r", encoding="utf-8") as f:
+        return Template(f.read())
+
+def get_email_template(email_type: str, name: str = None) -> Template:
+    """
+    get a template from frontend/emails/<email_type>/<name>.html (name defaults to
+    email_type), only parsing it again if the file has changed.
+    """
+    path = os.path.join(EMAILS_DIR, email_type, f"{name or email_type}.html")
+    return _load_template(path, os.path.getmtime(path))
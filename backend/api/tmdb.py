@@ -24,10 +24,17 @@ import os
 import requests
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
 from backend.api.cache import apiGet, clearCache
+from backend.api.ratelimit import RateLimiter
 from backend.api import config
 
 TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/w600_and_h900_face"
+TMDB_MAX_WORKERS = 8 # concurrent requests when fetching many details at once
+_rate_limiter = RateLimiter(rate=20) # requests per second, well under TMDB's limit
+TMDB_IMAGE_CONCURRENCY = 8 # poster downloads at once
+_image_slots = BoundedSemaphore(TMDB_IMAGE_CONCURRENCY)
 
 def getFromAPI(cmd, args=None, forceFresh=False):
     cnf = config.get_tmdb_config()
@@ -45,7 +52,8 @@ def getFromAPI(cmd, args=None, forceFresh=False):
     params = args or {}
 
     try:
-        data = apiGet(url=url, headers=headers, params=params, forceFresh=forceFresh)
+        # only requests that go to TMDB use up the limiter, not answers from the cache
+        data = apiGet(url=url, headers=headers, params=params, forceFresh=forceFresh, rate_limiter=_rate_limiter)
 
         if data:
             if data.get("results"):
@@ -69,6 +77,29 @@ def get_show(tmdbId):
     # get details about a show from tmdb
     return getFromAPI(f"tv/{tmdbId}")
 
+def get_movie_release_dates(tmdbId):
+    # get every country's release dates for a movie from tmdb, as
+    # [{"iso_3166_1": "US", "release_dates": [{"type": 3, "release_date": "2026-08-02T00:00:00.000Z", ...}]}, ...]
+    return getFromAPI(f"movie/{tmdbId}/release_dates")
+
+def get_many(keys):
+    """
+    get details about many movies and/or shows from tmdb at once.
+    keys are ("movie" | "tv", tmdbId) pairs; duplicates are only fetched once.
+    requests are made concurrently (but still rate limited).
+    returns {key: details or None}
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+
+    def fetch(key):
+        media_type, tmdbId = key
+        return get_movie(tmdbId) if media_type == "movie" else get_show(tmdbId)
+
+    with ThreadPoolExecutor(max_workers=min(TMDB_MAX_WORKERS, len(keys))) as executor:
+        return dict(zip(keys, executor.map(fetch, keys)))
+
 def get_show_tmdb_id(searchQuery):
     # get tmdb ID for a show from its title
     searchQuery = searchQuery.replace(' ', '+')
@@ -83,9 +114,10 @@ def get_poster_image(tmdb_poster_url: str) -> bytes | None:
     url = f"{TMDB_IMAGE_BASE}{tmdb_poster_url}"
 
     try:
-        r = requests.get(url, timeout=15)
+        with _image_slots:
+            r = requests.get(url, timeout=15)
         if r.status_code == 200:
-            return r.contents
+            return r.content
     except Exception:
         pass
 
@@ -21,9 +21,13 @@
 # --------------------------------------------------------------------
 
 import sqlite3
+import json
 import time
 import os
 import threading
+import hashlib
+import re
+from itertools import groupby
 from pathlib import Path
 from datetime import datetime, date, timedelta
 from datetime import timezone
@@ -32,25 +36,387 @@ from backend.api import overseerr
 from backend.api import config
 from backend.api import tmdb
 from backend.api import tvdb
+from backend.api import images
+from backend.db.writer import DBWriter
+from backend.db.ingest import MicroBatchQueue
+from backend.api.jobRegister import report_progress, set_stage, check_cancelled, JobCancelled
+from backend.api.cache import ByteLRU
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 DB_PATH = Path(__file__).parent / "contactarr.db"
+SYNC_CHUNK_SIZE = 50 # rows committed per transaction by the long sync jobs
+SYNC_CHECKPOINT_MAX_AGE = 2 * 24 * 60 * 60 # seconds after which an interrupted sync starts over instead of resuming
 POSTER_CACHE_DIR = ".image_cache/posters"
+POSTER_VARIANT_DIR = ".image_cache/posters/variants"
+POSTER_WIDTHS = (92, 154, 185, 342, 500) # widths poster variants can be requested at
+POSTER_PREFETCH_WORKERS = 8
+POSTER_SPRITE_DIR = ".image_cache/posters/sprites"
+POSTER_SPRITE_COLUMNS = 10
+# a sprite is built in memory, so these keep it to ~15MB (100 posters of 185x277)
+POSTER_SPRITE_MAX_ITEMS = 100
+POSTER_SPRITE_MAX_WIDTH = 185
+POSTER_MEMORY_BUDGET = 64 * 1024 * 1024 # bytes of posters kept in memory
+POSTER_URL_MEMORY_BUDGET = 1024 * 1024
+POSTER_DERIVED_MAX_AGE = 14 * 24 * 60 * 60 # unused variants/sprites are deleted after this many seconds
+UNRELEASED_REQUEST_MAX_AGE = 7 * 24 * 60 * 60 # older requests are not emailed about, e.g. when the setting is first turned on
+TMDB_HOME_RELEASE_TYPES = (4, 5, 6) # tmdb release types: digital, physical and tv (3 is theatrical)
+JOB_RUN_RETENTION = 180 * 24 * 60 * 60 # seconds finished job runs are kept in job_runs
 os.makedirs(POSTER_CACHE_DIR, exist_ok=True)
+os.makedirs(POSTER_VARIANT_DIR, exist_ok=True)
+os.makedirs(POSTER_SPRITE_DIR, exist_ok=True)
+
+# the most used posters, and the poster urls of movies/shows, are also kept in memory.
+# only found urls are kept, so a movie/show added later is never hidden by an old miss.
+_poster_bytes = ByteLRU(POSTER_MEMORY_BUDGET)
+_poster_urls = ByteLRU(POSTER_URL_MEMORY_BUDGET, sizeof=lambda urls: 100 + sum(len(url or "") for url in urls))
+_poster_urls_lock = threading.Lock()
+_poster_urls_generation = 0 # bumped by every invalidation
 
 def _poster_cache_path(media_type: str, media_id: int) -> str:
     return os.path.join(POSTER_CACHE_DIR, f"{media_type}_{media_id}.jpg")
 
 def load_cached_poster(media_type: str, media_id: int) -> bytes | None:
+    data = _poster_bytes.get((media_type, media_id))
+    if data is not None:
+        return data
+
     path = _poster_cache_path(media_type, media_id)
-    if os.path.exists(path):
+    try:
         with open(path, "rb") as f:
-            return f.read()
-    return None
+            data = f.read()
+    except FileNotFoundError:
+        return None
+
+    _poster_bytes.put((media_type, media_id), data)
+    return data
 
 def save_cached_poster(media_type: str, media_id: int, data: bytes):
     path = _poster_cache_path(media_type, media_id)
-    with open(path, "wb") as f:
+    # posters are served straight from this file (and cached by clients), so write to a
+    # temporary file first and swap it in, so a half-written poster is never read
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
         f.write(data)
+    os.replace(tmp_path, path)
+    _poster_bytes.put((media_type, media_id), data)
+
+def invalidate_poster(media_type: str, media_id: int):
+    """forget the cached poster (and poster urls) of a movie or show, e.g. when its urls change"""
+    global _poster_urls_generation
+    with _poster_urls_lock:
+        _poster_urls_generation += 1
+        _poster_urls.pop((media_type, media_id))
+    _poster_bytes.pop((media_type, media_id))
+    try:
+        os.remove(_poster_cache_path(media_type, media_id))
+    except FileNotFoundError:
+        pass
+
+_POSTER_TABLES = {"movies": ("movie", "movie_id"), "shows": ("show", "show_id")}
+
+# posters of rows written by the current db_writer batch. only used on the writer thread.
+_written_posters = set()
+
+def _poster_urls_written(table, columns, media_id):
+    """
+    called (on the writer thread) wherever movies/shows rows are written with poster urls.
+    the cached posters are dropped once the batch has committed (see _drop_written_posters),
+    so a reader can't cache the old urls again in between.
+    """
+    if table in _POSTER_TABLES and media_id is not None and \
+            ("tautulli_poster_url" in columns or "tmdb_poster_url" in columns):
+        _written_posters.add((_POSTER_TABLES[table][0], media_id))
+
+def _set_poster_url(conn, table, media_id, column, url):
+    """
+    store a new poster url for an existing movies/shows row, if it has changed (e.g.
+    Tautulli gives a new thumb after the poster is changed in Plex). the cached poster
+    is dropped once the batch has committed, like for new rows.
+    """
+    if not url or media_id is None:
+        return
+    id_col = _POSTER_TABLES[table][1]
+    changed = conn.execute(
+        f"UPDATE {table} SET {column} = ? WHERE {id_col} = ? AND {column} IS NOT ?",
+        (url, media_id, url)
+    ).rowcount
+    if changed:
+        _poster_urls_written(table, (column,), media_id)
+
+def _drop_written_posters():
+    """db_writer's after_batch: forget the posters of rows written by the batch"""
+    while _written_posters:
+        invalidate_poster(*_written_posters.pop())
+
+def _get_poster_urls(media_type, media_id):
+    """(tautulli_poster_url, tmdb_poster_url) of a movie or show, or None if there is no such row"""
+    urls = _poster_urls.get((media_type, media_id))
+    if urls is not None:
+        return urls
+    generation = _poster_urls_generation
+
+    table = "movies" if media_type == "movie" else "shows"
+    id_col = _POSTER_TABLES[table][1]
+    with get_connection() as conn:
+        row = conn.execute(f"""
+            SELECT tautulli_poster_url, tmdb_poster_url
+            FROM {table}
+            WHERE {id_col} = ?
+        """, (media_id,)).fetchone()
+
+    if not row:
+        return None
+
+    urls = (row["tautulli_poster_url"], row["tmdb_poster_url"])
+    with _poster_urls_lock:
+        # if anything was invalidated while reading, what was read may be out of date
+        if generation == _poster_urls_generation:
+            _poster_urls.put((media_type, media_id), urls)
+    return urls
+
+# path -> (mtime_ns, size, etag, content type) of poster files, so they aren't hashed again
+# until they change
+_poster_file_info = {}
+_poster_file_info_lock = threading.Lock()
+
+def _poster_file_info_for(path):
+    stat = os.stat(path)
+    with _poster_file_info_lock:
+        info = _poster_file_info.get(path)
+    if info and info[0] == stat.st_mtime_ns and info[1] == stat.st_size:
+        return info
+
+    with open(path, "rb") as f:
+        data = f.read()
+    subtype = images.image_subtype(data) or "jpeg"
+    info = (stat.st_mtime_ns, stat.st_size, f'"{hashlib.sha256(data).hexdigest()}"', f"image/{subtype}")
+    with _poster_file_info_lock:
+        _poster_file_info[path] = info
+    return info
+
+def _poster_variant(path, media_type, media_id, width, fmt):
+    """
+    get (generating it if needed) a resized/re-encoded copy of the poster at `path`.
+    returns the variant's path, or the original's if the variant can't be made.
+    """
+    ext = "webp" if fmt == "webp" else "jpg"
+    variant_path = os.path.join(POSTER_VARIANT_DIR, f"{media_type}_{media_id}_w{width or 'full'}.{ext}")
+
+    # regenerate variants of posters that have been replaced since
+    if os.path.exists(variant_path) and os.path.getmtime(variant_path) >= os.path.getmtime(path):
+        return variant_path
+
+    with open(path, "rb") as f:
+        data = images.resize_image(f.read(), width, fmt or "jpeg")
+    if data is None:
+        return path
+
+    tmp_path = f"{variant_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, variant_path)
+    return variant_path
+
+def get_poster_file(media_type: str, media_id: int, width: int = None, fmt: str = None):
+    """
+    make sure the poster of a movie or show is in the poster cache, and return
+    (path, etag, content type) for serving it, or None if there is no poster.
+    the etag is the hash of the file's contents.
+    width and fmt ('jpeg' or 'webp') choose a smaller/re-encoded variant of the poster;
+    width is rounded up to one of POSTER_WIDTHS so only a few variants are ever stored.
+    """
+    if media_type not in ("movie", "show"):
+        raise ValueError("media_type must be 'movie' or 'show'")
+    if fmt not in (None, "jpeg", "webp"):
+        raise ValueError("fmt must be 'jpeg' or 'webp'")
+
+    path = _poster_cache_path(media_type, media_id)
+    if not os.path.exists(path):
+        if media_type == "movie":
+            image = get_poster_image(movie_id=media_id)
+        else:
+            image = get_poster_image(show_id=media_id)
+        if image is None:
+            return None
+        if not os.path.exists(path):
+            # the poster was still in memory after its file was deleted (e.g. by invalidate_poster)
+            save_cached_poster(media_type, media_id, image)
+
+    try:
+        if width is not None:
+            width = next((w for w in POSTER_WIDTHS if w >= width), None)
+        if width is not None or fmt is not None:
+            path = _poster_variant(path, media_type, media_id, width, fmt)
+
+        _, _, etag, content_type = _poster_file_info_for(path)
+    except FileNotFoundError:
+        # deleted while being read, by invalidate_poster or compact_poster_cache.
+        # the next request fetches it again.
+        return None
+    return path, etag, content_type
+
+def get_poster_batch(items: list, width: int = None):
+    """
+    get the posters of many movies/shows at once, fetching any that aren't cached yet.
+    items is a list of ("movie" | "show", id). returns
+    {(media_type, id): (bytes, content type, etag)} for the items that have a poster.
+    """
+    def load(item):
+        poster = get_poster_file(item[0], item[1], width)
+        if poster is None:
+            return item, None
+
+        path, etag, content_type = poster
+        if path == _poster_cache_path(*item):
+            data = load_cached_poster(*item)
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+        return item, (data, content_type, etag)
+
+    unique = list(dict.fromkeys((media_type, int(media_id)) for media_type, media_id in items))
+    with ThreadPoolExecutor(max_workers=POSTER_PREFETCH_WORKERS) as pool:
+        return {item: poster for item, poster in pool.map(load, unique) if poster and poster[0]}
+
+def build_poster_sprite(items: list, width: int = 154):
+    """
+    build (or reuse) a sprite sheet of the posters of many movies/shows, so that a list
+    of them can be shown from a single image. items is a list of ("movie" | "show", id).
+    returns {"sprite_id", "width", "height", "offsets": {"movie:1": {"x": ..., "y": ...}, ...}},
+    where width/height are the size of each poster in the sheet. items without a poster
+    are left out of offsets, and if none of them have one, None is returned.
+    sprites are named by the hash of their contents, so they never need revalidating.
+    raises ValueError for more than POSTER_SPRITE_MAX_ITEMS items, or a width above
+    POSTER_SPRITE_MAX_WIDTH.
+    """
+    if len(items) > POSTER_SPRITE_MAX_ITEMS:
+        raise ValueError(f"at most {POSTER_SPRITE_MAX_ITEMS} posters per sprite")
+    if width > POSTER_SPRITE_MAX_WIDTH:
+        raise ValueError(f"sprite size must be at most {POSTER_SPRITE_MAX_WIDTH}")
+    width = next((w for w in POSTER_WIDTHS if w >= width), POSTER_WIDTHS[-1])
+    height = width * 3 // 2
+
+    posters = get_poster_batch(items, width)
+    found = [item for item in dict.fromkeys((t, int(i)) for t, i in items) if item in posters]
+    if not found:
+        return None
+
+    h = hashlib.sha256(f"w{width}".encode())
+    for media_type, media_id in found:
+        h.update(f"|{media_type}:{media_id}:{posters[(media_type, media_id)][2]}".encode())
+    sprite_id = h.hexdigest()
+
+    columns = min(len(found), POSTER_SPRITE_COLUMNS)
+    path = os.path.join(POSTER_SPRITE_DIR, f"{sprite_id}.jpg")
+    if not os.path.exists(path):
+        data = images.make_sprite([posters[item][0] for item in found], width, height, columns)
+        if data is None:
+            raise RuntimeError("Pillow is needed to build poster sprites")
+
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    return {
+        "sprite_id": sprite_id,
+        "width": width,
+        "height": height,
+        "offsets": {
+            f"{media_type}:{media_id}": {"x": (n % columns) * width, "y": (n // columns) * height}
+            for n, (media_type, media_id) in enumerate(found)
+        }
+    }
+
+def get_poster_sprite_path(sprite_id: str):
+    """the path of a sprite made by build_poster_sprite(), or None if there isn't one"""
+    if not re.fullmatch(r"[0-9a-f]{64}", sprite_id):
+        return None
+    path = os.path.join(POSTER_SPRITE_DIR, f"{sprite_id}.jpg")
+    return path if os.path.exists(path) else None
+
+def compact_poster_cache(max_age: int = POSTER_DERIVED_MAX_AGE):
+    """
+    delete poster variants and sprites that haven't been used (or made) in the last
+    max_age seconds, and any temporary files left behind by an interrupted write.
+    both are made again from the cached posters if they are asked for later.
+    returns the number of files deleted (which compact_caches() puts in its job's result).
+    """
+    cutoff = time.time() - max_age
+    entries = [
+        entry
+        for directory in (POSTER_VARIANT_DIR, POSTER_SPRITE_DIR) if os.path.isdir(directory)
+        for entry in os.scandir(directory)
+    ]
+    total = len(entries)
+    report_progress(0, total, stage="poster files")
+
+    removed = 0
+    for done, entry in enumerate(entries, 1):
+        check_cancelled()
+        try:
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if entry.name.endswith(".tmp") or max(stat.st_atime, stat.st_mtime) < cutoff:
+                os.remove(entry.path)
+                with _poster_file_info_lock:
+                    _poster_file_info.pop(entry.path, None)
+                removed += 1
+        except OSError:
+            # e.g. already deleted by another compaction
+            continue
+        finally:
+            report_progress(done, total)
+
+    return removed
+
+def prefetch_posters(max_workers=POSTER_PREFETCH_WORKERS):
+    """
+    download the posters of every movie and show not yet in the poster cache, so the
+    dashboard doesn't have to fetch them all on its first load.
+    how many downloads run at once against Tautulli and TMDB is also limited by those modules.
+    """
+    with get_connection() as conn:
+        missing = [
+            (media_type, media_id)
+            for media_type, table, id_col in (("movie", "movies", "movie_id"), ("show", "shows", "show_id"))
+            for (media_id,) in conn.execute(f"""
+                SELECT {id_col} FROM {table}
+                WHERE tautulli_poster_url IS NOT NULL OR tmdb_poster_url IS NOT NULL
+            """)
+            if not os.path.exists(_poster_cache_path(media_type, media_id))
+        ]
+
+    total = len(missing)
+    print_header(f"Prefetching {total} posters")
+    report_progress(0, total, stage="posters")
+
+    def fetch(media_type, media_id):
+        if media_type == "movie":
+            return get_poster_image(movie_id=media_id)
+        return get_poster_image(show_id=media_id)
+
+    done = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fetch, media_type, media_id) for media_type, media_id in missing]
+        for future in as_completed(futures):
+            try:
+                check_cancelled()
+            except JobCancelled:
+                # drop the downloads that haven't started, rather than waiting on them all
+                pool.shutdown(cancel_futures=True)
+                raise
+            try:
+                if future.result() is None:
+                    failed += 1
+            except Exception:
+                failed += 1
+            done += 1
+            report_progress(done, total)
+
+    print_line(f"Fetched {total - failed} posters, {failed} could not be fetched.")
 
 def get_poster_image(*, movie_id=None, show_id=None):
     """
@@ -62,40 +428,27 @@ def get_poster_image(*, movie_id=None, show_id=None):
 
     if movie_id is not None:
         media_type = "movie"
-        media_id = movie_id
-        table = "movies"
-        id_col = "movie_id"
+        media_id = int(movie_id)
     else:
         media_type = "show"
-        media_id = show_id
-        table = "shows"
-        id_col = "show_id"
+        media_id = int(show_id)
 
     cached = load_cached_poster(media_type, media_id)
     if cached:
         return cached
 
     # no cached image. fetch from tautulli/tmdb
-    with get_connection() as conn:
-        conn.row_factory = sqlite3.Row
-        row = conn.execute(
-            f"""
-            SELECT tautulli_poster_url, tmdb_poster_url
-            FROM {table}
-            WHERE {id_col} = ?
-            """,
-            (media_id,),
-        ).fetchone()
-
-    if not row:
+    urls = _get_poster_urls(media_type, media_id)
+    if not urls:
         return None
+    tautulli_poster_url, tmdb_poster_url = urls
 
     image = None
-    if row["tautulli_poster_url"]:
-        image = tautulli.get_poster_image(row["tautulli_poster_url"])
+    if tautulli_poster_url:
+        image = tautulli.get_poster_image(tautulli_poster_url)
 
-    if image is None and row["tmdb_poster_url"]:
-        image = tmdb.get_poster_image(row["tmdb_poster_url"])
+    if image is None and tmdb_poster_url:
+        image = tmdb.get_poster_image(tmdb_poster_url)
 
     if image is None:
         return None
@@ -300,6 +653,43 @@ def _add_to_table(conn, spec: dict):
 
     cur = conn.execute(sql, values)
 
+    if return_col:
+        row = cur.fetchone()
+        if row and table in _POSTER_TABLES and return_col == _POSTER_TABLES[table][1]:
+            _poster_urls_written(table, data, row[0])
+        return row[0] if row else None
+
+    return
+
+def _upsert_to_table(conn, spec: dict):
+    """
+    same as _add_to_table(), but if a row already exists with the same values in the
+    "conflict" columns, its "update" columns are overwritten instead.
+    {
+        "table": "name",
+        "data": { column: value, ... },
+        "conflict": ["column", ...],        # columns of a UNIQUE constraint
+        "update": ["column", ...],          # columns to overwrite if the row exists
+        "return": "column_name" | None
+    }
+    """
+    table = spec["table"]
+    data = spec["data"]
+    return_col = spec.get("return")
+
+    columns = ", ".join(data.keys())
+    placeholders = ", ".join("?" for _ in data)
+    values = list(data.values())
+    conflict = ", ".join(spec["conflict"])
+    update = ", ".join(f"{col} = excluded.{col}" for col in spec["update"])
+
+    sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) ON CONFLICT({conflict}) DO UPDATE SET {update}"
+
+    if return_col:
+        sql += f" RETURNING {return_col}"
+
+    cur = conn.execute(sql, values)
+
     if return_col:
         row = cur.fetchone()
         return row[0] if row else None
@@ -312,24 +702,26 @@ def _update_row_or_ignore(conn, attrs, vals, name):
         - the PRIMARY KEY attribute will be included (as the first attr) in attrs, which is
           used to find the exact row to modify.
         - if no row exists with the primary key value, fail silently.
+        - if the update would violate a constraint, the row is left alone.
+    returns the number of rows changed (0 if the row is missing or was left alone).
     """
     attr_list = [attr.strip() for attr in attrs.split(",")]
     if not attr_list:
-        return
+        return 0
     
     pk = attr_list[0]
     update_attrs = attr_list[1:]
 
     if not update_attrs:
-        return
+        return 0
 
     set_clause = ", ".join(f"{attr}=?" for attr in update_attrs)
     pk_value = vals[0]
     update_values = vals[1:] + [pk_value] # SET ... WHERE pk = ?
 
-    query = f"UPDATE {name} SET {set_clause} WHERE {pk} = ?"
+    query = f"UPDATE OR IGNORE {name} SET {set_clause} WHERE {pk} = ?"
 
-    conn.execute(query, update_values)
+    return conn.execute(query, update_values).rowcount
 
 
 def _add_or_ignore_to_table(conn, spec: dict):
@@ -357,24 +749,66 @@ def _add_or_ignore_to_table(conn, spec: dict):
 
     return
 
-def get_connection():
-    if not DB_PATH.exists():
-        DB_PATH.touch()
-        init_db()
+_schema_ready = False
+_schema_lock = threading.Lock()
 
+def _open_connection():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA busy_timeout = 30000;")
-    return SafeConnection(conn)
+    return conn
+
+def _connect():
+    global _schema_ready
+
+    # make sure every table exists once per run, so that tables added in newer
+    # versions are created in existing databases too. the flag is only set once
+    # init_db() has finished, so no other thread uses the database before then.
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                init_db()
+                _schema_ready = True
+
+    return _open_connection()
+
+def get_connection():
+    return SafeConnection(_connect())
+
+# every write made outside of init_db() should go through db_writer, so that
+# writes are serialised on one connection instead of fighting over the lock.
+db_writer = DBWriter(_connect, after_batch=_drop_written_posters)
 
 def link_tautulli():
+    """
+    sync users, movies and shows from Tautulli.
+    if a previous link was interrupted, it is resumed from the stage it was in
+    (and populate_movies/populate_shows resume from their own checkpoints).
+    """
     if tautulli.validate_apikey():
         print("LINKING TAUTULLI...")
         begin_timer = time.time()
-        populate_users_table()
-        populate_movies()
-        populate_shows()
+
+        stages = {
+            "users": populate_users_table,
+            "movies": populate_movies,
+            "shows": populate_shows,
+        }
+        stage_names = list(stages)
+        checkpoint = get_sync_checkpoint("link_tautulli")
+        start = 0
+        if checkpoint and checkpoint["stage"] in stage_names:
+            start = stage_names.index(checkpoint["stage"])
+            print(f"Resuming interrupted link from stage '{checkpoint['stage']}'.")
+
+        for stage in stage_names[start:]:
+            # each stage commits its own checkpoints, so stopping here can be resumed
+            check_cancelled()
+            db_writer.run(_set_sync_checkpoint, "link_tautulli", stage)
+            stages[stage]()
+        db_writer.run(_clear_sync_checkpoint, "link_tautulli")
+
         end_timer = time.time()
         print(f"\nFINISHED LINKING TAUTULLI. (Took {end_timer-begin_timer}s)")
         return True
@@ -409,302 +843,465 @@ def get_unix_from_iso(iso):
     return int(dt.timestamp())
 
 def process_overseerr_requests():
+    """
+    sync requests from Overseerr, page by page from the most recently updated.
+
+    requests updated before OVERSEERR_LAST_REQUESTS_PROCESS were handled by a previous sync,
+    so paging stops once it reaches them, and the cursor is moved forward when the sync
+    finishes. while the sync is running, the range of updatedAt times it has processed so
+    far is saved after each page (OVERSEERR_REQUESTS_SYNC_WINDOW), so that an interrupted
+    sync does not process those requests again.
+    """
     cnf = config.get_overseerr_config()
     last_process = cnf.get('last_requests_process') # will ignore requests from before the last processing
-    if not last_process:
-        last_process = 0
+    last_process = int(last_process) if last_process else 0
+    window = overseerr.get_requests_sync_window() # requests already processed by an interrupted sync
+    newest = None # newest request seen by this sync
+    oldest = None # oldest request seen by this sync
 
-    requests = overseerr.get_requests()
-    
+    # existing tables to compare against. built once per run, and kept up to date
+    # as requests add rows.
     with get_connection() as conn:
-        with conn:
-            # existing tables to compare against
-            movies_table = _get_table_indexed(conn, "movies", "rating_key")
-            shows_table = _get_table_indexed(conn, "shows", "rating_key")
-
-            # consider each request
-            for request in requests:
-                if get_unix_from_iso(request["updatedAt"]) < last_process:
-                    # this request will have been processed as part of a previous scan
-                    continue
-                
-                # is it a movie or show?
-                if request["type"] == "movie":
-                    # movie
-                    process_movie_request(request, movies_table)
-                else:
-                    # tv
-                    process_tv_request(request, shows_table)
+        indexes = _build_overseerr_indexes(conn)
+
+    set_stage("requests")
+    processed = 0
+    for page in overseerr.iter_request_pages():
+        updated = [get_unix_from_iso(r["updatedAt"]) for r in page]
+
+        # consider each request not already processed, by a previous sync or an
+        # interrupted run of this one
+        todo = [
+            request for request, updated_at in zip(page, updated)
+            if updated_at >= last_process and not (window and window[0] <= updated_at <= window[1])
+        ]
+        indexes = _process_overseerr_request_batch(todo, indexes)
+
+        newest = max(updated + [newest or 0])
+        oldest = min(updated)
+
+        # everything updated after `oldest` has now been processed (requests updated at the
+        # same second as `oldest` may be on the next page). record that, as long as it joins
+        # up with what an interrupted run already did.
+        if not window:
+            window = (oldest + 1, newest)
+            overseerr.set_requests_sync_window(window)
+        elif oldest <= window[1]:
+            window = (min(oldest + 1, window[0]), max(newest, window[1]))
+            overseerr.set_requests_sync_window(window)
+
+        processed += len(todo)
+        report_progress(processed, None)
+
+        if oldest < last_process:
+            # every page after this one was handled by a previous sync
+            break
+
+        # the window saved above lets a cancelled sync carry on from this page
+        check_cancelled()
+
+    if newest is not None:
+        overseerr.set_last_requests_process(max(newest, window[1] if window else 0, last_process))
+    overseerr.set_requests_sync_window(None)
+
+def _process_overseerr_request_batch(requests, indexes):
+    """
+    process a batch of Overseerr requests: TMDB details are fetched first, then every
+    request is written through db_writer (which commits them together).
+    returns the indexes to use for the next batch.
+    """
+    if not requests:
+        return indexes
+
+    # get information about the movies/shows from TMDB, all at once and only
+    # for those we don't already know enough about.
+    details = tmdb.get_many(
+        ("movie" if request["type"] == "movie" else "tv", request["media"]["tmdbId"])
+        for request in requests
+        if _needs_tmdb_details(request, indexes)
+    )
+
+    futures = []
+    for request in requests:
+        tmdb_details = details.get(("movie" if request["type"] == "movie" else "tv", request["media"]["tmdbId"]))
+        # is it a movie or show?
+        if request["type"] == "movie":
+            # movie
+            futures.append(db_writer.submit(process_movie_request, request, indexes, tmdb_details))
+        else:
+            # tv
+            futures.append(db_writer.submit(process_tv_request, request, indexes, tmdb_details))
+
+    failed = False
+    for request, future in zip(requests, futures):
+        try:
+            future.result()
+        except Exception as e:
+            failed = True
+            print(f"Failed to process Overseerr request {request["id"]}: {e}")
+
+    if failed:
+        # a failed request's writes were rolled back, but the indexes may have been
+        # updated with them. start again from what is really in the database.
+        with get_connection() as conn:
+            indexes = _build_overseerr_indexes(conn)
+
+    return indexes
+
+# overseerr webhook notifications that can change the state of a request
+OVERSEERR_WEBHOOK_TYPES = {
+    "MEDIA_PENDING", "MEDIA_APPROVED", "MEDIA_AUTO_APPROVED", "MEDIA_AVAILABLE",
+    "MEDIA_DECLINED", "MEDIA_FAILED"
+}
+
+def _webhook_id(value, field):
+    """an id from a webhook payload as an int, raising ValueError if it isn't a number"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{field}' should be a number, got {value!r}. check the webhook's JSON payload.")
+
+def ingest_overseerr_webhook(payload: dict):
+    """
+    accept a notification from Overseerr's webhook agent (using its default JSON payload).
+    the request it is about is queued, and applied with the same logic as a full sync.
+    returns whether the notification was understood. raises ValueError if the payload
+    is malformed (e.g. the agent's JSON payload template has been changed).
+    """
+    notification_type = payload.get("notification_type")
+    if notification_type == "TEST_NOTIFICATION":
+        return True
+    if notification_type not in OVERSEERR_WEBHOOK_TYPES:
+        return False
+
+    request = payload.get("request") or {}
+    if not isinstance(request, dict):
+        raise ValueError("'request' should be an object. check the webhook's JSON payload.")
+    request_id = request.get("request_id")
+    if not request_id:
+        return False
+
+    _overseerr_webhook_queue.put(_webhook_id(request_id, "request.request_id"))
+    return True
+
+def _process_overseerr_webhooks(request_ids):
+    # the webhook payload doesn't include everything we store about a request (such as
+    # the requested seasons), so get each request from Overseerr.
+    requests = []
+    for request_id in dict.fromkeys(request_ids):
+        request = overseerr.get_request(request_id)
+        if request:
+            requests.append(request)
+        else:
+            print(f"Could not get Overseerr request {request_id} from webhook.")
+
+    if requests:
+        with get_connection() as conn:
+            indexes = _build_overseerr_indexes(conn)
+        _process_overseerr_request_batch(requests, indexes)
+        print(f"Processed {len(requests)} Overseerr requests from webhooks.")
+
+_overseerr_webhook_queue = MicroBatchQueue(_process_overseerr_webhooks, name="overseerr-webhooks")
+
+def _needs_tmdb_details(request, indexes):
+    """
+    whether processing a request needs details from TMDB. not needed if the movie is
+    already in the movies table, or if the show and all of the requested seasons are
+    already in the shows and seasons tables.
+    """
+    media = request["media"]
+    if request["type"] == "movie":
+        return indexes["movies"].find(rating_key=media["ratingKey"], tmdb_id=media["tmdbId"]) is None
+
+    show = indexes["shows"].find(rating_key=media["ratingKey"], tmdb_id=media["tmdbId"])
+    if show is None:
+        return True
+    return any(
+        (show["show_id"], season["seasonNumber"]) not in indexes["seasons"]
+        for season in request.get("seasons") or []
+    )
+
+class _MediaIndex:
+    """
+    an in-memory copy of the movies or shows table, accessible by rating_key, tmdb_id
+    and (name, year). built once, then updated in place as rows are added or changed,
+    rather than re-reading the whole table whenever something needs looking up.
+    """
+
+    def __init__(self, conn, table, id_col, name_col):
+        self.table = table
+        self.id_col = id_col
+        self.name_col = name_col
+        self.by_rating_key = {}
+        self.by_tmdb_id = {}
+        self.by_name_year = {}
+
+        for row in conn.execute(f"SELECT * FROM {table}").fetchall():
+            self.add(dict(row))
+
+    def add(self, row: dict):
+        """add (or refresh) a row in the index, returns the row"""
+        if row.get("rating_key") is not None:
+            self.by_rating_key[int(row["rating_key"])] = row
+        if row.get("tmdb_id") is not None:
+            self.by_tmdb_id[int(row["tmdb_id"])] = row
+        self.by_name_year[(row[self.name_col], row["year"])] = row
+        return row
+
+    def find(self, rating_key=None, tmdb_id=None):
+        """find a row by rating_key if given, falling back to tmdb_id"""
+        row = None
+        if rating_key:
+            row = self.by_rating_key.get(int(rating_key))
+        if row is None and tmdb_id:
+            row = self.by_tmdb_id.get(int(tmdb_id))
+        return row
+
+    def find_by_name_year(self, conn, name, year):
+        """find a row by (name, year), falling back to the database if the index has missed it"""
+        row = self.by_name_year.get((name, year))
+        if row is None:
+            row = get_row_from_table(conn, self.table, {self.name_col: name, "year": year})
+            if row:
+                self.add(row)
+        return row
+
+    def set_tmdb_id(self, conn, row, tmdb_id):
+        """
+        record the tmdb_id of a row in the table and in the index. if another row already
+        has that tmdb_id, the update is ignored and the index is left as it is.
+        """
+        if row.get("tmdb_id") == tmdb_id:
+            return
+        if not _update_row_or_ignore(conn, f"{self.id_col}, tmdb_id", [row[self.id_col], tmdb_id], self.table):
+            return
+        old = row.get("tmdb_id")
+        if old is not None and self.by_tmdb_id.get(int(old)) is row:
+            del self.by_tmdb_id[int(old)]
+        row["tmdb_id"] = tmdb_id
+        self.add(row)
+
+def _build_overseerr_indexes(conn):
+    return {
+        "movies": _MediaIndex(conn, "movies", "movie_id", "movie_name"),
+        "shows": _MediaIndex(conn, "shows", "show_id", "show_name"),
+        "users": {row["username"]: row["user_id"] for row in conn.execute("SELECT user_id, username FROM users")},
+        "seasons": {
+            (row["show_id"], row["season_num"]): row["season_id"]
+            for row in conn.execute("SELECT season_id, show_id, season_num FROM seasons")
+        }
+    }
+
+def _get_request_user_id(request, indexes):
+    user_plex_id = request["requestedBy"].get("plexId")
+    if not user_plex_id:
+        # there may be a user in Overseerr who isn't connected to a Plex account (such as a local user).
+        # they should still have a Plex ID, and it should be in Tautulli.
+        #   - if their Overseerr username matches the username of a Plex user in our users table, the
+        #     request will be assigned to them.
+        username = request["requestedBy"].get("username")
+        if (username):
+            user_plex_id = indexes["users"].get(username)
+    return user_plex_id
 
 def extract_year_from_yyyy_dd_mm(datestr):
     # extract just year from 2026-02-08 format
     return datetime.fromisoformat(str(datestr)).year
 
-def process_movie_request(request, movies_table):
-
+def process_movie_request(conn, request, indexes, tmdb_movie_details):
+    """
+    add an Overseerr movie request to the movie_requests table (adding the movie to the
+    movies table first, if needed). run through db_writer, with TMDB details already fetched.
+    """
+    movies = indexes["movies"]
     request_media = request["media"]
     tmdbId = request_media["tmdbId"]
     rating_key = request_media["ratingKey"]
-    movie_id = None
-    movie_name = None
-    movie_year = None
-    tmdb_movie_details = tmdb.get_movie(tmdbId) # get information about the movie from TMDB.
-    
-    # get movie from existing table
-    if rating_key:
-        # search for show using rating key
-        movie_in_table = int(rating_key) in movies_table
-    else:
-        with get_connection() as conn:
-            with conn:
-                # search for show using tmdbID
-                movies_by_tmdb = _get_table_indexed(conn, "movies", "tmdb_id")
-                movie_in_table = int(tmdbId) in movies_by_tmdb
 
-    if not movie_in_table:
+    # get movie from existing table. search using rating key, or tmdbID if there is no rating key
+    movie = movies.find(rating_key=rating_key, tmdb_id=tmdbId)
+
+    if not movie:
         # the move is not in the movies table.
+        if not tmdb_movie_details:
+            raise ValueError(f"no TMDB details for movie {tmdbId}")
 
         # add it:
-        with get_connection() as conn:
-            with conn:
-                movie_name = tmdb_movie_details["title"]
-                movie_year = extract_year_from_yyyy_dd_mm(tmdb_movie_details["release_date"])
-                tmdb_poster_url = tmdb_movie_details["poster_path"]
-
-                movie_id = _add_to_table(conn, {
-                    "table": "movies",
-                    "data": {
-                        "movie_name": movie_name,
-                        "year": movie_year, # "release_date" is in format 2026-08-02, we just want year.
-                        "rating_key": rating_key,
-                        "tmdb_poster_url": tmdb_poster_url # not in tautulli, so can't use tautulli_poster_url
-                    },
-                    "return": "movie_id"
-                })
-
-                # if movie_id is None, that means it was not added to the table because there was a constraint
-                # violation, namely that there already exists a movie with the same movie_name+year.
-                #   - it can be the case that overseerr has the incorrect rating_key.
-                if not movie_id:
-                    # we now need to get the movie_id and rating_key of the entry in the movies table.
-                    obtained_movie = get_row_from_table(conn, "movies", {"movie_name": movie_name, "year": movie_year})
-                    movie_id = obtained_movie["movie_id"]
-                    rating_key = obtained_movie["rating_key"]
-
-                    # also, add tmdb_id to table entry
-                    _update_row_or_ignore(conn,
-                        "movie_id, tmdb_id",
-                        [movie_id, tmdb_movie_details["id"]],
-                        "movies"
-                    )
+        movie_name = tmdb_movie_details["title"]
+        movie_year = extract_year_from_yyyy_dd_mm(tmdb_movie_details["release_date"])
+        tmdb_poster_url = tmdb_movie_details["poster_path"]
+
+        movie_id = _add_to_table(conn, {
+            "table": "movies",
+            "data": {
+                "movie_name": movie_name,
+                "year": movie_year, # "release_date" is in format 2026-08-02, we just want year.
+                "rating_key": rating_key,
+                "tmdb_poster_url": tmdb_poster_url # not in tautulli, so can't use tautulli_poster_url
+            },
+            "return": "movie_id"
+        })
+
+        if movie_id:
+            movie = movies.add({
+                "movie_id": movie_id,
+                "movie_name": movie_name,
+                "year": movie_year,
+                "rating_key": rating_key,
+                "tmdb_id": None,
+                "tmdb_poster_url": tmdb_poster_url,
+                "tautulli_poster_url": None
+            })
+        else:
+            # if movie_id is None, that means it was not added to the table because there was a constraint
+            # violation, namely that there already exists a movie with the same movie_name+year.
+            #   - it can be the case that overseerr has the incorrect rating_key.
+            movie = movies.find_by_name_year(conn, movie_name, movie_year)
 
-    else:
-        # there is a movie in the movies table with the rating key overseerr expected.
-        # get the movie_name and movie_year
-        with get_connection() as conn:
-            with conn:
-                if rating_key:
-                    # it was obtained using rating_key
-                    obtained_movie = get_row_from_table(conn, "movies", {"rating_key": rating_key})
-                else:
-                    # it was obtained using tmdbId
-                    obtained_movie = get_row_from_table(conn, "movies", {"tmdb_id": tmdbId})
-
-                movie_id = obtained_movie["movie_id"]
-                movie_name = obtained_movie["movie_name"]
-                movie_year = obtained_movie["year"]
-
-                # also, add tmdb_id to table entry
-                _update_row_or_ignore(conn,
-                    "movie_id, tmdb_id",
-                    [movie_id, tmdb_movie_details["id"]],
-                    "movies"
-                )
+    # also, add tmdb_id to table entry
+    movies.set_tmdb_id(conn, movie, tmdbId)
 
     # now, if the movie was already in the table, we got its id. if the movie wasn't in the table, we added it and got an id.
     # now add an entry to movie_requests for the obtained movie_id
-    with get_connection() as conn:
-        with conn:
-            user_plex_id = request["requestedBy"].get("plexId")
-            if not user_plex_id:
-                # there may be a user in Overseerr who isn't connected to a Plex account (such as a local user).
-                # they should still have a Plex ID, and it should be in Tautulli.
-                #   - if their Overseerr username matches the username of a Plex user in our users table, the
-                #     request will be assigned to them.
-                username = request["requestedBy"]["username"]
-                if (username):
-                    user_plex_id = get_fields_from_table(conn, {
-                        "table": "users",
-                        "get": "user_id",
-                        "where": {"username": username}
-                    })
-
-            request_id = _add_to_table(conn, {
-                "table": "movie_requests",
-                "data": {
-                    "movie_id": movie_id,
-                    "requested_at": get_unix_from_iso(request["createdAt"]),
-                    "status": request["status"], # 1 = PENDING, 2 = APPROVED, 3 = DECLINED
-                    "updated_at": get_unix_from_iso(request["updatedAt"]),
-                    "user_id": user_plex_id,
-                    "overseerr_request_id": request["id"]
-                },
-                "return": "request_id"
-            })
-
-            ## add overseerr request ID to entry
+    # if the request was already added, it may have changed status since.
+    request_id = _upsert_to_table(conn, {
+        "table": "movie_requests",
+        "conflict": ["movie_id", "requested_at", "user_id"],
+        "update": ["status", "updated_at", "overseerr_request_id"],
+        "data": {
+            "movie_id": movie["movie_id"],
+            "requested_at": get_unix_from_iso(request["createdAt"]),
+            "status": request["status"], # 1 = PENDING, 2 = APPROVED, 3 = DECLINED
+            "updated_at": get_unix_from_iso(request["updatedAt"]),
+            "user_id": _get_request_user_id(request, indexes),
+            "overseerr_request_id": request["id"]
+        },
+        "return": "request_id"
+    })
 
-            print(f"Added request to movie_requests table for {movie_name} ({movie_year}): request ID {request_id}.")
+    print(f"Added request to movie_requests table for {movie["movie_name"]} ({movie["year"]}): request ID {request_id}.")
+    return request_id
 
-def process_tv_request(request, shows_table):
+def process_tv_request(conn, request, indexes, tmdb_show_details):
+    """
+    add an Overseerr tv request to the season_requests table, one row per requested season
+    (adding the show and its seasons first, if needed). run through db_writer, with TMDB
+    details already fetched.
+    """
+    shows = indexes["shows"]
     request_media = request["media"]
     tmdbId = request_media["tmdbId"]
     rating_key = request_media["ratingKey"]
-    show_id = None
-    show_name = None
-    show_year = None
-    tmdb_show_details = tmdb.get_show(tmdbId)
 
-    
-    if rating_key:
-        # search for show using rating key
-        show_in_table = int(rating_key) in shows_table
-    else:
-        with get_connection() as conn:
-            with conn:
-                # search for show using tmdbID
-                shows_by_tmdb = _get_table_indexed(conn, "shows", "tmdb_id")
-                show_in_table = int(tmdbId) in shows_by_tmdb
+    # search for show using rating key, or tmdbID if there is no rating key
+    show = shows.find(rating_key=rating_key, tmdb_id=tmdbId)
 
-    if not show_in_table:
+    if not show:
         # the show is not in the shows table.
+        if not tmdb_show_details:
+            raise ValueError(f"no TMDB details for show {tmdbId}")
 
         # add it:
-        with get_connection() as conn:
-            with conn:
-                show_name = tmdb_show_details["name"]
-                show_year = extract_year_from_yyyy_dd_mm(tmdb_show_details["first_air_date"])
-                tmdb_poster_url = tmdb_show_details["poster_path"]
-
-                show_id = _add_to_table(conn, {
-                    "table": "shows",
-                    "data": {
-                        "show_name": show_name,
-                        "year": show_year, # "first_air_date" is in format 2026-08-02, we just want year.
-                        "rating_key": rating_key,
-                        "tmdb_poster_url": tmdb_poster_url # not in tautulli, so can't use tautulli_poster_url
-                    },
-                    "return": "show_id"
-                })
-
-                # if show_id is None, that means it was not added to the table because there was a constraint
-                # violation, namely that there already exists a show with the same movie_name+year.
-                #   - it can be the case that overseerr has the incorrect rating_key.
-                if not show_id:
-                    # we now need to get the movie_id and rating_key of the entry in the movies table.
-                    obtained_show = get_row_from_table(conn, "shows", {"show_name": show_name, "year": show_year})
-                    show_id = obtained_show["show_id"]
-                    rating_key = obtained_show["rating_key"]
-
-                    # also, add tmdb_id to table entry
-                    _update_row_or_ignore(conn,
-                        "show_id, tmdb_id",
-                        [show_id, tmdb_show_details["id"]],
-                        "shows"
-                    )
-
-                # wasn't already in table, we added it above.
-                print(f"Added show {tmdb_show_details["name"]} ({extract_year_from_yyyy_dd_mm(tmdb_show_details["first_air_date"])}) to shows table. (SHOW ID {show_id}) (RATING KEY {rating_key} {type(rating_key)})")
-    else:
-        # there is a show in the shows table with the rating key overseerr expected.
-        # get the show_name and show_year
-        with get_connection() as conn:
-            with conn:
-                if rating_key:
-                    # it was obtained using rating_key
-                    obtained_show = get_row_from_table(conn, "shows", {"rating_key": rating_key})
-                else:
-                    # it was obtained using tmdbId
-                    obtained_show = get_row_from_table(conn, "shows", {"tmdb_id": tmdbId})
-                show_id = obtained_show["show_id"]
-                show_name = obtained_show["show_name"]
-                show_year = obtained_show["year"]
-
-                # also, add tmdb_id to table entry
-                _update_row_or_ignore(conn,
-                    "show_id, tmdb_id",
-                    [show_id, tmdb_show_details["id"]],
-                    "shows"
-                )
-    
-    # now, if the movie was already in the table, we got its id. if the movie wasn't in the table, we added it and got an id.
-    # now add an entry to movie_requests for the obtained movie_id
-    with get_connection() as conn:
-        with conn:
-            # we now need to add entries to seasons table FOR EVERY SEASON IN SHOW.
-            # we get season information from tmdb_show_details
-            # if every season is already in seasons table, nothing will happen. 
-            seasons = tmdb_show_details["seasons"]
-            for season in seasons:
-                data = {
-                    "show_id": show_id,
-                    "season_num": season["season_number"],
-                    "episode_count": season["episode_count"],
-                }
+        show_name = tmdb_show_details["name"]
+        show_year = extract_year_from_yyyy_dd_mm(tmdb_show_details["first_air_date"])
+        tmdb_poster_url = tmdb_show_details["poster_path"]
+
+        show_id = _add_to_table(conn, {
+            "table": "shows",
+            "data": {
+                "show_name": show_name,
+                "year": show_year, # "first_air_date" is in format 2026-08-02, we just want year.
+                "rating_key": rating_key,
+                "tmdb_poster_url": tmdb_poster_url # not in tautulli, so can't use tautulli_poster_url
+            },
+            "return": "show_id"
+        })
+
+        if show_id:
+            # wasn't already in table, we added it above.
+            show = shows.add({
+                "show_id": show_id,
+                "show_name": show_name,
+                "year": show_year,
+                "rating_key": rating_key,
+                "tvdb_id": None,
+                "tmdb_id": None,
+                "tmdb_poster_url": tmdb_poster_url,
+                "tautulli_poster_url": None
+            })
+            print(f"Added show {show_name} ({show_year}) to shows table. (SHOW ID {show_id}) (RATING KEY {rating_key})")
+        else:
+            # if show_id is None, that means it was not added to the table because there was a constraint
+            # violation, namely that there already exists a show with the same show_name+year.
+            #   - it can be the case that overseerr has the incorrect rating_key.
+            show = shows.find_by_name_year(conn, show_name, show_year)
+
+    show_id = show["show_id"]
+
+    # also, add tmdb_id to table entry
+    shows.set_tmdb_id(conn, show, tmdbId)
+
+    # we now need to add entries to seasons table FOR EVERY SEASON IN SHOW.
+    # we get season information from tmdb_show_details
+    # if every season is already in seasons table, nothing will happen. 
+    # (no details are fetched if all of the requested seasons were already known)
+    seasons = indexes["seasons"]
+    for season in (tmdb_show_details or {}).get("seasons", []):
+        data = {
+            "show_id": show_id,
+            "season_num": season["season_number"],
+            "episode_count": season["episode_count"],
+        }
 
-                if season["air_date"] is not None:
-                    data["year"] = extract_year_from_yyyy_dd_mm(season["air_date"])
-
-                season_id = _add_to_table(conn, {
-                    "table": "seasons",
-                    "data": data,
-                    "return": "season_id"
-                })
-
-            user_plex_id = request["requestedBy"].get("plexId")
-            if not user_plex_id:
-                # there may be a user in Overseerr who isn't connected to a Plex account (such as a local user).
-                # they should still have a Plex ID, and it should be in Tautulli.
-                #   - if their Overseerr username matches the username of a Plex user in our users table, the
-                #     request will be assigned to them.
-                username = request["requestedBy"]["username"]
-                if (username):
-                    user_plex_id = get_fields_from_table(conn,{
-                        "table": "users",
-                        "get": "user_id",
-                        "where": {"username": username}
-                    })
-
-            print(len(request["seasons"]))
-            for season in request["seasons"]:
-                # for each requested season, get the season id for the seasonNumber of the request, add an entry to season_requests.
-                season_num = season["seasonNumber"]
-
-                # get the season_id from the "seasons" table from the entry with the
-                # given show_id and season_num combination})
-                season_id = get_fields_from_table(conn, {
-                    "table": "seasons",
-                    "get": "season_id",
-                    "where": {"show_id": show_id, "season_num": season_num}
-                })
-                
-                request_id = _add_to_table(conn, {
-                    "table": "season_requests",
-                    "data": {
-                        "season_id": season_id,
-                        "show_id": show_id,
-                        "requested_at": get_unix_from_iso(season["createdAt"]),
-                        "status": season["status"],
-                        "updated_at": get_unix_from_iso(season["updatedAt"]),
-                        "user_id": user_plex_id,
-                        "overseerr_request_id": request["id"]
-                    },
-                    "return": "request_id"
-                })
-                print(f"Added season request for {show_name} ({show_year}): season {season_num}, requested by {user_plex_id}, request ID: {request_id}")
-                if not request_id:
-                    print(f"    season_id: {season_id}, show_id: {show_id}, requested_at: {get_unix_from_iso(season["createdAt"])}, updated_at: {get_unix_from_iso(season["updatedAt"])}, user_id: {user_plex_id}")
-                    print(f"    tried to get season id {season_id}. Did get_season_id_from_show_id_season_num(conn, {show_id}, {season_num})")
+        if season["air_date"] is not None:
+            data["year"] = extract_year_from_yyyy_dd_mm(season["air_date"])
+
+        season_id = _add_to_table(conn, {
+            "table": "seasons",
+            "data": data,
+            "return": "season_id"
+        })
+        if season_id:
+            seasons[(show_id, season["season_number"])] = season_id
+
+    user_plex_id = _get_request_user_id(request, indexes)
+
+    request_ids = []
+    for season in request["seasons"]:
+        # for each requested season, get the season id for the seasonNumber of the request, add an entry to season_requests.
+        season_num = season["seasonNumber"]
+
+        # get the season_id from the "seasons" table from the entry with the
+        # given show_id and season_num combination
+        season_id = seasons.get((show_id, season_num))
+        if season_id is None:
+            season_id = get_fields_from_table(conn, {
+                "table": "seasons",
+                "get": "season_id",
+                "where": {"show_id": show_id, "season_num": season_num}
+            })
+            if season_id is not None:
+                seasons[(show_id, season_num)] = season_id
+        
+        request_id = _upsert_to_table(conn, {
+            "table": "season_requests",
+            "conflict": ["season_id", "requested_at", "user_id"],
+            "update": ["status", "updated_at", "overseerr_request_id"],
+            "data": {
+                "season_id": season_id,
+                "show_id": show_id,
+                "requested_at": get_unix_from_iso(season["createdAt"]),
+                "status": season["status"],
+                "updated_at": get_unix_from_iso(season["updatedAt"]),
+                "user_id": user_plex_id,
+                "overseerr_request_id": request["id"]
+            },
+            "return": "request_id"
+        })
+        request_ids.append(request_id)
+        print(f"Added season request for {show["show_name"]} ({show["year"]}): season {season_num}, requested by {user_plex_id}, request ID: {request_id}")
+
+    return request_ids
 
 def get_tvdb_id_for_show(conn, show_name, year):
     """
@@ -729,18 +1326,17 @@ def get_tvdb_id_for_show(conn, show_name, year):
     tvdb_id = tvdb.get_show_tvdb_id(show_name, year)
 
     if tvdb_id:
-        with conn:
-            conn.execute(
-                "UPDATE shows SET tvdb_id = ? WHERE show_name = ? AND year = ?",
-                (tvdb_id, show_name, year)
-            )
+        db_writer.execute(
+            "UPDATE shows SET tvdb_id = ? WHERE show_name = ? AND year = ?",
+            (tvdb_id, show_name, year)
+        ).result()
 
     return tvdb_id
 
-def get_recent_episodes(conn, show_id):
+def _get_recent_episode_numbers(conn, show_id):
     """
-    Returns rows from the episodes table for episodes of the given show
-    that have aired in the last 7 days (determined via the TVDB API).
+    returns (season_num, number, aired) for each episode of the given show that has
+    aired in the last 7 days (determined via the TVDB API).
     """
     # get show info
     result = get_fields_from_table(conn, {
@@ -764,66 +1360,116 @@ def get_recent_episodes(conn, show_id):
 
     seven_days_ago = date.today() - timedelta(days=7)
 
-    # collect recent episodes as (season_num, number)
-    recent_eps = [
-        (ep["seasonNumber"], ep["number"])
+    # collect recent episodes as (season_num, number, aired)
+    return [
+        (ep["seasonNumber"], ep["number"], ep["aired"])
         for ep in api_episodes
         if ep.get("aired")
         and seven_days_ago <= datetime.strptime(ep["aired"], "%Y-%m-%d").date() <= date.today()
     ]
 
-    if not recent_eps:
-        return []
-
-    # fetch corresponding episodes from the database
-    rows = []
-    for season_num, number in recent_eps:
-        season_row = conn.execute("""
-            SELECT season_id FROM seasons
-            WHERE show_id = ? AND season_num = ?
-        """, (show_id, season_num)).fetchone()
-        if not season_row:
-            continue
-
-        season_id = season_row["season_id"]
-
-        episode_row = conn.execute("""
-            SELECT *
-            FROM episodes
-            WHERE show_id = ? AND season_id = ? AND number = ?
-        """, (show_id, season_id, number)).fetchone()
-
-        if episode_row:
-            rows.append(dict(episode_row))
-
-    return rows
+def _recent_episodes_cte(recent):
+    """
+    build a `recent(show_id, season_num, number, aired)` VALUES table for use in a WITH clause,
+    from a list of (show_id, season_num, number, aired) tuples.
+    returns the CTE sql and its params.
+    """
+    values = ", ".join("(?, ?, ?, ?)" for _ in recent)
+    params = [value for row in recent for value in row]
+    return f"recent(show_id, season_num, number, aired) AS (VALUES {values})", params
 
+def get_shows_with_recent_episodes(conn, show_ids):
+    """
+    of the given shows, returns those that have an episode in the episodes table that
+    has aired in the last 7 days (determined via the TVDB API), as
+    {show_id: [{"episode_id": ..., "show_id": ..., "aired": ...}, ...]}.
+    TVDB is asked about each show once, then every show's episodes are found in a single statement.
+    """
+    recent = []
+    for show_id in show_ids:
+        # nothing is written here, so stopping between shows is safe
+        check_cancelled()
+        recent.extend((show_id, s, n, aired) for s, n, aired in _get_recent_episode_numbers(conn, show_id))
+    if not recent:
+        return {}
+
+    cte, params = _recent_episodes_cte(recent)
+    rows = conn.execute(f"""
+        WITH {cte}
+        SELECT DISTINCT e.episode_id, r.show_id, r.aired
+        FROM recent r
+        JOIN seasons s ON s.show_id = r.show_id AND s.season_num = r.season_num
+        JOIN episodes e ON e.season_id = s.season_id AND e.show_id = r.show_id AND e.number = r.number
+        ORDER BY r.show_id
+    """, params).fetchall()
+
+    return {
+        show_id: [dict(row) for row in show_rows]
+        for show_id, show_rows in groupby(rows, key=lambda row: row["show_id"])
+    }
 
 def get_all_shows_watched_by_user(user_id):
     """
     get a list of all shows watched by a given user.
-    (get every entry of the 'episode_watches' table with the given user_id, then get the
-     corresponding show from the 'shows' table. each show only appears once in result)
+    (read from the 'user_show_stats' summary table, which has one row per show watched
+     by each user, then get the corresponding show from the 'shows' table)
     """
     query = """
-        SELECT DISTINCT s.*
-        FROM episode_watches ew
-        JOIN episodes e ON ew.episode_id = e.episode_id
-        JOIN shows s ON e.show_id = s.show_id
-        WHERE ew.user_id = ?
+        SELECT s.*
+        FROM user_show_stats uss
+        JOIN shows s ON uss.show_id = s.show_id
+        WHERE uss.user_id = ?
     """
 
     with get_connection() as conn:
         rows = conn.execute(query, (user_id,)).fetchall()
-        result = [dict(row) for row in rows]
-
-        for show in result:
-            with get_connection() as conn:
-                episodes = get_recent_episodes(conn, show["show_id"])
-
-            print(f"GOT SHOW {show["show_name"]} ({show["year"]}), with recent episodes: {episodes}")
+        return [dict(row) for row in rows]
 
-        return result
+def get_user_watch_summary(user_id):
+    """
+    get a summary of everything a user has watched, read from the per-user summary
+    tables (so it does not need to aggregate the watch tables):
+    {
+        "show_watches": ..., "movie_watches": ..., "total_duration": ... (seconds),
+        "last_watched": {"type": "show"|"movie", "name": ..., "year": ..., "watched_at": ...} | None,
+        "shows": [{"show_id", "show_name", "year", "watch_count", "total_duration", "last_watched_at"}, ...],
+        "movies": [{"movie_id", "movie_name", "year", "watch_count", "total_duration", "last_watched_at"}, ...]
+    }
+    shows and movies are ordered from most to least recently watched.
+    """
+    with get_connection() as conn:
+        shows = [dict(row) for row in conn.execute("""
+            SELECT s.show_id, s.show_name, s.year, uss.watch_count, uss.total_duration, uss.last_watched_at
+            FROM user_show_stats uss
+            JOIN shows s ON uss.show_id = s.show_id
+            WHERE uss.user_id = ?
+            ORDER BY uss.last_watched_at DESC
+        """, (user_id,)).fetchall()]
+
+        movies = [dict(row) for row in conn.execute("""
+            SELECT m.movie_id, m.movie_name, m.year, ums.watch_count, ums.total_duration, ums.last_watched_at
+            FROM user_movie_stats ums
+            JOIN movies m ON ums.movie_id = m.movie_id
+            WHERE ums.user_id = ?
+            ORDER BY ums.last_watched_at DESC
+        """, (user_id,)).fetchall()]
+
+    last_watched = None
+    if shows and (not movies or shows[0]["last_watched_at"] >= movies[0]["last_watched_at"]):
+        last_watched = {"type": "show", "name": shows[0]["show_name"], "year": shows[0]["year"],
+                        "watched_at": shows[0]["last_watched_at"]}
+    elif movies:
+        last_watched = {"type": "movie", "name": movies[0]["movie_name"], "year": movies[0]["year"],
+                        "watched_at": movies[0]["last_watched_at"]}
+
+    return {
+        "show_watches": sum(s["watch_count"] for s in shows),
+        "movie_watches": sum(m["watch_count"] for m in movies),
+        "total_duration": sum(s["total_duration"] for s in shows) + sum(m["total_duration"] for m in movies),
+        "last_watched": last_watched,
+        "shows": shows,
+        "movies": movies
+    }
 
 def get_shows_with_new_episodes(user_id):
     """
@@ -832,22 +1478,262 @@ def get_shows_with_new_episodes(user_id):
     will return whether the episode has been watched by the user already.
     """
 
+def refresh_new_episodes():
+    """
+    work out, for every user at once, which episodes of the shows they have watched
+    were released in the last 7 days but have not been watched by them yet.
+
+    TVDB is asked about each watched show once per run (not once per user), then the
+    recently aired episodes are joined against episode_watches for every user in a single
+    statement. the result is stored in the user_new_episodes table, which is what the
+    newly released content emails read from.
+    """
+    with get_connection() as conn:
+        show_ids = [
+            row["show_id"] for row in conn.execute("""
+                SELECT DISTINCT e.show_id
+                FROM episode_watches ew
+                JOIN episodes e ON ew.episode_id = e.episode_id
+            """).fetchall()
+        ]
+
+        # nothing is written until every show has been asked about, so stopping here is safe
+        shows = get_shows_with_recent_episodes(conn, show_ids)
+
+    recent = [episode for episodes in shows.values() for episode in episodes]
+    db_writer.run(_write_new_episodes, recent, int(time.time()))
+    print(f"Found {len(recent)} recently aired episodes across {len(show_ids)} watched shows.")
+    return True
+
+def _write_new_episodes(conn, recent, computed_at):
+    conn.execute("DELETE FROM user_new_episodes")
+    conn.execute("DELETE FROM recent_episodes")
+
+    conn.executemany("""
+        INSERT OR IGNORE INTO recent_episodes (episode_id, show_id, aired, computed_at)
+        VALUES (?, ?, ?, ?)
+    """, [(ep["episode_id"], ep["show_id"], ep["aired"], computed_at) for ep in recent])
+
+    # every user who has watched a show with a recent episode, gets that episode
+    # (unless they have already watched it).
+    conn.execute("""
+        INSERT INTO user_new_episodes (user_id, episode_id, show_id, aired, computed_at)
+        SELECT w.user_id, re.episode_id, re.show_id, re.aired, re.computed_at
+        FROM recent_episodes re
+        JOIN (
+            SELECT DISTINCT ew.user_id, e.show_id
+            FROM episode_watches ew
+            JOIN episodes e ON ew.episode_id = e.episode_id
+            WHERE e.show_id IN (SELECT show_id FROM recent_episodes)
+        ) w ON w.show_id = re.show_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM episode_watches ew2
+            WHERE ew2.user_id = w.user_id AND ew2.episode_id = re.episode_id
+        )
+    """)
+
+def _group_new_episodes(rows):
+    """
+    group rows of new episodes (ordered by show) into one entry per show:
+    [{"show_id": ..., "show_name": ..., "year": ..., "episodes": [...]}, ...]
+    """
+    shows = []
+    for row in rows:
+        if not shows or shows[-1]["show_id"] != row["show_id"]:
+            shows.append({
+                "show_id": row["show_id"],
+                "show_name": row["show_name"],
+                "year": row["year"],
+                "episodes": []
+            })
+        shows[-1]["episodes"].append({
+            "episode_id": row["episode_id"],
+            "season_num": row["season_num"],
+            "number": row["number"],
+            "name": row["name"],
+            "aired": row["aired"]
+        })
+    return shows
+
+_NEW_EPISODES_QUERY = """
+    SELECT une.user_id, une.show_id, sh.show_name, sh.year, une.episode_id,
+           se.season_num, e.number, e.name, une.aired
+    FROM user_new_episodes une
+    JOIN episodes e ON une.episode_id = e.episode_id
+    JOIN seasons se ON e.season_id = se.season_id
+    JOIN shows sh ON une.show_id = sh.show_id
+"""
+
 def get_new_episodes_for_user(user_id):
     """
     get a list of shows that the given user has watched, that have new episodes
     that have been released in the last 7 days. IT WILL IGNORE episodes that the
     user has already watched.
+    (reads the results of the last refresh_new_episodes() run)
     """
-    shows = get_all_shows_watched_by_user(user_id)
+    with get_connection() as conn:
+        rows = conn.execute(f"""
+            {_NEW_EPISODES_QUERY}
+            WHERE une.user_id = ?
+            ORDER BY sh.show_name, une.show_id, se.season_num, e.number
+        """, (user_id,)).fetchall()
 
-    for show in shows:
-        print(f"Considering show {show["show_name"]} ({show["year"]})")
-        with get_connection() as conn:
-            recent_episodes = get_recent_episodes(conn, show["show_id"])
-            if not recent_episodes:
-                print(f"    - Show has no recent episodes")
-            else:
-                print(f"    - Show has {len(recent_episodes)} recent episodes.")
+    return _group_new_episodes(rows)
+
+def get_new_episodes_digest():
+    """
+    get the new episodes of every user who should receive the newly released content
+    email (users with an email, who are not on its unsubscribe list).
+    returns [{"user_id": ..., "username": ..., "friendly_name": ..., "email": ..., "shows": [...]}, ...]
+    """
+    with get_connection() as conn:
+        rows = conn.execute(f"""
+            {_NEW_EPISODES_QUERY}
+            WHERE une.user_id IN (
+                SELECT u.user_id FROM users u
+                WHERE u.email IS NOT NULL AND u.email != ''
+                AND u.user_id NOT IN (SELECT user_id FROM newly_released_content_updates_unsubscribe_list)
+            )
+            ORDER BY une.user_id, sh.show_name, une.show_id, se.season_num, e.number
+        """).fetchall()
+        users = _get_table_indexed(conn, "users", "user_id")
+
+    digest = []
+    for user_id, user_rows in groupby(rows, key=lambda row: row["user_id"]):
+        user = users[user_id]
+        digest.append({
+            "user_id": user_id,
+            "username": user["username"],
+            "friendly_name": user["friendly_name"],
+            "email": user["email"],
+            "shows": _group_new_episodes(user_rows)
+        })
+    return digest
+
+def _released_at_home(release_dates, now: datetime):
+    """
+    whether a movie has had a digital, physical or tv release anywhere by `now`, from
+    tmdb.get_movie_release_dates(). a movie only released in cinemas has not.
+    """
+    for country in release_dates:
+        for release in country.get("release_dates") or []:
+            if release.get("type") not in TMDB_HOME_RELEASE_TYPES or not release.get("release_date"):
+                continue
+            released = datetime.fromisoformat(release["release_date"].replace("Z", "+00:00"))
+            if released <= now:
+                return True
+    return False
+
+def get_unreleased_movie_requests():
+    """
+    get the movie requests made in the last UNRELEASED_REQUEST_MAX_AGE seconds, for movies
+    that have not been released for streaming yet (only in cinemas, or not at all), that
+    the requester hasn't been emailed about. requests that were declined, for movies
+    already on the server, by users without an email, or by users on the
+    request_for_unreleased_content_unsubscribe_list are left out.
+    movies TMDB can't tell us about are left out too, rather than guessed at.
+    returns [{"user_id": ..., "username": ..., "friendly_name": ..., "email": ..., "movies": [...]}, ...]
+    """
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT mr.request_id, mr.user_id, mr.requested_at, m.movie_id, m.movie_name, m.year, m.tmdb_id
+            FROM movie_requests mr
+            JOIN movies m ON mr.movie_id = m.movie_id
+            JOIN users u ON mr.user_id = u.user_id
+            WHERE mr.requested_at >= ?
+            AND mr.status != 3
+            AND m.tmdb_id IS NOT NULL
+            AND u.email IS NOT NULL AND u.email != ''
+            AND u.user_id NOT IN (SELECT user_id FROM request_for_unreleased_content_unsubscribe_list)
+            AND mr.request_id NOT IN (SELECT request_id FROM unreleased_request_emails)
+            AND NOT EXISTS (SELECT 1 FROM movie_added ma WHERE ma.movie_id = m.movie_id)
+            ORDER BY mr.user_id, mr.requested_at
+        """, (int(time.time()) - UNRELEASED_REQUEST_MAX_AGE,)).fetchall()
+        users = _get_table_indexed(conn, "users", "user_id")
+
+    # each movie is only asked about once, however many users requested it
+    now = datetime.now(timezone.utc)
+    released = {}
+    for row in rows:
+        check_cancelled()
+        if row["tmdb_id"] not in released:
+            release_dates = tmdb.get_movie_release_dates(row["tmdb_id"])
+            released[row["tmdb_id"]] = None if not isinstance(release_dates, list) else _released_at_home(release_dates, now)
+
+    unreleased = []
+    for user_id, user_rows in groupby(rows, key=lambda row: row["user_id"]):
+        movies = [
+            {
+                "request_id": row["request_id"],
+                "movie_id": row["movie_id"],
+                "movie_name": row["movie_name"],
+                "year": row["year"],
+                "requested_at": row["requested_at"],
+                "poster": images.poster_cid("movie", row["movie_id"])
+            }
+            for row in user_rows
+            if released[row["tmdb_id"]] is False
+        ]
+        if movies:
+            user = users[user_id]
+            unreleased.append({
+                "user_id": user_id,
+                "username": user["username"],
+                "friendly_name": user["friendly_name"],
+                "email": user["email"],
+                "movies": movies
+            })
+    return unreleased
+
+def set_unreleased_requests_emailed(request_ids: list):
+    """record that the requesters of these movie requests have been emailed about them"""
+    return db_writer.executemany(
+        "INSERT OR IGNORE INTO unreleased_request_emails (request_id, emailed_at) VALUES (?, ?)",
+        [(request_id, int(time.time())) for request_id in request_ids]
+    ).result()
+
+def iter_email_contexts(emails: list):
+    """
+    for each of the given email addresses, yield (email, context) where context holds
+    what a personalised email template can use:
+    {
+        "user": {"user_id": ..., "username": ..., "friendly_name": ..., "email": ...},
+        "shows": [new episodes, as in get_new_episodes_for_user(), with each show's "poster"]
+    }
+    everything comes from one query, read as it is iterated rather than all at once.
+    addresses that don't belong to a user get an empty context.
+    """
+    emails = list(dict.fromkeys(emails))
+    if not emails:
+        return
+
+    values = ", ".join("(?)" for _ in emails)
+    with get_connection() as conn:
+        rows = conn.execute(f"""
+            WITH recipients(email) AS (VALUES {values})
+            SELECT r.email AS recipient, u.user_id, u.username, u.friendly_name,
+                   n.show_id, n.show_name, n.year, n.episode_id, n.season_num, n.number, n.name, n.aired
+            FROM recipients r
+            LEFT JOIN users u ON u.email = r.email
+            LEFT JOIN ({_NEW_EPISODES_QUERY}) n ON n.user_id = u.user_id
+            ORDER BY r.email, u.user_id, n.show_name, n.show_id, n.season_num, n.number
+        """, emails)
+
+        for (email, user_id), user_rows in groupby(rows, key=lambda row: (row["recipient"], row["user_id"])):
+            user_rows = list(user_rows)
+            first = user_rows[0]
+            shows = _group_new_episodes(row for row in user_rows if row["show_id"] is not None)
+            for show in shows:
+                show["poster"] = images.poster_cid("show", show["show_id"])
+            yield email, {
+                "user": {
+                    "user_id": user_id,
+                    "username": first["username"],
+                    "friendly_name": first["friendly_name"],
+                    "email": email
+                },
+                "shows": shows
+            }
 
 def get_user_requests(user_id):
     """
@@ -914,6 +1800,7 @@ def populate_users_table():
     ^ ^ These can be obtained from the Tautulli backend
     """
 
+    set_stage("users")
     users = tautulli.get_users()
     
     if not users:
@@ -939,13 +1826,11 @@ def populate_users_table():
                 last_watched = excluded.last_watched;
             """
     
-    with get_connection() as conn:
-        print("Adding users to table...")
-        conn.executemany(query, users)
-        print("Finished adding users.")
-        return True
-    
-    return False
+    print("Adding users to table...")
+    db_writer.executemany(query, users).result()
+    report_progress(len(users), len(users))
+    print("Finished adding users.")
+    return True
 
 def print_hr():
     """
@@ -985,367 +1870,707 @@ def print_header(msg):
     print_line(msg)
     print_hr()
 
-def populate_shows():
+def get_sync_checkpoint(sync_name):
+    """
+    get the last recorded checkpoint of a sync job, or None if the sync job
+    has no checkpoint (it finished, or has never run) or its checkpoint is older than
+    SYNC_CHECKPOINT_MAX_AGE (in which case it is cleared, and the sync starts over).
+    returns {"sync_name": ..., "stage": ..., "position": ..., "updated_at": ...}
+    """
+    with get_connection() as conn:
+        checkpoint = get_row_from_table(conn, "sync_checkpoints", {"sync_name": sync_name})
+
+    if checkpoint and checkpoint["updated_at"] < time.time() - SYNC_CHECKPOINT_MAX_AGE:
+        print(f"Ignoring checkpoint of '{sync_name}' from {datetime.fromtimestamp(checkpoint['updated_at'])}, starting over.")
+        db_writer.run(_clear_sync_checkpoint, sync_name)
+        return None
+    return checkpoint
+
+def _set_sync_checkpoint(conn, sync_name, stage, position=0):
+    conn.execute("""
+        INSERT INTO sync_checkpoints (sync_name, stage, position, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(sync_name) DO UPDATE SET
+            stage = excluded.stage,
+            position = excluded.position,
+            updated_at = excluded.updated_at
+    """, (sync_name, stage, position, int(time.time())))
+
+def _clear_sync_checkpoint(conn, sync_name):
+    conn.execute("DELETE FROM sync_checkpoints WHERE sync_name = ?", (sync_name,))
+
+def _ingest_library_show(conn, show, metadata, seasons):
+    """
+    add a show (and its seasons) from Tautulli's /get_library_media_info endpoint.
+    metadata is only needed if the show is not already in the shows table.
+    returns the show_id, or None if the show could not be added.
+    """
+    show_name = show["title"]
+    year = show["year"]
+    rating_key = show.get("rating_key", None)
+
+    # consider shows
+    show_id = _attrs_vals_in_table(conn, {
+        "table": "shows",
+        "data": {
+            "show_name": show_name,
+            "year": year
+        },
+        "return": "show_id"
+    })
+
+    if show_id:
+        # the library has the show's current poster
+        _set_poster_url(conn, "shows", show_id, "tautulli_poster_url", show.get("thumb"))
+    elif metadata:
+        # this is a version with metadata; add to table
+        show_id = _add_to_table(conn, {
+            "table": "shows",
+            "data": {
+                "show_name": show_name,
+                "year": year,
+                "rating_key": rating_key,
+                "tautulli_poster_url": show["thumb"]
+            },
+            "return": "show_id"
+        })
+
+    if not show_id:
+        return None
+
+    # now consider seasons
+    for j, season in enumerate(seasons or []):
+        season_year = season.get("year", "")
+        season_id = _add_to_table(conn, {
+            "table": "seasons",
+            "data": {
+                "show_id": show_id,
+                "season_num": j,
+                "year": season_year if season_year != "" else 0,
+                "rating_key": season["rating_key"]
+            },
+            "return": "season_id"
+        })
+
+        # record when the season was added (at least, the most recent time it was added)
+        added_at = season.get("added_at")
+        if season_id and season_id != "" and added_at and added_at != "":
+            _add_to_table(conn, {
+                "table": "season_added",
+                "data": {
+                    "season_id": season_id,
+                    "added_at": added_at
+                }
+            })
+
+    return show_id
+
+def _ingest_episode_watch(conn, user_id, episode, show_metadata):
+    """
+    record a user's watch of an episode, from a row of Tautulli's /get_history endpoint.
+    the show, season and episode are added to the database first if not already there.
+    returns the watch_id, or None if the watch was not added.
+    """
+    # show
+    show_name = episode["grandparent_title"]
+    show_rating_key = episode["grandparent_rating_key"]
+    # season
+    season_number = episode["parent_media_index"]
+    season_rating_key = episode["parent_rating_key"]
+    #episode
+    episode_name = episode["title"]
+    episode_number = episode["media_index"]
+    episode_year = episode["year"]
+    episode_rating_key = episode["rating_key"]
+
+    #  consider show
+    show_year = None
+    if show_metadata and show_metadata.get("year"):
+        show_year = show_metadata["year"]
+    else:
+        # we need to know the year of the show. if this is the first ep
+        # of the first season, the episode's year is the same as the show's,
+        # so we can use that.
+        if int(season_number) == 1 and int(episode_number) == 1:
+            show_year = episode_year
+        # else:
+            # we don't know the show year therefore all we know is the name and rating key,
+            # and two instances of the same show may have different rating keys in
+            # tautulli. do not add to the table
+
+    if show_year:
+        # we know the name+year of the show, we can add it IF it isn't already there.
+        show_id = _attrs_vals_in_table(conn, {
+            "table": "shows",
+            "data": {
+                "show_name": show_name,
+                "year": show_year
+            },
+            "return": "show_id"
+        })
+
+        if not show_id:
+            show_id = _add_to_table(conn, {
+                "table": "shows",
+                "data": {
+                    "show_name": show_name,
+                    "year": show_year,
+                    "rating_key": show_rating_key,
+                    "tautulli_poster_url": show_metadata.get("thumb") if show_metadata else None
+                },
+                "return": "show_id"
+            })
+    else:
+        # we don't know the name+year of the show, we cannot add it yet.
+        # that being said, if there is a show in the table with the same name+rating_key
+        # we can accept that as being the same show.
+        show_id = _attrs_vals_in_table(conn, {
+            "table": "shows",
+            "data": {
+                "show_name": show_name,
+                "rating_key": show_rating_key
+            },
+            "return": "show_id"
+        })
+
+    # if the show_id is still None by this point, there is no way to figure out the show's name+year
+    # list this show as a failure and move on.
+    if not show_id:
+        return None
+
+    # show is now (or already was) in the shows table. now consider season.
+    season_id = _attrs_vals_in_table(conn, {
+        "table": "seasons",
+        "data": {
+            "show_id": show_id,
+            "season_num": season_number
+        },
+        "return": "season_id"
+    })
+    if not season_id:
+        # season not in table - add it.
+        season_id = _add_to_table(conn, {
+            "table": "seasons",
+            "data": {
+                "show_id": show_id,
+                "season_num": season_number,
+                "rating_key": season_rating_key
+            },
+            "return": "season_id"
+        })
+
+    # now consider episode.
+    episode_id = _attrs_vals_in_table(conn, {
+        "table": "episodes",
+        "data": {
+            "season_id": season_id,
+            "show_id": show_id,
+            "number": episode_number,
+            "name": episode_name
+        },
+        "return": "episode_id"
+    })
+    if not episode_id:
+        episode_id = _add_to_table(conn, {
+            "table": "episodes",
+            "data": {
+                "season_id": season_id,
+                "show_id": show_id,
+                "rating_key": episode_rating_key,
+                "number": episode_number,
+                "name": episode_name
+            },
+            "return": "episode_id"
+        })
+
+    # now add the episode watch to the table
+    watch_id = _add_to_table(conn, {
+        "table": "episode_watches",
+        "data": {
+            "user_id": user_id,
+            "episode_id": episode_id,
+            "started": episode["started"],
+            "stopped": episode["stopped"],
+            "pause_duration": episode["paused_counter"]
+        },
+        "return": "watch_id"
+    })
+
+    # only count the watch towards the user's stats if it is new
+    if watch_id:
+        _record_show_watch_stats(conn, user_id, show_id, episode_id,
+                                 episode["started"], episode["stopped"], episode["paused_counter"])
+
+    return watch_id
+
+def _ingest_library_movie(conn, movie):
+    """
+    add a movie from Tautulli's /get_library_media_info endpoint.
+    returns the movie_id if the movie was newly added, otherwise None.
+    """
+    existing_id = _attrs_vals_in_table(conn, {
+        "table": "movies",
+        "data": {
+            "movie_name": movie["title"],
+            "year": movie["year"]
+        },
+        "return": "movie_id"
+    })
+
+    movie_id = None
+    if existing_id:
+        # the library has the movie's current poster
+        _set_poster_url(conn, "movies", existing_id, "tautulli_poster_url", movie.get("thumb"))
+    else:
+        movie_id = _add_to_table(conn, {
+            "table": "movies",
+            "data": {
+                "movie_name": movie["title"],
+                "year": movie["year"],
+                "rating_key": movie["rating_key"],
+                "tautulli_poster_url": movie["thumb"]
+            },
+            "return": "movie_id"
+        })
+
+    # record when the movie was added (at least, the most recent time it was added)
+    added_at = movie.get("added_at")
+    if movie_id and added_at and added_at != "":
+        _add_to_table(conn, {
+            "table": "movie_added",
+            "data": {
+                "movie_id": movie_id,
+                "added_at": added_at
+            }
+        })
+
+    return movie_id
+
+def _ingest_movie_watch(conn, user_id, movie):
+    """
+    record a user's watch of a movie, from a row of Tautulli's /get_history endpoint.
+    the movie is added to the movies table first if not already there.
+    returns the watch_id, or None if the watch was not added.
+    """
+    # see if the movie is already in the the movies table.
+    # may not have the same rating_key, tmdb_id may be null.
+    # instead search for movie_name+year combination.
+    movie_id = _attrs_vals_in_table(conn, {
+        "table": "movies",
+        "data": {
+            "movie_name": movie["title"],
+            "year": movie["year"]
+        },
+        "return": "movie_id"
+    })
+
+    if not movie_id:
+        # add the movie to the table
+        movie_id = _add_to_table(conn, {
+            "table": "movies",
+            "data": {
+                "movie_name": movie["title"],
+                "year": movie["year"],
+                "rating_key": movie["rating_key"],
+                "tautulli_poster_url": movie["thumb"]
+            },
+            "return": "movie_id"
+        })
+
+    if not movie_id:
+        return None
+
+    # at the same time, we want to record the user's watch of the movie in movie_watches.
+    watch_id = _add_to_table(conn, {
+        "table": "movie_watches",
+        "data": {
+            "user_id": user_id,
+            "movie_id": movie_id,
+            "started": movie["started"],
+            "stopped": movie["stopped"],
+            "pause_duration": movie["paused_counter"]
+        },
+        "return": "watch_id"
+    })
+
+    # only count the watch towards the user's stats if it is new
+    if watch_id:
+        _record_movie_watch_stats(conn, user_id, movie_id,
+                                  movie["started"], movie["stopped"], movie["paused_counter"])
+
+    return watch_id
+
+def _record_show_watch_stats(conn, user_id, show_id, episode_id, started, stopped, pause_duration):
+    """
+    add a newly inserted episode watch to the user_show_stats summary table.
+    duration is the time spent watching (stopped - started - time paused).
+    """
+    conn.execute("""
+        INSERT INTO user_show_stats (user_id, show_id, watch_count, total_duration, last_watched_at, last_episode_id)
+        VALUES (?, ?, 1, MAX(? - ? - ?, 0), ?, ?)
+        ON CONFLICT(user_id, show_id) DO UPDATE SET
+            watch_count = watch_count + 1,
+            total_duration = total_duration + excluded.total_duration,
+            last_episode_id = CASE WHEN excluded.last_watched_at >= last_watched_at
+                                   THEN excluded.last_episode_id ELSE last_episode_id END,
+            last_watched_at = MAX(last_watched_at, excluded.last_watched_at)
+    """, (user_id, show_id, stopped, started, pause_duration, stopped, episode_id))
+
+def _record_movie_watch_stats(conn, user_id, movie_id, started, stopped, pause_duration):
+    """
+    add a newly inserted movie watch to the user_movie_stats summary table.
+    """
+    conn.execute("""
+        INSERT INTO user_movie_stats (user_id, movie_id, watch_count, total_duration, last_watched_at)
+        VALUES (?, ?, 1, MAX(? - ? - ?, 0), ?)
+        ON CONFLICT(user_id, movie_id) DO UPDATE SET
+            watch_count = watch_count + 1,
+            total_duration = total_duration + excluded.total_duration,
+            last_watched_at = MAX(last_watched_at, excluded.last_watched_at)
+    """, (user_id, movie_id, stopped, started, pause_duration, stopped))
+
+def _rebuild_user_watch_stats(conn):
+    """
+    recompute user_show_stats and user_movie_stats from scratch, from the watch tables.
+    (only needed for databases that had watches before the summary tables existed,
+     after that they are kept up to date as watches are added)
+    """
+    conn.execute("DELETE FROM user_show_stats")
+    conn.execute("DELETE FROM user_movie_stats")
+
+    # sqlite takes bare columns (ew.episode_id) from the row that has the MAX()
+    conn.execute("""
+        INSERT INTO user_show_stats (user_id, show_id, watch_count, total_duration, last_watched_at, last_episode_id)
+        SELECT ew.user_id, e.show_id, COUNT(*),
+               SUM(MAX(ew.stopped - ew.started - ew.pause_duration, 0)),
+               MAX(ew.stopped), ew.episode_id
+        FROM episode_watches ew
+        JOIN episodes e ON ew.episode_id = e.episode_id
+        GROUP BY ew.user_id, e.show_id
+    """)
+
+    conn.execute("""
+        INSERT INTO user_movie_stats (user_id, movie_id, watch_count, total_duration, last_watched_at)
+        SELECT user_id, movie_id, COUNT(*),
+               SUM(MAX(stopped - started - pause_duration, 0)),
+               MAX(stopped)
+        FROM movie_watches
+        GROUP BY user_id, movie_id
+    """)
+
+def _write_library_shows(conn, prepared, sync_name, position):
+    for show, metadata, seasons in prepared:
+        _ingest_library_show(conn, show, metadata, seasons)
+    _set_sync_checkpoint(conn, sync_name, "library", position)
+
+def _write_episode_watches(conn, user_id, episodes, show_metadata):
+    for episode in episodes:
+        _ingest_episode_watch(conn, user_id, episode, show_metadata.get(episode["grandparent_rating_key"]))
+
+def _write_library_movies(conn, movies, sync_name, position):
+    for movie in movies:
+        _ingest_library_movie(conn, movie)
+    _set_sync_checkpoint(conn, sync_name, "library", position)
+
+def _write_movie_watches(conn, user_id, movies):
+    for movie in movies:
+        _ingest_movie_watch(conn, user_id, movie)
+
+def ingest_tautulli_webhook(payload: dict):
+    """
+    accept a notification from Tautulli's webhook notification agent. the agent's JSON data
+    should be set to (for the "Playback Stop", "Watched" and "Recently Added" triggers):
+    {
+        "action": "{action}",
+        "user_id": "{user_id}",
+        "rating_key": "{rating_key}",
+        "media_type": "{media_type}"
+    }
+    the event is queued, and written with the same logic as populate_shows/populate_movies.
+    returns whether the notification was understood. raises ValueError if the payload
+    is malformed (e.g. a template variable in the JSON data was mistyped).
+    """
+    action = payload.get("action")
+    rating_key = payload.get("rating_key")
+    if action == "test":
+        return True
+    if not rating_key:
+        return False
+
+    if action in ("stop", "watched"):
+        if payload.get("media_type") not in ("episode", "movie") or not payload.get("user_id"):
+            return False
+        _tautulli_webhook_queue.put((
+            "watch", _webhook_id(payload["user_id"], "user_id"), _webhook_id(rating_key, "rating_key"), payload["media_type"]
+        ))
+        return True
+
+    if action == "created":
+        _tautulli_webhook_queue.put(("added", None, _webhook_id(rating_key, "rating_key"), payload.get("media_type")))
+        return True
+
+    return False
+
+def _process_tautulli_webhooks(events):
+    futures = []
+    show_metadata = {}
+    shows_added = set()
+
+    for kind, user_id, rating_key, media_type in dict.fromkeys(events):
+        if kind == "watch":
+            # tautulli writes the watch to its history when playback stops, so get it from there
+            # (this gives the same rows as a full sync would)
+            history = tautulli.get_recent_history_for_item(user_id, rating_key)
+            if not history:
+                print(f"No Tautulli history found for webhook watch of {rating_key} by {user_id}.")
+                continue
+
+            if media_type == "movie":
+                futures.append(db_writer.submit(_write_movie_watches, user_id, history))
+            else:
+                for episode in history:
+                    key = episode["grandparent_rating_key"]
+                    if key not in show_metadata:
+                        show_metadata[key] = tautulli.get_metadata(key)
+                futures.append(db_writer.submit(_write_episode_watches, user_id, history, show_metadata))
+            continue
+
+        # recently added
+        metadata = tautulli.get_metadata(rating_key)
+        if not metadata:
+            continue
+        media_type = metadata.get("media_type", media_type)
+
+        if media_type == "movie":
+            futures.append(db_writer.submit(_ingest_library_movie, metadata))
+            continue
+
+        # a show, season or episode was added. (re)add the show and its seasons, which
+        # records when each season was added.
+        show_rating_key = {
+            "show": metadata.get("rating_key"),
+            "season": metadata.get("parent_rating_key"),
+            "episode": metadata.get("grandparent_rating_key")
+        }.get(media_type)
+        if not show_rating_key or show_rating_key in shows_added:
+            continue
+        shows_added.add(show_rating_key)
+
+        show = metadata if media_type == "show" else tautulli.get_metadata(show_rating_key)
+        if show:
+            # the cached season list won't have the new season in it
+            seasons = tautulli.get_seasons(show_rating_key, forceFresh=True)
+            futures.append(db_writer.submit(_ingest_library_show, show, show, seasons))
+
+    for future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Failed to apply Tautulli webhook event: {e}")
+
+# playback stop notifications can arrive slightly before tautulli has written the
+# history row, so wait a little longer before processing them.
+_tautulli_webhook_queue = MicroBatchQueue(_process_tautulli_webhooks, name="tautulli-webhooks", batch_window=5.0)
+
+def _library_after_checkpoint(items, checkpoint):
+    """
+    items from a library (shows or movies from /get_library_media_info) to consider in the
+    "library" stage of a sync, as (keyed, unkeyed).
+    keyed are ordered by rating_key. the checkpoint's position is the rating_key of the
+    last item committed, so resuming skips exactly the items already done, even if the
+    library has changed since.
+    unkeyed are the items without a (numeric) rating_key. they can't be checkpointed, so
+    are processed in one go at the end of the stage (again, if it is resumed).
+    """
+    keyed = [item for item in items if str(item.get("rating_key") or "").isdigit()]
+    unkeyed = [item for item in items if not str(item.get("rating_key") or "").isdigit()]
+    keyed.sort(key=lambda item: int(item["rating_key"]))
+
+    if checkpoint and checkpoint["stage"] == "library":
+        keyed = [item for item in keyed if int(item["rating_key"]) > checkpoint["position"]]
+    return keyed, unkeyed
+
+def _library_position(keyed, checkpoint):
+    """the checkpoint position once all of `keyed` (from _library_after_checkpoint) are done"""
+    if keyed:
+        return int(keyed[-1]["rating_key"])
+    if checkpoint and checkpoint["stage"] == "library":
+        return checkpoint["position"]
+    return 0
+
+def _prepare_library_shows(shows):
+    """
+    talk to Tautulli about shows before handing them to the writer, so that no
+    transaction is held open during network requests. returns what _write_library_shows takes.
+    """
+    prepared = []
     with get_connection() as conn:
-        with conn:
-            users = _get_table(conn, "users")
-
-            print_header("GET SHOWS FROM TAUTULLI")
-
-            # first add all shows from active libraries
-            shows = tautulli.get_shows()
-            num_shows = len(shows)
-            print_line(f"Processing shows from Tautulli /get_library_media_info endpoint:")
-            print_line(f"The endpoint returns a list of shows, each of which will be added to contactarr's database.", 1)
-            #print(f"Shows: {len(shows)}")
-            for i, show in enumerate(shows):
-                print_line(f"Processing show ({i+1}/{num_shows})", 2)
-                show_name = show["title"]
-                year = show["year"]
-                rating_key = show.get("rating_key", None)
-
-                # consider shows
-                existing_id = _attrs_vals_in_table(conn, {
-                    "table": "shows",
-                    "data": {
-                        "show_name": show_name,
-                        "year": year
-                    },
-                    "return": "show_id"
-                })
-
-                if not existing_id:
-                    metadata = tautulli.get_metadata(rating_key)
-                    if metadata:
-                        # this is a version with metadata; add to table
-                        existing_id = _add_to_table(conn, {
-                            "table": "shows",
-                            "data": {
-                                "show_name": show_name,
-                                "year": year,
-                                "rating_key": rating_key,
-                                "tautulli_poster_url": show["thumb"]
-                            },
-                            "return": "show_id"
-                        })
-                        if show["thumb"] == "/library/metadata/27/thumb/1766335013":
-                            print("NOT ANOTHER ONE!!")
-
-                # now consider seasons
-                seasons = tautulli.get_seasons(rating_key)
-                for j, season in enumerate(seasons):
-                    year = season.get("year", "")
-                    season_id = _add_to_table(conn, {
-                        "table": "seasons",
-                        "data": {
-                            "show_id": existing_id,
-                            "season_num": j,
-                            "year": year if year != "" else 0,
-                            "rating_key": season["rating_key"]
-                        },
-                        "return": "season_id"
-                    })
-
-                    # record when the season was added (at least, the most recent time it was added)
-                    added_at = season.get("added_at")
-                    if season_id and season_id != "" and added_at and added_at != "":
-                        _add_to_table(conn, {
-                            "table": "season_added",
-                            "data": {
-                                "season_id": season_id,
-                                "added_at": added_at
-                            }
-                        })
-
-            print_line("Finished processing shows from /get_libraries endpoint.")
-
-            # Tautulli may still have data for shows that have been removed from the plex
-            # server. we still want to include these.
-            print_hr()
-            print_line("Processing additional shows from each user from Tautulli /get_history endpoint:")
-            print_line("Contactarr has a list of users from Tautulli. For each user, the /get_history endpoint will return"+ 
-                        " each episode watched by the user. For each episode, add the show, season, and episode to the database"+
-                        " if not already there. Then record the user's watch of the episode.", 1)
-            num_users = len(users)
-            for i, user in enumerate(users):
-                # get the list of shows watched by the user
-                user_id = user["user_id"]
-                history = tautulli.get_episode_watch_history(user_id)
-
-                if history and isinstance(history, list) and len(history) > 0:
-                    num_episodes = len(history)
-                    print_line(f"Processing user {user["username"]} ({i+1}/{num_users}) - {num_episodes} episode watches to consider...", 2)
-                    for episode in history:
-                        # consider each episode. if the show is not in the shows table,
-                        # but does not Tautulli has no metadata for it, don't add it yet.
-                        #   - (we want to get the TVDB ID)
-                        #
-
-                        # show
-                        show_name = episode["grandparent_title"]
-                        show_rating_key = episode["grandparent_rating_key"]
-                        show_metadata = tautulli.get_metadata(show_rating_key)
-                        # season
-                        season_number = episode["parent_media_index"]
-                        season_rating_key = episode["parent_rating_key"]
-                        #episode
-                        episode_name = episode["title"]
-                        episode_number = episode["media_index"]
-                        episode_year = episode["year"]
-                        episode_rating_key = episode["rating_key"]
-
-                        b = False
-                        if (str(user_id)=="182886173" and show_name=="The Pitt" and str(season_number)=="2" and str(episode_number)=="7"):
-                            print(f"!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!1")
-                            print(f"Considering The Pitt S2E7 for Grace")
-                            b = True
-                        
-                        #  consider show
-                        #print(f"Considering show {show_name}")
-                        show_year = None
-                        show_id = None
-                        if show_metadata and show_metadata.get("year"):
-                            show_year = show_metadata["year"]
-                            if b:
-                                print(f"We already knew the year from the metadata: {show_year}")
-                        else:
-                            # we need to know the year of the show. if this is the first ep
-                            # of the first season, the episode's year is the same as the show's,
-                            # so we can use that.
-                            if int(season_number) == 1 and int(episode_number) == 1:
-                                show_year = episode_year
-                                if b:
-                                    print(f"We figured out the year of the show from the year of the episode: {show_year}")
-                            # else:
-                                # we don't know the show year therefore all we know is the name and rating key,
-                                # and two instances of the same show may have different rating keys in
-                                # tautulli. do not add to the table
-                        
-                        if show_year:
-                            # we know the name+year of the show, we can add it IF it isn't already there.
-                            existing_id = _attrs_vals_in_table(conn, {
-                                "table": "shows",
-                                "data": {
-                                    "show_name": show_name,
-                                    "year": show_year
-                                },
-                                "return": "show_id"
-                            })
-
-                            if not existing_id:
-                                existing_id = _add_to_table(conn, {
-                                    "table": "shows",
-                                    "data": {
-                                        "show_name": show_name,
-                                        "year": show_year,
-                                        "rating_key": show_rating_key,
-                                        "tautulli_poster_url": show_metadata.get("thumb") if show_metadata else None
-                                    },
-                                    "return": "show_id"
-                                })
-                                if b:
-                                    print(f"We didn't already know the ID of the show, so we added it, getting {existing_id}")
-                            else:
-                                if b:
-                                    print(f"We already have the show so we got ID: {existing_id}")
-                        else:
-                            # we don't know the name+year of the show, we cannot add it yet.
-                            # that being said, if there is a show in the table with the same name+rating_key
-                            # we can accept that as being the same show.
-                            existing_id = _attrs_vals_in_table(conn, {
-                                "table": "shows",
-                                "data": {
-                                    "show_name": show_name,
-                                    "rating_key": show_rating_key
-                                },
-                                "return": "show_id"
-                            })
-                            if b:
-                                print(f"We already have the show so we got ID: {existing_id}")
-
-                        # if the existing_id is still None by this point, there is no way to figure out the show's name+year
-                        # list this show as a failure and move on.
-                        if not existing_id:
-                            #print("NO EXISTING ID")
-                            if b:
-                                print(f"FAILED FOR SOME REASON???? (while trying to get existing_id)")
-                            continue
-                        
-                        # show is now (or already was) in the shows table. now consider season.
-                        season_id = _attrs_vals_in_table(conn, {
-                            "table": "seasons",
-                            "data": {
-                                "show_id": existing_id,
-                                "season_num": season_number
-                            },
-                            "return": "season_id"
-                        })
-                        if not season_id:
-                            # season not in table - add it.
-                            season_id = _add_to_table(conn, {
-                                "table": "seasons",
-                                "data": {
-                                    "show_id": existing_id,
-                                    "season_num": season_number,
-                                    "rating_key": season_rating_key
-                                },
-                                "return": "season_id"
-                            })
-
-                        # now consider episode.
-                        episode_id = _attrs_vals_in_table(conn, {
-                            "table": "episodes",
-                            "data": {
-                                "season_id": season_id,
-                                "show_id": existing_id,
-                                "number": episode_number,
-                                "name": episode_name
-                            },
-                            "return": "episode_id"
-                        })
-                        if not episode_id:
-                            episode_id = _add_to_table(conn, {
-                                "table": "episodes",
-                                "data": {
-                                    "season_id": season_id,
-                                    "show_id": existing_id,
-                                    "rating_key": episode_rating_key,
-                                    "number": episode_number,
-                                    "name": episode_name
-                                },
-                                "return": "episode_id"
-                            })
-
-                        # now add the episode watch to the table
-                        watch_id = _add_to_table(conn, {
-                            "table": "episode_watches",
-                            "data": {
-                                "user_id": user_id,
-                                "episode_id": episode_id,
-                                "started": episode["started"],
-                                "stopped": episode["stopped"],
-                                "pause_duration": episode["paused_counter"]
-                            },
-                            "return": "watch_id"
-                        })
-                        if b:
-                            print(f"SUCCESSFULLY ADDED: {watch_id}")
-                            print(f"Added: {user_id}, {episode_id}, {episode["started"]}, {episode["stopped"]}, {episode["paused_counter"]}")
-
-            print_line("Finished processing shows from /get_history endpoint.")
-            print_hr()
-
-def populate_movies():
+        for show in shows:
+            rating_key = show.get("rating_key", None)
+            in_table = _attrs_vals_in_table(conn, {
+                "table": "shows",
+                "data": {"show_name": show["title"], "year": show["year"]}
+            })
+            metadata = None if in_table else tautulli.get_metadata(rating_key)
+            prepared.append((show, metadata, tautulli.get_seasons(rating_key)))
+    return prepared
+
+def _get_users_for_history(checkpoint):
+    """
+    users to consider in the "history" stage of a sync, ordered by user_id.
+    if resuming from a checkpoint in the "history" stage, users up to and including
+    the checkpointed user_id have already been processed, and are skipped.
+    """
     with get_connection() as conn:
-        with conn:
-            users = _get_table(conn, "users")
-
-            print_header("GET MOVIES FROM TAUTULLI")
-
-            # first add all movies from active libraries
-            movies = tautulli.get_movies()
-            num_movies = len(movies)
-            print_line(f"Processing movies from Tautulli /get_library_media_info endpoint:")
-            print_line(f"The endpoint returns a list of movies, each of which will be added to contactarr's database.", 1)
-            for i, movie in enumerate(movies):
-                print_line(f"Processing movie ({i+1}/{num_movies})", 2)
-                in_table = _attrs_vals_in_table(conn, {
-                    "table": "movies",
-                    "data": {
-                        "movie_name": movie["title"],
-                        "year": movie["year"]
-                    }
-                })
-
-                movie_id = None
-                if not in_table:
-                        # get tmdb_ID from TMDb
-                        
-
-                        movie_id = _add_to_table(conn, {
-                            "table": "movies",
-                            "data": {
-                                "movie_name": movie["title"],
-                                "year": movie["year"],
-                                "rating_key": movie["rating_key"],
-                                "tautulli_poster_url": movie["thumb"]
-                            },
-                            "return": "movie_id"
-                        })
-
-                # record when the movie was added (at least, the most recent time it was added)
-                added_at = movie.get("added_at")
-                if movie_id and added_at and added_at != "":
-                    _add_to_table(conn, {
-                        "table": "movie_added",
-                        "data": {
-                            "movie_id": movie_id,
-                            "added_at": added_at
-                        }
-                    })
-
-            # Tautulli may still have data for movies that have been removed from the plex
-            # server. we still want to include those.
-            print_hr()
-            print_line("Processing additional movies from each user from Tautulli /get_history endpoint:")
-            print_line("Contactarr has a list of users from Tautulli. For each user, the /get_history endpoint will return" +
-                        " each movie watched by the user. Add each one to the database, if not already there. Then record the" +
-                        " user's watch of the movie", 1)
-            num_users = len(users)
-            for i, user in enumerate(users):
-                # get the list of movies watched by the user
-                history = tautulli.get_movie_watch_history(user["user_id"])
-
-                if history and isinstance(history, list) and len(history) > 0:
-                    num_movies = len(history)
-                    print_line(f"Processing user {user["username"]} ({i+1}/{num_users}) - {num_movies} movie watches to consider...", 2)
-                    for movie in history:
-                        # see if the movie is already in the the movies table.
-                        # may not have the same rating_key, tmdb_id may be null.
-                        # instead search for movie_name+year combination.
-                        in_table = _attrs_vals_in_table(conn, {
-                            "table": "movies",
-                            "data": {
-                                "movie_name": movie["title"],
-                                "year": movie["year"]
-                            }
-                        })
-                        
-                        if not in_table:
-                            metadata = tautulli.get_metadata(movie["rating_key"])
-                            key = (movie["title"], movie["year"])
-
-                            # add the movie to the table
-                            _add_to_table(conn, {
-                                "table": "movies",
-                                "data": {
-                                    "movie_name": movie["title"],
-                                    "year": movie["year"],
-                                    "rating_key": movie["rating_key"],
-                                    "tautulli_poster_url": movie["thumb"]
-                                }
-                            })
-
-                        # at the same time, we want to record the user's watch of the movie in movie_watches.
-                        tmp = get_row_from_table(conn, "movies", {"movie_name": movie["title"], "year": movie["year"]})
-                        movie_id = tmp["movie_id"]
-                        user_id = user["user_id"]
-                        started = movie["started"]
-                        stopped = movie["stopped"]
-                        pause_duration = movie["paused_counter"]
-                        _add_to_table(conn, {
-                            "table": "movie_watches",
-                            "data": {
-                                "user_id": user_id,
-                                "movie_id": movie_id,
-                                "started": started,
-                                "stopped": stopped,
-                                "pause_duration": pause_duration
-                            }
-                        })
-
-            print_line("Finished processing movies from /get_history endpoint.")
-            print_hr()
+        users = conn.execute("SELECT * FROM users ORDER BY user_id").fetchall()
+    users = [dict(u) for u in users]
+
+    if checkpoint and checkpoint["stage"] == "history":
+        users = [u for u in users if u["user_id"] > checkpoint["position"]]
+    return users
+
+def populate_shows(resume=True):
+    """
+    add shows, seasons, episodes and episode watches from Tautulli to the database.
+
+    the sync is committed in chunks: every SYNC_CHUNK_SIZE shows from the library, then
+    per user (every SYNC_CHUNK_SIZE watches) for the watch history. a checkpoint is written
+    alongside each chunk, so an interrupted sync picks up from the last committed chunk
+    when run again (unless resume=False).
+    """
+    sync_name = "populate_shows"
+    checkpoint = get_sync_checkpoint(sync_name) if resume else None
+
+    print_header("GET SHOWS FROM TAUTULLI")
+    if checkpoint:
+        print_line(f"Resuming from checkpoint: stage '{checkpoint['stage']}', position {checkpoint['position']}")
+
+    if not checkpoint or checkpoint["stage"] == "library":
+        # first add all shows from active libraries
+        shows, unkeyed = _library_after_checkpoint(tautulli.get_shows() or [], checkpoint)
+        num_shows = len(shows) + len(unkeyed)
+        print_line(f"Processing shows from Tautulli /get_library_media_info endpoint:")
+        print_line(f"The endpoint returns a list of shows, each of which will be added to contactarr's database.", 1)
+
+        for chunk_start in range(0, len(shows), SYNC_CHUNK_SIZE):
+            chunk = shows[chunk_start:chunk_start + SYNC_CHUNK_SIZE]
+            print_line(f"Processing shows ({chunk_start+1}-{chunk_start+len(chunk)}/{num_shows})", 2)
+            db_writer.run(_write_library_shows, _prepare_library_shows(chunk), sync_name, int(chunk[-1]["rating_key"]))
+            report_progress(chunk_start + len(chunk), num_shows, stage="shows")
+            check_cancelled()
+
+        if unkeyed:
+            print_line(f"Processing {len(unkeyed)} shows without a rating_key", 2)
+            db_writer.run(_write_library_shows, _prepare_library_shows(unkeyed), sync_name,
+                          _library_position(shows, checkpoint))
+            report_progress(num_shows, num_shows, stage="shows")
+            check_cancelled()
+
+        print_line("Finished processing shows from /get_libraries endpoint.")
+
+    # Tautulli may still have data for shows that have been removed from the plex
+    # server. we still want to include these.
+    print_hr()
+    print_line("Processing additional shows from each user from Tautulli /get_history endpoint:")
+    print_line("Contactarr has a list of users from Tautulli. For each user, the /get_history endpoint will return"+ 
+                " each episode watched by the user. For each episode, add the show, season, and episode to the database"+
+                " if not already there. Then record the user's watch of the episode.", 1)
+    users = _get_users_for_history(checkpoint)
+    num_users = len(users)
+    for i, user in enumerate(users):
+        # get the list of shows watched by the user
+        user_id = user["user_id"]
+        history = tautulli.get_episode_watch_history(user_id)
+
+        if history and isinstance(history, list) and len(history) > 0:
+            num_episodes = len(history)
+            print_line(f"Processing user {user["username"]} ({i+1}/{num_users}) - {num_episodes} episode watches to consider...", 2)
+
+            # we want the metadata of each show (to get the show's year), but only once per show.
+            show_metadata = {}
+            for episode in history:
+                key = episode["grandparent_rating_key"]
+                if key not in show_metadata:
+                    show_metadata[key] = tautulli.get_metadata(key)
+
+            futures = [
+                db_writer.submit(_write_episode_watches, user_id, history[j:j + SYNC_CHUNK_SIZE], show_metadata)
+                for j in range(0, num_episodes, SYNC_CHUNK_SIZE)
+            ]
+            for future in futures:
+                future.result()
+
+        db_writer.run(_set_sync_checkpoint, sync_name, "history", user_id)
+        report_progress(i + 1, num_users, stage="show watch history")
+        check_cancelled()
+
+    db_writer.run(_clear_sync_checkpoint, sync_name)
+    print_line("Finished processing shows from /get_history endpoint.")
+    print_hr()
+
+def populate_movies(resume=True):
+    """
+    add movies and movie watches from Tautulli to the database.
+    committed in chunks with checkpoints, in the same way as populate_shows().
+    """
+    sync_name = "populate_movies"
+    checkpoint = get_sync_checkpoint(sync_name) if resume else None
+
+    print_header("GET MOVIES FROM TAUTULLI")
+    if checkpoint:
+        print_line(f"Resuming from checkpoint: stage '{checkpoint['stage']}', position {checkpoint['position']}")
+
+    if not checkpoint or checkpoint["stage"] == "library":
+        # first add all movies from active libraries
+        movies, unkeyed = _library_after_checkpoint(tautulli.get_movies() or [], checkpoint)
+        num_movies = len(movies) + len(unkeyed)
+        print_line(f"Processing movies from Tautulli /get_library_media_info endpoint:")
+        print_line(f"The endpoint returns a list of movies, each of which will be added to contactarr's database.", 1)
+
+        for chunk_start in range(0, len(movies), SYNC_CHUNK_SIZE):
+            chunk = movies[chunk_start:chunk_start + SYNC_CHUNK_SIZE]
+            print_line(f"Processing movies ({chunk_start+1}-{chunk_start+len(chunk)}/{num_movies})", 2)
+            db_writer.run(_write_library_movies, chunk, sync_name, int(chunk[-1]["rating_key"]))
+            report_progress(chunk_start + len(chunk), num_movies, stage="movies")
+            check_cancelled()
+
+        if unkeyed:
+            print_line(f"Processing {len(unkeyed)} movies without a rating_key", 2)
+            db_writer.run(_write_library_movies, unkeyed, sync_name, _library_position(movies, checkpoint))
+            report_progress(num_movies, num_movies, stage="movies")
+            check_cancelled()
+
+    # Tautulli may still have data for movies that have been removed from the plex
+    # server. we still want to include those.
+    print_hr()
+    print_line("Processing additional movies from each user from Tautulli /get_history endpoint:")
+    print_line("Contactarr has a list of users from Tautulli. For each user, the /get_history endpoint will return" +
+                " each movie watched by the user. Add each one to the database, if not already there. Then record the" +
+                " user's watch of the movie", 1)
+    users = _get_users_for_history(checkpoint)
+    num_users = len(users)
+    for i, user in enumerate(users):
+        # get the list of movies watched by the user
+        user_id = user["user_id"]
+        history = tautulli.get_movie_watch_history(user_id)
+
+        if history and isinstance(history, list) and len(history) > 0:
+            num_movies = len(history)
+            print_line(f"Processing user {user["username"]} ({i+1}/{num_users}) - {num_movies} movie watches to consider...", 2)
+            futures = [
+                db_writer.submit(_write_movie_watches, user_id, history[j:j + SYNC_CHUNK_SIZE])
+                for j in range(0, num_movies, SYNC_CHUNK_SIZE)
+            ]
+            for future in futures:
+                future.result()
+
+        db_writer.run(_set_sync_checkpoint, sync_name, "history", user_id)
+        report_progress(i + 1, num_users, stage="movie watch history")
+        check_cancelled()
+
+    db_writer.run(_clear_sync_checkpoint, sync_name)
+    print_line("Finished processing movies from /get_history endpoint.")
+    print_hr()
 
 def get_users():
     with get_connection() as conn:
@@ -1359,27 +2584,27 @@ def get_admins():
         admins = [u for u in users if u['is_admin'] == 1]
     return admins
 
+def _set_admins(conn, lst):
+    # to do this, first set is_admin = 0 for all users
+    conn.execute("UPDATE users SET is_admin=0")
+    # now set is_admin = 1 for each user in lst
+    conn.executemany(
+        "UPDATE users SET is_admin=1 WHERE username = ?",
+        [(u["username"],) for u in lst]
+    )
+
 def set_admins(lst):
     """update list of admins"""
-    # to do this, first set is_admin = 0 for all users
-    with get_connection() as conn:
-        conn.execute("UPDATE users SET is_admin=0")
-        # now set is_admin = 1 for each user in lst
-        for u in lst:
-            conn.execute("UPDATE users SET is_admin=1 WHERE username = ?", (u["username"],))
+    db_writer.run(_set_admins, lst)
     return True
 
 def remove_admin(username):
-    with get_connection() as conn:
-        conn.execute("UPDATE users SET is_admin=0 WHERE username = ?", (username,))
-        return True
-    return False
+    db_writer.execute("UPDATE users SET is_admin=0 WHERE username = ?", (username,)).result()
+    return True
     
 def add_admin(username):
-    with get_connection() as conn:
-        conn.execute("UPDATE users SET is_admin=1 WHERE username = ?", (username,))
-        return True
-    return False
+    db_writer.execute("UPDATE users SET is_admin=1 WHERE username = ?", (username,)).result()
+    return True
 
 def get_unsubscribe_lists():
     """
@@ -1454,32 +2679,260 @@ def set_unsubscribe_list(table_name: str, user_ids: list):
     if not table_name or not table_name.endswith('_unsubscribe_list'):
         return False
 
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT name FROM sqlite_master
-            WHERE type = 'table' AND name = ?
-        """, (table_name,))
-        if not cur.fetchone():
-            return False
-        
-        # clear existing table!
-        cur.execute(f'DELETE FROM "{table_name}"')
+    return db_writer.run(_replace_unsubscribe_list, table_name, user_ids)
 
-        current_time = int(time.time())
-        for user_id in user_ids:
-            cur.execute(f'''
-                INSERT INTO "{table_name}" (user_id, added_at)
-                VALUES (?, ?)
-            ''', (user_id, current_time))
+def _replace_unsubscribe_list(conn, table_name, user_ids):
+    cur = conn.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name = ?
+    """, (table_name,))
+    if not cur.fetchone():
+        return False
+
+    # clear existing table!
+    conn.execute(f'DELETE FROM "{table_name}"')
+
+    current_time = int(time.time())
+    conn.executemany(f'''
+        INSERT INTO "{table_name}" (user_id, added_at)
+        VALUES (?, ?)
+    ''', [(user_id, current_time) for user_id in user_ids])
 
-        conn.commit()
-    
     return True
 
+def create_email_campaign(subject: str, html_body: str, sender: str, recipients: list, personalised_bodies=None):
+    """
+    add a campaign and queue one outbox row per (distinct) recipient.
+    personalised_bodies can map recipients to their own html body.
+    returns the campaign_id.
+    """
+    return db_writer.run(_create_email_campaign, subject, html_body, sender, recipients, personalised_bodies or {})
 
-def init_db():
+def _create_email_campaign(conn, subject, html_body, sender, recipients, personalised_bodies):
+    now = int(time.time())
+    campaign_id = conn.execute("""
+        INSERT INTO email_campaigns (subject, html_body, sender, created_at)
+        VALUES (?, ?, ?, ?)
+    """, (subject, html_body, sender, now)).lastrowid
+
+    conn.executemany("""
+        INSERT OR IGNORE INTO email_outbox (campaign_id, recipient, updated_at, html_body)
+        VALUES (?, ?, ?, ?)
+    """, [(campaign_id, recipient, now, personalised_bodies.get(recipient)) for recipient in recipients])
+
+    conn.execute("""
+        UPDATE email_campaigns
+        SET total = (SELECT COUNT(*) FROM email_outbox WHERE campaign_id = ?)
+        WHERE campaign_id = ?
+    """, (campaign_id, campaign_id))
+
+    return campaign_id
+
+def get_email_campaign(campaign_id: int):
+    with get_connection() as conn:
+        return get_row_from_table(conn, "email_campaigns", {"campaign_id": campaign_id})
+
+def claim_next_outbox_message():
+    """
+    take the next message that is due to be sent, marking it as 'sending'.
+    returns a dict with the outbox row and its campaign's sender, or None if nothing is due.
+    """
+    return db_writer.run(_claim_next_outbox_message, int(time.time()))
+
+def _claim_next_outbox_message(conn, now):
+    row = conn.execute("""
+        SELECT o.outbox_id, o.campaign_id, o.recipient, o.attempts, o.html_body, c.sender
+        FROM email_outbox o
+        JOIN email_campaigns c ON c.campaign_id = o.campaign_id
+        WHERE o.status = 'pending' AND o.next_attempt_at <= ?
+        ORDER BY o.next_attempt_at, o.outbox_id
+        LIMIT 1
+    """, (now,)).fetchone()
+    if not row:
+        return None
+
+    conn.execute("""
+        UPDATE email_outbox
+        SET status = 'sending', attempts = attempts + 1, updated_at = ?
+        WHERE outbox_id = ?
+    """, (now, row["outbox_id"]))
+
+    message = dict(row)
+    message["attempts"] += 1
+    return message
+
+def mark_outbox_sent(outbox_id: int):
+    return db_writer.run(_finish_outbox_message, outbox_id, "sent", None)
+
+def mark_outbox_failed(outbox_id: int, error: str, retry_at: int | None = None):
+    """
+    record a failed attempt. if retry_at is given, the message goes back to 'pending'
+    until then, otherwise it has failed for good.
+    """
+    status = "pending" if retry_at is not None else "failed"
+    return db_writer.run(_finish_outbox_message, outbox_id, status, error, retry_at or 0)
+
+def _finish_outbox_message(conn, outbox_id, status, error, retry_at=0):
+    # updated_at is taken here on the writer thread, so rows finish in updated_at order
+    # and get_outbox_progress() can follow them with `since`.
+    conn.execute("""
+        UPDATE email_outbox SET status = ?, last_error = ?, next_attempt_at = ?, updated_at = ?
+        WHERE outbox_id = ?
+    """, (status, error, retry_at, int(time.time()), outbox_id))
+
+def recover_outbox():
+    """
+    messages left 'sending' by a previous run may or may not have been delivered.
+    mark them as failed instead of sending them again, so nobody gets the email twice.
+    """
+    return db_writer.execute("""
+        UPDATE email_outbox
+        SET status = 'failed', last_error = 'interrupted while sending; may not have been delivered', updated_at = ?
+        WHERE status = 'sending'
+    """, (int(time.time()),)).result()
+
+def get_next_outbox_attempt():
+    """the earliest time a pending message is due, or None if there are no pending messages"""
+    with get_connection() as conn:
+        return conn.execute("""
+            SELECT MIN(next_attempt_at) FROM email_outbox WHERE status = 'pending'
+        """).fetchone()[0]
+
+def get_outbox_progress(campaign_id: int, since: int = 0):
+    """
+    the campaign's counts, and the messages that finished (were sent or failed for good)
+    at or after `since`, in the order they finished.
+    """
     with get_connection() as conn:
+        counts = {row["status"]: row["n"] for row in conn.execute("""
+            SELECT status, COUNT(*) AS n FROM email_outbox
+            WHERE campaign_id = ?
+            GROUP BY status
+        """, (campaign_id,))}
+
+        finished = [dict(row) for row in conn.execute("""
+            SELECT outbox_id, recipient, status, attempts, last_error, updated_at
+            FROM email_outbox
+            WHERE campaign_id = ? AND updated_at >= ? AND status IN ('sent', 'failed')
+            ORDER BY updated_at, outbox_id
+        """, (campaign_id, since))]
+
+    return counts, finished
+
+
+def save_job_run(job: dict):
+    """record a job (as given by jobRegister.get_job()) in job_runs, replacing any earlier record of it"""
+    return db_writer.run(_save_job_run, job)
+
+def _save_job_run(conn, job):
+    duration = None
+    if job["started_at"] is not None and job["finished_at"] is not None:
+        duration = round(job["finished_at"] - job["started_at"], 3)
+
+    conn.execute("""
+        INSERT INTO job_runs (
+            job_id, name, trigger, status, created_at, started_at, finished_at, duration, items, stages, error
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(job_id) DO UPDATE SET
+            status = excluded.status,
+            started_at = excluded.started_at,
+            finished_at = excluded.finished_at,
+            duration = excluded.duration,
+            items = excluded.items,
+            stages = excluded.stages,
+            error = excluded.error
+    """, (
+        job["id"], job["name"], job["trigger"], job["status"], job["created_at"], job["started_at"],
+        job["finished_at"], duration, job["items"], json.dumps(job["stages"]), job["error"]
+    ))
+
+    # prune old runs as new ones finish
+    if job["finished_at"] is not None:
+        conn.execute("DELETE FROM job_runs WHERE finished_at < ?", (job["finished_at"] - JOB_RUN_RETENTION,))
+
+def recover_job_runs():
+    """runs left queued or running by a previous process never finished, so mark them as interrupted"""
+    return db_writer.execute("""
+        UPDATE job_runs SET status = 'interrupted' WHERE status IN ('queued', 'running')
+    """).result()
+
+def get_job_runs(name: str = None, status: str = None, trigger: str = None, since: float = None, limit: int = 100):
+    """
+    get recorded job runs, most recent first, optionally only those with the given name,
+    status or trigger, or created at or after `since` (unix time).
+    each run is a dict of the job_runs columns, with stages decoded
+    ({stage: {"seconds": ..., "items": ...}}).
+    """
+    conditions = []
+    params = []
+    for column, value in (("name", name), ("status", status), ("trigger", trigger)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if since is not None:
+        conditions.append("created_at >= ?")
+        params.append(since)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with get_connection() as conn:
+        rows = conn.execute(f"""
+            SELECT * FROM job_runs {where} ORDER BY created_at DESC LIMIT ?
+        """, params + [limit]).fetchall()
+
+    runs = []
+    for row in rows:
+        run = dict(row)
+        run["stages"] = json.loads(run["stages"]) if run["stages"] else {}
+        runs.append(run)
+    return runs
+
+def get_job_run_stats(since: float = None):
+    """
+    per job name, how many runs there were (by status) and how long the successful ones
+    took and how many items they processed, since `since` (unix time) if given.
+    comparing these over time shows syncs slowing down, or the library growing.
+    """
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT
+                name,
+                COUNT(*) AS runs,
+                SUM(status = 'succeeded') AS succeeded,
+                SUM(status = 'failed') AS failed,
+                SUM(status = 'cancelled') AS cancelled,
+                AVG(CASE WHEN status = 'succeeded' THEN duration END) AS avg_duration,
+                MIN(CASE WHEN status = 'succeeded' THEN duration END) AS min_duration,
+                MAX(CASE WHEN status = 'succeeded' THEN duration END) AS max_duration,
+                AVG(CASE WHEN status = 'succeeded' THEN items END) AS avg_items,
+                MAX(created_at) AS last_run_at
+            FROM job_runs
+            WHERE created_at >= ?
+            GROUP BY name
+            ORDER BY name
+        """, (since or 0,)).fetchall()
+    return [dict(row) for row in rows]
+
+def get_scheduled_task_runs():
+    """get {task_name: last_run_at} for every scheduled task that has run before"""
+    with get_connection() as conn:
+        return {
+            row["task_name"]: row["last_run_at"]
+            for row in conn.execute("SELECT task_name, last_run_at FROM scheduled_tasks")
+        }
+
+def set_scheduled_task_run(task_name: str, ran_at: int):
+    return db_writer.run(_set_scheduled_task_run, task_name, ran_at)
+
+def _set_scheduled_task_run(conn, task_name, ran_at):
+    conn.execute("""
+        INSERT INTO scheduled_tasks (task_name, last_run_at)
+        VALUES (?, ?)
+        ON CONFLICT(task_name) DO UPDATE SET last_run_at = excluded.last_run_at
+    """, (task_name, ran_at))
+
+def init_db():
+    # a connection of its own, as get_connection() waits for init_db() to finish
+    with SafeConnection(_open_connection()) as conn:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS shows (
                 show_id INTEGER PRIMARY KEY,
@@ -1617,6 +3070,97 @@ def init_db():
             );
         """)
 
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_episodes_show_id ON episodes(show_id);
+        """)
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_show_stats (
+                user_id INTEGER NOT NULL REFERENCES users(user_id),
+                show_id INTEGER NOT NULL REFERENCES shows(show_id),
+                watch_count INTEGER NOT NULL DEFAULT 0,
+                total_duration INTEGER NOT NULL DEFAULT 0,
+                last_watched_at INTEGER,
+                last_episode_id INTEGER REFERENCES episodes(episode_id),
+                PRIMARY KEY(user_id, show_id)
+            );
+        """)
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_movie_stats (
+                user_id INTEGER NOT NULL REFERENCES users(user_id),
+                movie_id INTEGER NOT NULL REFERENCES movies(movie_id),
+                watch_count INTEGER NOT NULL DEFAULT 0,
+                total_duration INTEGER NOT NULL DEFAULT 0,
+                last_watched_at INTEGER,
+                PRIMARY KEY(user_id, movie_id)
+            );
+        """)
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS recent_episodes (
+                episode_id INTEGER PRIMARY KEY REFERENCES episodes(episode_id),
+                show_id INTEGER NOT NULL REFERENCES shows(show_id),
+                aired TEXT,
+                computed_at INTEGER NOT NULL
+            );
+        """)
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_new_episodes (
+                user_id INTEGER NOT NULL REFERENCES users(user_id),
+                episode_id INTEGER NOT NULL REFERENCES episodes(episode_id),
+                show_id INTEGER NOT NULL REFERENCES shows(show_id),
+                aired TEXT,
+                computed_at INTEGER NOT NULL,
+                PRIMARY KEY(user_id, episode_id)
+            );
+        """)
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_checkpoints (
+                sync_name TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                position INTEGER NOT NULL DEFAULT 0,
+                updated_at INTEGER NOT NULL
+            );
+        """)
+
+        # a row per job started through jobRegister. stages is json:
+        # {stage: {"seconds": ..., "items": ...}}. trigger is what started the job
+        # ('manual', 'scheduler', ...).
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_runs (
+                job_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                trigger TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                duration REAL,
+                items INTEGER NOT NULL DEFAULT 0,
+                stages TEXT,
+                error TEXT
+            );
+        """)
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_job_runs_name ON job_runs(name, created_at)
+        """)
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_job_runs_finished ON job_runs(finished_at)
+        """)
+
+        # when each task of the scheduler (backend/api/scheduler.py) last ran
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS scheduled_tasks (
+                task_name TEXT PRIMARY KEY,
+                last_run_at INTEGER NOT NULL
+            );
+        """)
+
         conn.execute("""
             CREATE TABLE IF NOT EXISTS newly_released_content_updates_unsubscribe_list (
                 user_id INTEGER NOT NULL REFERENCES users(user_id),
@@ -1624,9 +3168,71 @@ def init_db():
             );
         """)
 
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS request_for_unreleased_content_unsubscribe_list (
+                user_id INTEGER NOT NULL REFERENCES users(user_id),
+                added_at INTEGER NOT NULL DEFAULT (unixepoch())
+            );
+        """)
+
+        # movie requests whose requester has been emailed that the movie isn't out yet
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS unreleased_request_emails (
+                request_id INTEGER PRIMARY KEY REFERENCES movie_requests(request_id),
+                emailed_at INTEGER NOT NULL
+            );
+        """)
+
         conn.execute("""
             CREATE TABLE IF NOT EXISTS system_updates_unsubscribe_list (
                 user_id INTEGER NOT NULL REFERENCES users(user_id),
                 added_at INTEGER NOT NULL DEFAULT (unixepoch())
             );
         """)
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS email_campaigns (
+                campaign_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                subject TEXT NOT NULL,
+                html_body TEXT NOT NULL,
+                sender TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                created_at INTEGER NOT NULL
+            );
+        """)
+
+        # one row per recipient of a campaign. html_body is only set for personalised
+        # campaigns, otherwise the campaign's html_body is sent. status is 'pending' (waiting, possibly for a retry at next_attempt_at), 'sending',
+        # 'sent' or 'failed'.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                outbox_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                campaign_id INTEGER NOT NULL REFERENCES email_campaigns(campaign_id) ON DELETE CASCADE,
+                recipient TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at INTEGER NOT NULL DEFAULT 0,
+                updated_at INTEGER NOT NULL,
+                html_body TEXT,
+                UNIQUE(campaign_id, recipient)
+            );
+        """)
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_email_outbox_status ON email_outbox(status, next_attempt_at)
+        """)
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_email_outbox_campaign ON email_outbox(campaign_id, updated_at)
+        """)
+
+        # databases from before the watch summary tables existed need them filled in once.
+        has_stats = conn.execute("""
+            SELECT EXISTS(SELECT 1 FROM user_show_stats) OR EXISTS(SELECT 1 FROM user_movie_stats)
+        """).fetchone()[0]
+        has_watches = conn.execute("""
+            SELECT EXISTS(SELECT 1 FROM episode_watches) OR EXISTS(SELECT 1 FROM movie_watches)
+        """).fetchone()[0]
+        if has_watches and not has_stats:
+            _rebuild_user_watch_stats(conn)
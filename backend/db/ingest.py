@@ -0,0 +1,78 @@
+# -----------------------------contactarr------------------------------
+# This file is part of contactarr
+# Copyright (C) 2025 goggybox https://github.com/goggybox
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# that this program is licensed under. See LICENSE file. If not
+# available, see <https://www.gnu.org/licenses/>.
+
+# Please keep this header comment in all copies of the program.
+# --------------------------------------------------------------------
+
+import queue
+import threading
+import time
+import logging
+from typing import Any, Callable, List
+
+logger = logging.getLogger(__name__)
+
+class MicroBatchQueue:
+    """
+    collects items (such as webhook events) from request handlers, and passes them to
+    `handler` in small batches from a background thread.
+
+    a batch is handed over once `batch_window` seconds have passed since its first item
+    arrived, or once it holds `batch_size` items, whichever comes first. this way a burst
+    of events costs one round of work instead of one per event, and the request that
+    delivered the event doesn't wait for it to be processed.
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], None], name: str,
+                 batch_size: int = 100, batch_window: float = 1.0):
+        self.handler = handler
+        self.name = name
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def put(self, item: Any):
+        self._queue.put(item)
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        try:
+            # wait out the rest of the window for more items
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                batch.append(self._queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self.handler(batch)
+            except Exception as e:
+                logger.error(f"Error processing batch of {len(batch)} items from {self.name}: {e}")
@@ -0,0 +1,186 @@
+# -----------------------------contactarr------------------------------
+# This file is part of contactarr
+# Copyright (C) 2025 goggybox https://github.com/goggybox
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# that this program is licensed under. See LICENSE file. If not
+# available, see <https://www.gnu.org/licenses/>.
+
+# Please keep this header comment in all copies of the program.
+# --------------------------------------------------------------------
+
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+class DBWriter:
+    """
+    a single thread that owns the only writing connection to the database.
+
+    write operations are submitted to a queue as functions taking a connection.
+    the writer thread takes as many operations as are waiting (up to batch_size)
+    and commits them together in one transaction, so many small writes cost a
+    single commit. each operation runs inside its own SAVEPOINT, so one failing
+    operation is rolled back on its own without affecting the rest of the batch.
+
+    callers get a Future back, which resolves once the transaction containing
+    their operation has been committed.
+    """
+
+    def __init__(self, connect: Callable, batch_size: int = 200, batch_window: float = 0.01,
+                 after_batch: Callable = None):
+        """
+        connect: function returning a new sqlite3 connection (called from the writer thread).
+        batch_size: maximum number of operations grouped into one transaction.
+        batch_window: seconds to wait for more operations before committing a batch.
+        after_batch: function called on the writer thread once each batch has been committed
+            (or rolled back), before its futures resolve. e.g. to drop caches of what it wrote.
+        """
+        self._connect = connect
+        self._after_batch = after_batch
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """
+        queue func(conn, *args, **kwargs) to be run on the writer connection.
+        func must NOT commit or rollback itself (and must not use `with conn:`).
+
+        raises RuntimeError if called from inside an operation (i.e. on the writer thread):
+        the new operation could only run after the current batch, so waiting for it there
+        would never return. an operation should use the conn it was given instead.
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("DBWriter.submit() called from inside a writer operation; use its conn instead")
+        future = Future()
+        self._queue.put((func, args, kwargs, future))
+        self._ensure_started()
+        return future
+
+    def execute(self, sql: str, params=()) -> Future:
+        """queue a single statement, resolving to the number of rows changed"""
+        return self.submit(lambda conn: conn.execute(sql, params).rowcount)
+
+    def executemany(self, sql: str, seq_of_params) -> Future:
+        """queue a statement run once per set of params, resolving to the number of rows changed"""
+        seq_of_params = list(seq_of_params)
+        return self.submit(lambda conn: conn.executemany(sql, seq_of_params).rowcount)
+
+    def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        submit func and block until it has been committed, returning its result.
+        like submit(), raises RuntimeError if called from inside a writer operation.
+        """
+        return self.submit(func, *args, **kwargs).result()
+
+    def _next_batch(self):
+        # block until there is at least one operation, then gather whatever else
+        # arrives within the batch window.
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=self.batch_window))
+            except queue.Empty:
+                break
+        return batch
+
+    def _fail_queued(self, error):
+        """
+        fail every queued operation and let the writer thread exit, for when it can't
+        open its connection. the next submit() starts a new thread, which tries again.
+        """
+        with self._start_lock:
+            while True:
+                try:
+                    func, args, kwargs, future = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if not future.done():
+                    future.set_exception(error)
+            # cleared while holding the lock, so anything submitted after the queue was
+            # emptied starts a new thread rather than waiting on this one
+            self._thread = None
+
+    def _run_after_batch(self):
+        if self._after_batch is None:
+            return
+        try:
+            self._after_batch()
+        except Exception as e:
+            logger.error(f"Error in after_batch of database writer: {e}")
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            logger.error(f"Error opening the database writer connection: {e}")
+            self._fail_queued(e)
+            return
+        # we manage transactions ourselves
+        conn.isolation_level = None
+
+        while True:
+            batch = self._next_batch()
+            results = []
+
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for func, args, kwargs, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+
+                    conn.execute("SAVEPOINT op")
+                    try:
+                        result = func(conn, *args, **kwargs)
+                        conn.execute("RELEASE SAVEPOINT op")
+                        results.append((future, result, None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO SAVEPOINT op")
+                        conn.execute("RELEASE SAVEPOINT op")
+                        results.append((future, None, e))
+                conn.execute("COMMIT")
+            except Exception as e:
+                logger.error(f"Error committing write batch of {len(batch)} operations: {e}")
+                try:
+                    conn.execute("ROLLBACK")
+                except Exception:
+                    pass
+                # nothing in this batch was committed. this includes operations that
+                # never started, e.g. if BEGIN itself failed.
+                for func, args, kwargs, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                self._run_after_batch()
+                continue
+
+            self._run_after_batch()
+
+            # only resolve futures once the data is durable
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
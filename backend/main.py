@@ -25,6 +25,9 @@ from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 # from backend.routes.tautulli import router as tautulli_router
 from backend.routes.db import router as db_router
+from backend.api import smtp
+from backend.db import db
+from backend.api.scheduler import task_scheduler
 from dotenv import load_dotenv
 import os
 
@@ -36,6 +39,24 @@ load_dotenv('.env')
 # app.include_router(tautulli_router, prefix="/backend/tautulli")
 app.include_router(db_router, prefix="/backend")
 
+@app.on_event("startup")
+def resume_email_outbox():
+    # carry on sending any campaigns interrupted by a restart
+    smtp.outbox_sender.wake()
+
+@app.on_event("startup")
+def recover_job_runs():
+    # jobs don't survive a restart, so runs recorded as unfinished never will
+    db.recover_job_runs()
+
+@app.on_event("startup")
+def start_scheduler():
+    task_scheduler.start()
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    task_scheduler.stop()
+
 # front-end routes
 @app.get("/")
 def dashboard():
@@ -21,10 +21,11 @@
 # --------------------------------------------------------------------
 
 from pydantic import BaseModel
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse, FileResponse, Response
 from fastapi import BackgroundTasks
 from typing import List
+import uuid
 from backend.api import tautulli
 from backend.api import overseerr
 from backend.api import smtp
@@ -32,8 +33,10 @@ from backend.api import tvdb
 from backend.api import tmdb
 from backend.api import server
 from backend.api import automated
+from backend.api import templates
 from backend.db import db
-from backend.api.jobRegister import start_job, get_jobs
+from backend.api.jobRegister import start_job, get_jobs, get_job, cancel_job, stream_job_events
+from backend.api.scheduler import task_scheduler
 from fastapi.responses import PlainTextResponse
 
 router = APIRouter()
@@ -54,6 +57,11 @@ class SMTPSenderRecipientModel(BaseModel):
     sender: str
     recipient: str
 
+class PosterBatchModel(BaseModel):
+    movie_ids: list[int] = []
+    show_ids: list[int] = []
+    size: int | None = None
+
 class UnsubscribeListModel(BaseModel):
     table_name: str
     user_ids: list[int]
@@ -63,6 +71,7 @@ class SendEmailRequest(BaseModel):
     html_body: str
     recipients: List[str]
     sender: str
+    template: bool = False # fill in template tags (e.g. {{ user.friendly_name }}) for each recipient
 
 # ---------------------------------------- #
 #                 TAUTULLI                 #
@@ -104,6 +113,24 @@ def tau_get_movies():
 def tau_get_shows():
     return tautulli.get_shows()
 
+@router.post("/tautulli/webhook")
+def tau_webhook(payload: dict, authorization: str | None = Header(default=None)):
+    """
+    receives notifications from Tautulli's webhook notification agent, so that watches
+    and newly added media are recorded as they happen instead of waiting for the next link.
+    """
+    expected = tautulli.webhook_auth()
+    if expected and authorization != expected:
+        raise HTTPException(status_code=401)
+    try:
+        return {"accepted": db.ingest_tautulli_webhook(payload)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/tautulli/set_webhook_auth")
+def tau_set_webhook_auth(data: APIModel):
+    return tautulli.set_webhook_auth(data.key)
+
 # ---------------------------------------- #
 #                OVERSEERR                 #
 # ---------------------------------------- #
@@ -135,6 +162,24 @@ def ove_alive():
 @router.get("/overseerr/get_requests")
 def ove_get_requests():
     return overseerr.get_requests()
+
+@router.post("/overseerr/webhook")
+def ove_webhook(payload: dict, authorization: str | None = Header(default=None)):
+    """
+    receives notifications from Overseerr's webhook agent, so that requests are
+    updated as they happen instead of waiting for the next link.
+    """
+    expected = overseerr.webhook_auth()
+    if expected and authorization != expected:
+        raise HTTPException(status_code=401)
+    try:
+        return {"accepted": db.ingest_overseerr_webhook(payload)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/overseerr/set_webhook_auth")
+def ove_set_webhook_auth(data: APIModel):
+    return overseerr.set_webhook_auth(data.key)
     
 @router.post("/overseerr/get_movie_poster_url")
 def ove_get_movie_poster_url(data: APIModel):
@@ -210,8 +255,29 @@ def send_email_stream(data: SendEmailRequest):
     send individual emails to a list of recipients.
     returns progress updates using SSEs.
     """
+    # html_body may be a template (see templates.Template). check it parses and renders
+    # before anything is queued, so a stray tag is reported instead of failing the send.
+    if data.template:
+        try:
+            templates.compile_template(data.html_body).render({})
+        except templates.TemplateSyntaxError as e:
+            raise HTTPException(status_code=400, detail=f"Email body template error: {e}")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Email body template could not be rendered: {e}")
+
+    return StreamingResponse(
+        smtp.send_email_stream(data.subject, data.html_body, data.recipients, data.sender, data.template),
+        media_type="text/event-stream"
+    )
+
+@router.get("/smtp/campaign_progress/{campaign_id}")
+def smtp_campaign_progress(campaign_id: int):
+    """
+    follow the progress of a campaign that is (or was) being sent, e.g. after the
+    send_email_stream connection was lost. returns progress updates using SSEs.
+    """
     return StreamingResponse(
-        smtp.send_email_stream(data.subject, data.html_body, data.recipients, data.sender),
+        smtp.stream_campaign_progress(campaign_id),
         media_type="text/event-stream"
     )
 
@@ -281,11 +347,19 @@ def populate_shows():
 def populate_movies():
     return db.populate_movies()
 
+def _then_prefetch_posters(func):
+    """run func, then start a job fetching the posters of anything it added"""
+    def run():
+        result = func()
+        start_job("Fetching posters...", db.prefetch_posters, trigger="after_sync")
+        return result
+    return run
+
 @router.get("/link_tautulli")
 def link_tautulli():
     job_id = start_job(
         "Fetching data from Tautulli...",
-        db.link_tautulli
+        _then_prefetch_posters(db.link_tautulli)
     )
     return {"job_id": job_id}
 
@@ -294,7 +368,7 @@ def link_overseerr():
     if overseerr.validate_apikey():
         job_id = start_job(
             "Fetching data from Overseerr...",
-            db.link_overseerr
+            _then_prefetch_posters(db.link_overseerr)
         )
         return {"job_id": job_id}
     else:
@@ -304,6 +378,61 @@ def link_overseerr():
 def job_status():
     return get_jobs()
 
+@router.get("/jobs/events")
+def all_job_events():
+    """follow every job, as SSEs: a start event for each job when it's queued, then its progress"""
+    return StreamingResponse(
+        stream_job_events(),
+        media_type="text/event-stream"
+    )
+
+@router.get("/jobs/{job_id}/events")
+def job_events(job_id: str):
+    """follow a job's stages and progress as it runs, returning updates using SSEs"""
+    return StreamingResponse(
+        stream_job_events(job_id),
+        media_type="text/event-stream"
+    )
+
+@router.get("/jobs/history")
+def job_history(
+    name: str | None = None,
+    status: str | None = None,
+    trigger: str | None = None,
+    since: float | None = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    return db.get_job_runs(name, status, trigger, since, limit)
+
+@router.get("/jobs/history/stats")
+def job_history_stats(since: float | None = None):
+    return db.get_job_run_stats(since)
+
+@router.get("/jobs/{job_id}")
+def single_job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_single_job(job_id: str):
+    if not cancel_job(job_id):
+        raise HTTPException(status_code=404, detail="No unfinished job with that id")
+    return {"job_id": job_id, "cancel_requested": True}
+
+@router.get("/scheduler/tasks")
+def scheduled_tasks():
+    return task_scheduler.get_tasks()
+
+@router.get("/prefetch_posters")
+def prefetch_posters():
+    job_id = start_job(
+        "Fetching posters...",
+        db.prefetch_posters
+    )
+    return {"job_id": job_id}
+
 @router.post("/get_movie_poster_image")
 def get_movie_poster_image(data: APIModel):
     return db.get_poster_image(movie_id=data.key)
@@ -312,14 +441,138 @@ def get_movie_poster_image(data: APIModel):
 def get_show_poster_image(data: APIModel):
     return db.get_poster_image(show_id=data.key)
 
+POSTER_CACHE_CONTROL = "public, max-age=86400"
+
+def _etag_matches(if_none_match, etag):
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # a list of (possibly weak) etags
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def _poster_response(media_type, media_id, if_none_match, size, fmt):
+    if fmt not in (None, "jpeg", "webp"):
+        raise HTTPException(status_code=400, detail="format must be 'jpeg' or 'webp'")
+    if size is not None and size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+
+    poster = db.get_poster_file(media_type, media_id, size, fmt)
+    if poster is None:
+        raise HTTPException(status_code=404)
+
+    path, etag, content_type = poster
+    headers = {"ETag": etag, "Cache-Control": POSTER_CACHE_CONTROL}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=content_type, headers=headers)
+
+@router.get("/posters/movie/{movie_id}")
+def get_movie_poster(movie_id: int, size: int | None = None, fmt: str | None = Query(default=None, alias="format"),
+                     if_none_match: str | None = Header(default=None)):
+    """
+    the poster of a movie, with an ETag so that browsers can cache it and revalidate.
+    ?size=<width> and ?format=webp give a smaller/re-encoded version.
+    """
+    return _poster_response("movie", movie_id, if_none_match, size, fmt)
+
+@router.get("/posters/show/{show_id}")
+def get_show_poster(show_id: int, size: int | None = None, fmt: str | None = Query(default=None, alias="format"),
+                    if_none_match: str | None = Header(default=None)):
+    """
+    the poster of a show, with an ETag so that browsers can cache it and revalidate.
+    ?size=<width> and ?format=webp give a smaller/re-encoded version.
+    """
+    return _poster_response("show", show_id, if_none_match, size, fmt)
+
+POSTER_BATCH_LIMIT = 500
+
+def _poster_batch_items(data: PosterBatchModel):
+    items = [("movie", i) for i in data.movie_ids] + [("show", i) for i in data.show_ids]
+    if len(items) > POSTER_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"at most {POSTER_BATCH_LIMIT} posters per batch")
+    if data.size is not None and data.size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+    return items
+
+@router.post("/posters/batch")
+def get_poster_batch(data: PosterBatchModel):
+    """
+    the posters of many movies/shows in one multipart/mixed response. each part has a
+    Content-ID of <movie:ID> or <show:ID>; items without a poster are left out.
+    """
+    posters = db.get_poster_batch(_poster_batch_items(data), data.size)
+
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for (media_type, media_id), (image, content_type, etag) in posters.items():
+        body += (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-ID: <{media_type}:{media_id}>\r\n"
+            f"ETag: {etag}\r\n"
+            f"Content-Length: {len(image)}\r\n\r\n"
+        ).encode()
+        body += image
+        body += b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+
+    return Response(content=bytes(body), media_type=f"multipart/mixed; boundary={boundary}")
+
+@router.post("/posters/sprite")
+def get_poster_sprite(data: PosterBatchModel):
+    """
+    build a sprite sheet of many movies'/shows' posters. returns its url, the size of
+    each poster in it, and where each poster is ("movie:ID" / "show:ID" -> {x, y}).
+    """
+    items = _poster_batch_items(data)
+    if len(items) > db.POSTER_SPRITE_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"at most {db.POSTER_SPRITE_MAX_ITEMS} posters per sprite")
+    if data.size is not None and data.size > db.POSTER_SPRITE_MAX_WIDTH:
+        raise HTTPException(status_code=400, detail=f"size must be at most {db.POSTER_SPRITE_MAX_WIDTH} for sprites")
+
+    try:
+        sprite = db.build_poster_sprite(items, data.size or 154)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    if sprite is None:
+        raise HTTPException(status_code=404, detail="None of the posters could be found")
+    sprite["url"] = f"/backend/posters/sprites/{sprite['sprite_id']}"
+    return sprite
+
+@router.get("/posters/sprites/{sprite_id}")
+def get_poster_sprite_image(sprite_id: str):
+    path = db.get_poster_sprite_path(sprite_id)
+    if path is None:
+        raise HTTPException(status_code=404)
+    # sprites are named by their contents, so they can be cached forever
+    return FileResponse(path, media_type="image/jpeg",
+                        headers={"ETag": f'"{sprite_id}"', "Cache-Control": "public, max-age=31536000, immutable"})
+
 @router.post("/get_all_shows_watched_by_user")
 def get_all_shows_watched_by_user(data: APIModel):
     return db.get_all_shows_watched_by_user(data.key)
 
+@router.post("/get_user_watch_summary")
+def get_user_watch_summary(data: APIModel):
+    return db.get_user_watch_summary(data.key)
+
 @router.post("/get_new_episodes_for_user")
 def get_new_episodes_for_user(data: APIModel):
     return db.get_new_episodes_for_user(data.key)
 
+@router.get("/refresh_new_episodes")
+def refresh_new_episodes():
+    job_id = start_job(
+        "Finding newly released episodes...",
+        db.refresh_new_episodes
+    )
+    return {"job_id": job_id}
+
+@router.get("/get_new_episodes_digest")
+def get_new_episodes_digest():
+    return db.get_new_episodes_digest()
+
 @router.get("/get_users")
 def get_users():
     return db.get_users()
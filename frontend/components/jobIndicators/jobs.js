@@ -24,26 +24,53 @@ const jobContainer = document.getElementById("job-container");
 
 const activeJobs = new Map();
 
-async function fetchJobs() {
-    try {
-        const res = await fetch("/backend/jobs");
-        const jobs = await res.json();
-
-        Object.entries(jobs).forEach(([id, job]) => {
-            if (job.running && !activeJobs.has(id)) {
-                createJobIndicator(id, job.name);
-                console.log(`CREATED JOB INDICATOR FOR ${id} ${job.name}`);
-            }
-
-            if (!job.running && activeJobs.has(id)) {
+/**
+ * follow every job through the /backend/jobs/events SSE stream, rather than polling
+ * /backend/jobs. on (re)connecting, the backend sends a "start" event for each job
+ * that is still running, so indicators are cleared first and then rebuilt.
+ */
+function followJobs() {
+    const events = new EventSource("/backend/jobs/events");
+
+    events.addEventListener("open", () => {
+        for (const id of [...activeJobs.keys()]) {
+            removeJobIndicator(id);
+        }
+    });
+
+    events.addEventListener("message", (e) => {
+        const event = JSON.parse(e.data);
+        const id = event.job_id;
+
+        switch (event.type) {
+            case "start":
+                if (!activeJobs.has(id)) {
+                    createJobIndicator(id, event.name);
+                }
+                if (event.progress) {
+                    updateJobIndicator(id, event.progress);
+                }
+                break;
+            case "stage":
+                updateJobIndicator(id, {stage: event.stage, done: 0, total: event.total});
+                break;
+            case "progress":
+                updateJobIndicator(id, event);
+                break;
+            case "complete":
+            case "error":
+                if (event.type === "error") {
+                    console.error(`Job ${event.name} failed:`, event.message);
+                }
                 removeJobIndicator(id);
-            }
-
-        });
-
-    } catch (err) {
-        console.error("Job polling failed:", err);
-    }
+                break;
+        }
+    });
+
+    events.addEventListener("error", () => {
+        // EventSource reconnects by itself
+        console.error("Lost connection to job events, reconnecting...");
+    });
 }
 
 function createJobIndicator(id, text) {
@@ -52,14 +79,41 @@ function createJobIndicator(id, text) {
     div.className = "job-indicator";
 
     div.innerHTML = `
-        ${text}
+        <span class="job-text">
+            <span class="job-name"></span>
+            <span class="job-detail"></span>
+        </span>
         <span class="spinner"></span>
     `;
+    div.querySelector(".job-name").textContent = text;
 
     jobContainer.appendChild(div);
     activeJobs.set(id, div);
 }
 
+/**
+ * show a job's stage and progress under its name, e.g. "movies: 150/2000 (42.1/s, ~44s left)"
+ */
+function updateJobIndicator(id, progress) {
+
+    const el = activeJobs.get(id);
+    if (!el || !progress.stage) return;
+
+    let detail = progress.stage;
+    if (progress.total != null) {
+        detail += `: ${progress.done}/${progress.total}`;
+    } else if (progress.done) {
+        detail += `: ${progress.done}`;
+    }
+
+    const extra = [];
+    if (progress.rate) extra.push(`${progress.rate}/s`);
+    if (progress.eta != null) extra.push(`~${Math.ceil(progress.eta)}s left`);
+    if (extra.length) detail += ` (${extra.join(", ")})`;
+
+    el.querySelector(".job-detail").textContent = detail;
+}
+
 function removeJobIndicator(id) {
 
     const el = activeJobs.get(id);
@@ -73,8 +127,5 @@ function removeJobIndicator(id) {
     activeJobs.delete(id);
 }
 
-
-setInterval(fetchJobs, 500);
-
-// run once on page load
-document.addEventListener("DOMContentLoaded", fetchJobs);
+// start on page load
+document.addEventListener("DOMContentLoaded", followJobs);
@@ -38,7 +38,7 @@ const DEFAULTS = {
         footer: `You can unsubscribe from email notifications by replying to this email.`
     },
     [EMAIL_TYPES.OVERSEERR]: {
-        content: `<p>Hi {{user}}</p>`,
+        content: `<p>Hi {{ user.friendly_name }}</p>`,
         footer: ``
     }
 }
@@ -724,6 +724,7 @@ async function sendServerEmail() {
     const fullHtml = buildEmailHtml(contentHtml, footerHtml);
 
     const sender = document.getElementById("server-senderInput").value;
+    const template = document.getElementById("server-templateInput").checked;
 
     if (!sender) {
         console.log("No sender");
@@ -754,7 +755,8 @@ async function sendServerEmail() {
             fullHtml,
             recipientEmails,
             sender,
-            createProgressHandlers(progressContainer, sendBtn)
+            createProgressHandlers(progressContainer, sendBtn),
+            template
         );
     } catch (error) {
         progressContainer.remove();
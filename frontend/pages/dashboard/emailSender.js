@@ -20,7 +20,7 @@
 // Please keep this header comment in all copies of the program.
 // --------------------------------------------------------------------
 
-export async function sendIndividualEmailsWithProgress(subject, htmlBody, recipients, sender, callbacks = {}) {
+export async function sendIndividualEmailsWithProgress(subject, htmlBody, recipients, sender, callbacks = {}, template = false) {
     if (!recipients || recipients.length === 0) {
         throw new Error("No recipients provided");
     }
@@ -40,12 +40,15 @@ export async function sendIndividualEmailsWithProgress(subject, htmlBody, recipi
             subject: subject,
             html_body: htmlBody,
             recipients: recipients,
-            sender: sender
+            sender: sender,
+            template: template
         })
     });
 
     if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
+        // e.g. a 400 with the reason, for an email body with a template error
+        const error = await response.json().catch(() => null);
+        throw new Error(error?.detail || `HTTP error! status: ${response.status}`);
     }
 
     const reader = response.body.getReader();
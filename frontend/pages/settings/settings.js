@@ -39,6 +39,7 @@ let unsubscribeLists, unsubscribeListsInit;
 let unsubscribeUserSelector;
 const list_name_map = {
     "newly_released_content_updates_unsubscribe_list": "Newly Released Content",
+    "request_for_unreleased_content_unsubscribe_list": "Request for Unreleased Content",
     "system_updates_unsubscribe_list": "System Updates"
 }
 
@@ -0,0 +1,112 @@
+# -----------------------------contactarr------------------------------
+# This file is part of contactarr
+# Copyright (C) 2025 goggybox https://github.com/goggybox
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# that this program is licensed under. See LICENSE file. If not
+# available, see <https://www.gnu.org/licenses/>.
+
+# Please keep this header comment in all copies of the program.
+# --------------------------------------------------------------------
+
+import smtplib
+import time
+import unittest
+from unittest import mock
+
+from backend.api import smtp
+
+class TemporaryFailureTest(unittest.TestCase):
+
+    def test_4xx_replies_are_temporary(self):
+        self.assertTrue(smtp._is_temporary_failure(smtplib.SMTPResponseException(421, b"try again later")))
+        self.assertTrue(smtp._is_temporary_failure(smtplib.SMTPDataError(451, b"local error")))
+
+    def test_5xx_replies_are_permanent(self):
+        self.assertFalse(smtp._is_temporary_failure(smtplib.SMTPResponseException(550, b"no such user")))
+        self.assertFalse(smtp._is_temporary_failure(smtplib.SMTPSenderRefused(553, b"not allowed", "a@example.com")))
+
+    def test_refused_recipients(self):
+        temporary = smtplib.SMTPRecipientsRefused({"a@example.com": (450, b"mailbox busy")})
+        permanent = smtplib.SMTPRecipientsRefused({"a@example.com": (450, b"mailbox busy"),
+                                                   "b@example.com": (550, b"no such user")})
+        self.assertTrue(smtp._is_temporary_failure(temporary))
+        self.assertFalse(smtp._is_temporary_failure(permanent))
+        self.assertFalse(smtp._is_temporary_failure(smtplib.SMTPRecipientsRefused({})))
+
+    def test_lost_connections_are_temporary(self):
+        self.assertTrue(smtp._is_temporary_failure(smtplib.SMTPServerDisconnected("gone")))
+        self.assertTrue(smtp._is_temporary_failure(ConnectionResetError()))
+        self.assertTrue(smtp._is_temporary_failure(TimeoutError()))
+
+    def test_other_errors_are_permanent(self):
+        self.assertFalse(smtp._is_temporary_failure(smtplib.SMTPNotSupportedError()))
+        self.assertFalse(smtp._is_temporary_failure(ValueError("bad address")))
+
+    @unittest.skipIf(smtp.aiosmtplib is None, "aiosmtplib is not installed")
+    def test_aiosmtplib_errors(self):
+        aiosmtplib = smtp.aiosmtplib
+        self.assertTrue(smtp._is_temporary_failure(aiosmtplib.SMTPResponseException(421, "try again later")))
+        self.assertFalse(smtp._is_temporary_failure(aiosmtplib.SMTPResponseException(550, "no such user")))
+        self.assertTrue(smtp._is_temporary_failure(aiosmtplib.SMTPServerDisconnected("gone")))
+
+class OutboxReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sender = smtp.OutboxSender()
+        self.sent = mock.patch.object(smtp.db, "mark_outbox_sent").start()
+        self.failed = mock.patch.object(smtp.db, "mark_outbox_failed").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def report(self, attempts, error):
+        self.sender._report({"outbox_id": 7, "attempts": attempts}, error)
+
+    def test_success(self):
+        self.report(1, None)
+        self.sent.assert_called_once_with(7)
+        self.failed.assert_not_called()
+
+    def test_temporary_failure_is_retried_with_backoff(self):
+        for attempts in (1, 2, 3):
+            self.failed.reset_mock()
+            before = int(time.time())
+            self.report(attempts, smtplib.SMTPResponseException(421, b"try again later"))
+
+            outbox_id, error, retry_at = self.failed.call_args.args
+            self.assertEqual(outbox_id, 7)
+            self.assertIn("421", error)
+            delay = smtp.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+            self.assertGreaterEqual(retry_at, before + delay)
+            self.assertLessEqual(retry_at, int(time.time()) + delay)
+
+    def test_temporary_failure_gives_up_after_max_attempts(self):
+        self.report(smtp.OUTBOX_MAX_ATTEMPTS, smtplib.SMTPResponseException(421, b"try again later"))
+        self.assertEqual(len(self.failed.call_args.args), 2) # no retry_at
+
+    def test_permanent_failure_is_not_retried(self):
+        self.report(1, smtplib.SMTPResponseException(550, b"no such user"))
+        self.assertEqual(len(self.failed.call_args.args), 2)
+        self.sent.assert_not_called()
+
+    def test_messages_that_cannot_be_built_fail_without_sending(self):
+        claimed = [{"outbox_id": 3, "campaign_id": 1, "recipient": "a@example.com", "html_body": None, "attempts": 1}]
+        with mock.patch.object(smtp.db, "claim_next_outbox_message", side_effect=claimed + [None]), \
+                mock.patch.object(smtp, "_get_campaign", side_effect=KeyError("campaign")):
+            self.assertIsNone(self.sender._next_job())
+
+        outbox_id, error = self.failed.call_args.args
+        self.assertEqual(outbox_id, 3)
+        self.assertIn("could not build message", error)
+
+if __name__ == "__main__":
+    unittest.main()
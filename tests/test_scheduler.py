@@ -0,0 +1,89 @@
+# -----------------------------contactarr------------------------------
+# This file is part of contactarr
+# Copyright (C) 2025 goggybox https://github.com/goggybox
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# that this program is licensed under. See LICENSE file. If not
+# available, see <https://www.gnu.org/licenses/>.
+
+# Please keep this header comment in all copies of the program.
+# --------------------------------------------------------------------
+
+import unittest
+from datetime import datetime, timedelta
+
+from backend.api.scheduler import CronSchedule, ScheduledTask, task_scheduler
+
+def next_after(expression, after):
+    return CronSchedule(expression).next_after(after)
+
+class CronScheduleTest(unittest.TestCase):
+
+    def test_every_minute_is_strictly_after(self):
+        self.assertEqual(next_after("* * * * *", datetime(2026, 1, 1, 10, 0, 0)), datetime(2026, 1, 1, 10, 1))
+        self.assertEqual(next_after("* * * * *", datetime(2026, 1, 1, 10, 0, 59)), datetime(2026, 1, 1, 10, 1))
+
+    def test_steps(self):
+        self.assertEqual(next_after("*/30 * * * *", datetime(2026, 1, 1, 10, 29, 59)), datetime(2026, 1, 1, 10, 30))
+        self.assertEqual(next_after("*/30 * * * *", datetime(2026, 1, 1, 10, 30)), datetime(2026, 1, 1, 11, 0))
+        self.assertEqual(next_after("10-50/20 * * * *", datetime(2026, 1, 1, 10, 31)), datetime(2026, 1, 1, 10, 50))
+        # a single value with a step runs from that value to the end of the range
+        self.assertEqual(next_after("45/5 * * * *", datetime(2026, 1, 1, 10, 56)), datetime(2026, 1, 1, 11, 45))
+
+    def test_lists(self):
+        self.assertEqual(next_after("15,45 * * * *", datetime(2026, 1, 1, 10, 20)), datetime(2026, 1, 1, 10, 45))
+        self.assertEqual(next_after("15,45 * * * *", datetime(2026, 1, 1, 10, 45)), datetime(2026, 1, 1, 11, 15))
+
+    def test_daily_rolls_over_days_months_and_years(self):
+        self.assertEqual(next_after("0 3 * * *", datetime(2026, 1, 1, 3, 0)), datetime(2026, 1, 2, 3, 0))
+        self.assertEqual(next_after("0 3 * * *", datetime(2026, 1, 31, 4, 0)), datetime(2026, 2, 1, 3, 0))
+        self.assertEqual(next_after("0 3 * * *", datetime(2026, 12, 31, 23, 59)), datetime(2027, 1, 1, 3, 0))
+
+    def test_weekday_zero_is_sunday(self):
+        # 2026-10-19 is a monday
+        self.assertEqual(next_after("0 12 * * 0", datetime(2026, 10, 19, 9, 0)), datetime(2026, 10, 25, 12, 0))
+        self.assertEqual(next_after("0 9 * * 1", datetime(2026, 10, 19, 9, 0)), datetime(2026, 10, 26, 9, 0))
+
+    def test_day_and_weekday_must_both_match(self):
+        # the next friday the 13th after 2026-01-01
+        self.assertEqual(next_after("0 0 13 * 5", datetime(2026, 1, 1)), datetime(2026, 2, 13, 0, 0))
+
+    def test_rare_dates(self):
+        self.assertEqual(next_after("0 0 29 2 *", datetime(2026, 3, 1)), datetime(2028, 2, 29, 0, 0))
+
+    def test_never_matching_schedule(self):
+        with self.assertRaises(ValueError):
+            next_after("0 0 31 2 *", datetime(2026, 1, 1))
+
+    def test_invalid_expressions(self):
+        for expression in ("* * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "5-1 * * * *", "*/0 * * * *", "a * * * *"):
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                CronSchedule(expression)
+
+class ScheduledTaskTest(unittest.TestCase):
+
+    def test_plan_adds_jitter_after_the_scheduled_time(self):
+        task = ScheduledTask("test", "0 * * * *", lambda: None, "Testing...", jitter=600)
+        for _ in range(20):
+            task.plan(datetime(2026, 1, 1, 10, 30))
+            self.assertGreaterEqual(task.next_run, datetime(2026, 1, 1, 11, 0))
+            self.assertLessEqual(task.next_run, datetime(2026, 1, 1, 11, 0) + timedelta(seconds=600))
+
+    def test_shipped_schedules_parse(self):
+        after = datetime(2026, 1, 1)
+        for task in task_scheduler.tasks.values():
+            with self.subTest(task=task.name):
+                self.assertGreater(task.schedule.next_after(after), after)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# -----------------------------contactarr------------------------------
+# This file is part of contactarr
+# Copyright (C) 2025 goggybox https://github.com/goggybox
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# that this program is licensed under. See LICENSE file. If not
+# available, see <https://www.gnu.org/licenses/>.
+
+# Please keep this header comment in all copies of the program.
+# --------------------------------------------------------------------
+
+import unittest
+
+from backend.api.templates import Template, TemplateSyntaxError, compile_template, get_email_template
+
+def render(source, context=None):
+    return Template(source).render(context or {})
+
+class TemplatePathTest(unittest.TestCase):
+
+    def test_nested_values(self):
+        self.assertEqual(render("Hi {{ user.friendly_name }}", {"user": {"friendly_name": "Ann"}}), "Hi Ann")
+
+    def test_missing_values_render_nothing(self):
+        self.assertEqual(render("[{{ user.friendly_name }}]", {}), "[]")
+        self.assertEqual(render("[{{ user.friendly_name.first }}]", {"user": {}}), "[]")
+
+    def test_numbers_index_lists_and_key_dicts(self):
+        context = {"shows": [{"name": "A"}, {"name": "B"}], "by_id": {"0": "zero"}}
+        self.assertEqual(render("{{ shows.1.name }} {{ shows.5.name }}", context), "B ")
+        self.assertEqual(render("{{ by_id.0 }}", context), "zero")
+
+    def test_paths_into_other_values_render_nothing(self):
+        self.assertEqual(render("[{{ n.0 }}{{ s.0 }}{{ user.__class__ }}]", {"n": 5, "s": "abc", "user": {}}), "[]")
+
+    def test_values_are_escaped_unless_raw(self):
+        context = {"name": "<b>&</b>"}
+        self.assertEqual(render("{{ name }}", context), "&lt;b&gt;&amp;&lt;/b&gt;")
+        self.assertEqual(render("{{ name|raw }}", context), "<b>&</b>")
+
+    def test_containers_are_never_rendered(self):
+        context = {"user": {"email": "ann@example.com"}, "shows": [1, 2]}
+        self.assertEqual(render("[{{ user }}{{ shows|raw }}]", context), "[]")
+
+class TemplateBlockTest(unittest.TestCase):
+
+    def test_for_loop(self):
+        source = "{% for show in shows %}<li>{{ show.name }}</li>{% endfor %}"
+        self.assertEqual(render(source, {"shows": [{"name": "A"}, {"name": "B"}]}), "<li>A</li><li>B</li>")
+        self.assertEqual(render(source, {"shows": []}), "")
+
+    def test_loop_variable_does_not_leak(self):
+        source = "{% for show in shows %}{{ show }}{% endfor %}{{ show }}"
+        self.assertEqual(render(source, {"shows": ["x"], "show": "outer"}), "xouter")
+
+    def test_nested_loops(self):
+        source = "{% for show in shows %}{{ show.name }}:{% for ep in show.episodes %}{{ ep }}{% endfor %};{% endfor %}"
+        context = {"shows": [{"name": "A", "episodes": [1, 2]}, {"name": "B", "episodes": []}]}
+        self.assertEqual(render(source, context), "A:12;B:;")
+
+    def test_if_else(self):
+        source = "{% if shows %}some{% else %}none{% endif %}"
+        self.assertEqual(render(source, {"shows": [1]}), "some")
+        self.assertEqual(render(source, {"shows": []}), "none")
+        self.assertEqual(render("{% if not shows %}none{% endif %}", {}), "none")
+
+    def test_static_templates(self):
+        self.assertTrue(Template("<p>plain</p>").is_static)
+        self.assertFalse(Template("<p>{{ user.username }}</p>").is_static)
+
+class TemplateErrorTest(unittest.TestCase):
+
+    def assertSyntaxError(self, source):
+        with self.assertRaises(TemplateSyntaxError):
+            Template(source)
+
+    def test_unclosed_blocks(self):
+        self.assertSyntaxError("{% for show in shows %}")
+        self.assertSyntaxError("{% if shows %}")
+
+    def test_unexpected_end_tags(self):
+        self.assertSyntaxError("{% endfor %}")
+        self.assertSyntaxError("{% for show in shows %}{% endif %}")
+        self.assertSyntaxError("{% else %}")
+
+    def test_unknown_tags_and_filters(self):
+        self.assertSyntaxError("{% include other %}")
+        self.assertSyntaxError("{{ user.name|upper }}")
+        self.assertSyntaxError("{{ user name }}")
+
+class EmailTemplateTest(unittest.TestCase):
+
+    def test_compile_template_reuses_parsed_templates(self):
+        self.assertIs(compile_template("{{ a }}"), compile_template("{{ a }}"))
+
+    def test_shipped_email_templates_parse(self):
+        for email_type in ("newly_released_content", "request_for_unreleased_content"):
+            template = get_email_template(email_type)
+            html = template.render({"user": {"friendly_name": "Ann"}})
+            self.assertIn("Hi Ann", html)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+# -----------------------------contactarr------------------------------
+# This file is part of contactarr
+# Copyright (C) 2025 goggybox https://github.com/goggybox
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# that this program is licensed under. See LICENSE file. If not
+# available, see <https://www.gnu.org/licenses/>.
+
+# Please keep this header comment in all copies of the program.
+# --------------------------------------------------------------------
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from backend.db.writer import DBWriter
+
+class DBWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, "test.db")
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE items (name TEXT UNIQUE)")
+        conn.close()
+        self.batches = 0
+        self.writer = DBWriter(self._connect, batch_size=3, after_batch=self._count_batch)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def _count_batch(self):
+        self.batches += 1
+
+    def _names(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return sorted(name for (name,) in conn.execute("SELECT name FROM items"))
+        finally:
+            conn.close()
+
+    def _hold_writer(self):
+        """
+        block the writer thread inside an operation, so that everything submitted
+        meanwhile is queued up for the next batches. returns the event releasing it.
+        """
+        started = threading.Event()
+        release = threading.Event()
+
+        def hold(conn):
+            started.set()
+            release.wait(5)
+
+        self.writer.submit(hold)
+        self.assertTrue(started.wait(5))
+        return release
+
+    def test_run_returns_result_after_commit(self):
+        self.assertEqual(self.writer.run(lambda conn: conn.execute("INSERT INTO items VALUES ('a')").rowcount), 1)
+        # visible to another connection as soon as run() returns
+        self.assertEqual(self._names(), ["a"])
+
+    def test_queued_operations_are_batched(self):
+        release = self._hold_writer()
+        futures = [self.writer.execute("INSERT INTO items VALUES (?)", (f"item{i}",)) for i in range(5)]
+        release.set()
+
+        self.assertEqual([future.result(5) for future in futures], [1] * 5)
+        self.assertEqual(len(self._names()), 5)
+        # the held batch, then the 5 queued operations in batches of at most 3
+        self.assertEqual(self.batches, 3)
+
+    def test_failing_operation_is_rolled_back_alone(self):
+        def insert_then_fail(conn):
+            conn.execute("INSERT INTO items VALUES ('rolled back')")
+            raise ValueError("boom")
+
+        release = self._hold_writer()
+        ok = self.writer.execute("INSERT INTO items VALUES ('kept')")
+        failed = self.writer.submit(insert_then_fail)
+        duplicate = self.writer.execute("INSERT INTO items VALUES ('kept')")
+        release.set()
+
+        self.assertEqual(ok.result(5), 1)
+        with self.assertRaises(ValueError):
+            failed.result(5)
+        with self.assertRaises(sqlite3.IntegrityError):
+            duplicate.result(5)
+        self.assertEqual(self._names(), ["kept"])
+
+    def test_nested_call_raises_instead_of_deadlocking(self):
+        def nested(conn):
+            return self.writer.run(lambda inner: None)
+
+        with self.assertRaises(RuntimeError):
+            self.writer.run(nested)
+        # the writer carries on afterwards
+        self.assertEqual(self.writer.execute("INSERT INTO items VALUES ('after')").result(5), 1)
+
+    def test_connect_failure_fails_queued_operations(self):
+        attempts = []
+
+        def connect():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise sqlite3.OperationalError("unable to open database file")
+            return self._connect()
+
+        writer = DBWriter(connect)
+        with self.assertRaises(sqlite3.OperationalError):
+            writer.execute("INSERT INTO items VALUES ('a')").result(5)
+        # the next operation starts a new writer thread, which connects again
+        self.assertEqual(writer.execute("INSERT INTO items VALUES ('b')").result(5), 1)
+        self.assertEqual(self._names(), ["b"])
+
+if __name__ == "__main__":
+    unittest.main()